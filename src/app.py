@@ -1,11 +1,30 @@
-from workflow.graph import WorkFlow
+from workflow.graph import WorkFlow, get_workflow, get_checkpointer
+from workflow.streaming import astream_workflow_events, format_sse
+from workflow.jobs import job_manager_from_env, JobQueueFull, JOB_SUCCEEDED, JOB_FAILED
+from workflow.tool_runner import drop_session_locks
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 import os
+import asyncio
 import logging
-from typing import Dict
+from typing import Dict, Optional
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from utlis.format_plan import format_plans_to_markdown
+from utlis.workspace_gc import get_workspace_reaper
+from utlis.git_mirror import get_git_mirrors
+from utlis.githubapp_privatekey import get_token_cache
+from utlis.github_client import github_client_stats
+from utlis.gcp.gcloud_config import get_gcloud_configs
+from utlis.terraform_cache import get_terraform_cache
+from llm_factory.rate_limiter import rate_limiter_stats
+from llm_factory.response_cache import response_cache_stats
+from llm_factory.node_metrics import get_node_metrics
+from llm_factory.provider_router import provider_router_stats
+from prompts.prompts import get_prompt_registry
+from tools.tool_cache import get_tool_cache, tool_cache_stats
+from tools.code_index import drop_code_index, code_index_stats
+from tools.file_windows import get_file_windows
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -25,6 +44,8 @@ class ChatRequest(BaseModel):
     workspace_id: str
     session_id: str
     sa_key_bucket_link: str
+class ResumeRequest(BaseModel):
+    session_id: str
 class ChatBackgroundResponse(BaseModel):
     agent_response: str
     plan: str
@@ -33,6 +54,26 @@ class ChatBackgroundResponse(BaseModel):
     agent_trajectory: str
     input_tokens: int
     output_tokens: int
+    saved_input_tokens: int = 0
+    cached_input_tokens: int = 0
+    cached_output_tokens: int = 0
+class ChatJobResponse(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+    status_url: str
+    result_url: str
+class JobStatusResponse(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    memory: Optional[Dict[str, int]] = None
+    plan: str
+    current_step: str
 
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +83,19 @@ app.add_middleware(
     allow_headers=["*"],              # Allow all headers
 )
 
+@app.on_event("startup")
+def build_shared_workflow():
+    """Compile the graph, LLM clients and tool registry once, before the first request."""
+    get_workflow()
+    tool_cache = get_tool_cache()
+    if tool_cache is not None:
+        get_workspace_reaper().add_eviction_hook(tool_cache.evict_session)
+    get_workspace_reaper().add_eviction_hook(drop_code_index)
+    get_workspace_reaper().add_eviction_hook(get_file_windows().evict_session)
+    get_workspace_reaper().add_eviction_hook(drop_session_locks)
+    get_workspace_reaper().start()
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint for the DevOps agent API."""
@@ -54,34 +108,214 @@ def root():
     return {"message": "DevOps Agent API", "docs": "/docs"}
 
 
-@app.post("/chat", response_model=ChatBackgroundResponse)
-def chat(request: ChatRequest):
-    try:
-        local_base = os.path.abspath(os.path.join(current_dir, "tmp", request.session_id, "codebase"))
-        os.makedirs(local_base, exist_ok=True)
+def prepare_workspace(request: ChatRequest):
+    local_base = os.path.abspath(os.path.join(current_dir, "tmp", request.session_id, "codebase"))
+    os.makedirs(local_base, exist_ok=True)
+
+
+def build_chat_response(work_flow):
+    """Build the ChatBackgroundResponse payload from the finished workflow state."""
+    agent_trajectory=work_flow.messages_to_trajectory_string()
+    state_values = work_flow.workflow.get_state(work_flow.config).values
+    logger.info(f"Input tokens used: {state_values.get('input_tokens',0)}, Output tokens used: {state_values.get('output_tokens',0)}")
+    return {
+        "agent_response": state_values.get("agent_response",""),
+        "plan":format_plans_to_markdown(state_values.get("plans", [])),
+        "status": "success",
+        "message": "devops agent launched successfully.",
+        "agent_trajectory":agent_trajectory,
+        "input_tokens":state_values.get("input_tokens",0),
+        "output_tokens":state_values.get("output_tokens",0),
+        "saved_input_tokens":state_values.get("saved_input_tokens",0),
+        "cached_input_tokens":state_values.get("cached_input_tokens",0),
+        "cached_output_tokens":state_values.get("cached_output_tokens",0)
+    }
+
+
+def run_chat(request: ChatRequest, job=None):
+    """Run the whole workflow for a chat request and build the ChatBackgroundResponse payload."""
+    with get_workspace_reaper().pin(request.session_id):
+        prepare_workspace(request)
         logger.info("Workflow endpoint called")
         work_flow = WorkFlow(request=request)
-        work_flow(request=request)
-        
-        # Log workflow state
-        work_flow.show_state()
-        
-        agent_trajectory=work_flow.messages_to_trajectory_string()
-        state_values = work_flow.workflow.get_state(work_flow.config).values
-        logger.info(f"Input tokens used: {state_values.get('input_tokens',0)}, Output tokens used: {state_values.get('output_tokens',0)}")
-        return {
-            "agent_response": state_values.get("agent_response",""),
-            "plan":format_plans_to_markdown(state_values.get("plans", [])),
-            "status": "success",
-            "message": "devops agent launched successfully.",
-            "agent_trajectory":agent_trajectory,
-            "input_tokens":state_values.get("input_tokens",0),
-            "output_tokens":state_values.get("output_tokens",0)
-        }
-        
-    except Exception as e:
-        logger.error(f"Error launching workflow: {str(e)}", exc_info=True)
+        if job is not None:
+            job.work_flow = work_flow
+        if job is not None and job.resume:
+            work_flow.resume()
+        else:
+            work_flow(request=request)
+
+    # Log workflow state
+    work_flow.show_state()
+
+    return build_chat_response(work_flow)
+
+
+async def arun_chat(request: ChatRequest, job=None):
+    """Async run_chat: the workflow runs on the event loop, sync state reads go to a thread."""
+    with get_workspace_reaper().pin(request.session_id):
+        prepare_workspace(request)
+        logger.info("Async workflow endpoint called")
+        work_flow = WorkFlow(request=request)
+        if job is not None:
+            job.work_flow = work_flow
+        if job is not None and job.resume:
+            await work_flow.aresume()
+        else:
+            await work_flow.ainvoke(request=request)
+
+    await asyncio.to_thread(work_flow.show_state)
+
+    return await asyncio.to_thread(build_chat_response, work_flow)
+
+
+job_manager = job_manager_from_env(
+    lambda job: run_chat(job.request, job),
+    arunner=lambda job: arun_chat(job.request, job),
+)
+
+
+@app.post("/chat", response_model=ChatJobResponse, status_code=202)
+async def chat(request: ChatRequest):
+    """Enqueue a workflow run and return its job id. Poll /jobs/{job_id} for progress."""
+    try:
+        job = job_manager.submit(request)
+    except JobQueueFull as e:
+        logger.warning(f"Rejected chat submission for session {request.session_id}: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "job_id": job.id,
+        "session_id": request.session_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+    }
+
+
+@app.post("/sessions/{session_id}/resume", response_model=ChatJobResponse, status_code=202)
+async def resume_session(session_id: str):
+    """Resume a session whose run was interrupted (e.g. by a restart) from its last checkpoint."""
+    request = ResumeRequest(session_id=session_id)
+    if not await asyncio.to_thread(WorkFlow(request=request).can_resume):
+        raise HTTPException(status_code=409, detail=f"Session {session_id} has no interrupted run to resume")
+    try:
+        job = job_manager.submit(request, resume=True)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return {
+        "job_id": job.id,
+        "session_id": session_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result",
+    }
+
+
+@app.get("/checkpoints/metrics")
+def checkpoints_metrics():
+    """Size, thread count and compaction/eviction counters of the checkpoint store."""
+    return get_checkpointer().metrics()
+
+
+@app.get("/workspaces/metrics")
+def workspaces_metrics():
+    """
+    Bytes reclaimed, eviction counts and pinned sessions of the workspace garbage collector,
+    and clone/fetch counters of the shared git mirrors.
+    """
+    return {**get_workspace_reaper().metrics(), "git_mirrors": get_git_mirrors().stats()}
+
+
+@app.get("/llm/metrics")
+def llm_metrics():
+    """
+    Per node model, latency and token usage, hedge and fallback rates of the provider routers,
+    per provider/model rate limiter state, response cache hit rates per node and prompt render
+    cache counters.
+    """
+    return {"nodes": get_node_metrics().stats(),
+            "provider_routers": provider_router_stats(),
+            "rate_limiters": rate_limiter_stats(),
+            "response_cache": response_cache_stats(),
+            "prompts": get_prompt_registry().stats()}
+
+
+@app.get("/tools/metrics")
+def tools_metrics():
+    """
+    Per tool hit, miss and invalidation counts of the session tool result cache, code index
+    sizes, line index cache counters, GitHub App installation token cache counters, GitHub
+    REST client request, 304, retry and rate limit counters, gcloud session configuration
+    initializations and terraform inits run and skipped.
+    """
+    return {"result_cache": tool_cache_stats(),
+            "code_index": code_index_stats(),
+            "line_index": get_file_windows().stats(),
+            "github_tokens": get_token_cache().stats(),
+            "github_api": github_client_stats(),
+            "gcloud_configs": get_gcloud_configs().stats(),
+            "terraform": get_terraform_cache().stats()}
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Run the workflow and stream its progress as server-sent events: the router decision,
+    planner steps, tool calls with truncated results and chatbot/summarizer tokens,
+    followed by a final 'result' event carrying the ChatBackgroundResponse payload.
+    """
+    async def event_source():
+        try:
+            with get_workspace_reaper().pin(request.session_id):
+                prepare_workspace(request)
+                logger.info("Streaming workflow endpoint called")
+                work_flow = WorkFlow(request=request)
+                yield format_sse("start", {"session_id": request.session_id})
+                async for event, data in astream_workflow_events(work_flow, request):
+                    yield format_sse(event, data)
+                yield format_sse("result", await asyncio.to_thread(build_chat_response, work_flow))
+        except Exception as e:
+            logger.error(f"Error streaming workflow: {str(e)}", exc_info=True)
+            yield format_sse("error", {"detail": f"Failed to launch workflow: {str(e)}"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/jobs/metrics")
+def jobs_metrics():
+    """Queue depth, in-flight and rejected submission counters of the job worker pool."""
+    return job_manager.metrics()
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    plans = []
+    current_step = ""
+    if job.work_flow is not None:
+        # Partial plans are read from the checkpointer while the graph is still running.
+        state_values = job.work_flow.workflow.get_state(job.work_flow.config).values
+        plans = state_values.get("plans", [])
+        current_step = state_values.get("current_step", "")
+    return {**job.to_dict(), "plan": format_plans_to_markdown(plans), "current_step": current_step}
+
+
+@app.get("/jobs/{job_id}/result", response_model=ChatBackgroundResponse)
+def job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status == JOB_FAILED:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to launch workflow: {str(e)}"
-        )
\ No newline at end of file
+            detail=f"Failed to launch workflow: {job.error}"
+        )
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    return job.result
@@ -0,0 +1,117 @@
+"""
+Concurrent sessions handled by one process against a stub LLM that takes LLM_DELAY seconds
+per call: the threaded job pool (one OS thread per in-flight session) versus the async
+workflow (one coroutine per in-flight session on a single event loop).
+
+Run from src/:  python -m benchmarks.async_load_test [sessions] [thread_workers]
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+os.environ["CHECKPOINTER_BACKEND"] = "memory"
+# Every session asks the same question: cached answers would hide the LLM wait being measured.
+os.environ["LLM_CACHE_ENABLED"] = "0"
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatResult, ChatGeneration
+import llm_factory.google
+
+LLM_DELAY = float(os.getenv("LLM_DELAY", "0.5"))
+
+
+class StubChat(BaseChatModel):
+    """Answers every prompt after LLM_DELAY seconds, like a provider call that is mostly waiting."""
+    model: str = "stub"
+
+    def __init__(self, **kwargs):
+        super().__init__(model=kwargs.get("model", "stub"))
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _result(self):
+        message = AIMessage(content="chat")
+        message.usage_metadata = {"input_tokens": 1, "output_tokens": 1, "total_tokens": 2}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(LLM_DELAY)
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(LLM_DELAY)
+        return self._result()
+
+
+llm_factory.google.ChatGoogleGenerativeAI = StubChat
+
+from llm_factory.rate_limiter import TokenBucket
+from workflow.nodes import get_nodes
+from workflow.graph import WorkFlow
+from workflow.jobs import JobManager
+
+# The provider quota is not what is measured here.
+for llm in get_nodes().llms.values():
+    llm.rate_limiter = TokenBucket("benchmark", 10 ** 9, burst=10 ** 6)
+
+
+class BenchmarkRequest():
+    def __init__(self, index):
+        self.query = "hi"
+        self.codebase = []
+        self.session_id = f"load-test-{index}"
+        self.sa_key_bucket_link = ""
+
+
+def run_threaded(sessions, workers):
+    done = threading.Semaphore(0)
+
+    def runner(job):
+        try:
+            return WorkFlow(job.request)(job.request)
+        finally:
+            done.release()
+
+    manager = JobManager(runner, max_workers=workers, max_queue=sessions)
+    start = time.perf_counter()
+    for index in range(sessions):
+        manager.submit(BenchmarkRequest(index))
+    for _ in range(sessions):
+        done.acquire()
+    return time.perf_counter() - start, threading.active_count()
+
+
+async def run_async(sessions):
+    start = time.perf_counter()
+    requests = [BenchmarkRequest(index) for index in range(sessions)]
+    await asyncio.gather(*(WorkFlow(request).ainvoke(request) for request in requests))
+    return time.perf_counter() - start, threading.active_count()
+
+
+def main(sessions=200, thread_workers=4):
+    # A greeting is routed by the local rules, each chat session makes one LLM call (chatbot).
+    ideal = LLM_DELAY
+    threaded_seconds, threaded_threads = run_threaded(sessions, thread_workers)
+    async_seconds, async_threads = asyncio.run(run_async(sessions))
+
+    print(f"{sessions} chat sessions, stub LLM latency {LLM_DELAY}s, ideal session time {ideal:.2f}s")
+    print(f"threaded ({thread_workers} workers):  {threaded_seconds:8.2f} s  "
+          f"{sessions / threaded_seconds:8.1f} sessions/s  "
+          f"~{sessions * ideal / threaded_seconds:6.1f} concurrent  {threaded_threads} threads")
+    print(f"async (1 event loop):     {async_seconds:8.2f} s  "
+          f"{sessions / async_seconds:8.1f} sessions/s  "
+          f"~{sessions * ideal / async_seconds:6.1f} concurrent  {async_threads} threads")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,113 @@
+"""
+Code search on a synthetic repository of 50k source files (plus .git objects and a vendored
+node_modules tree): the trigram index (build, incremental refresh, queries) versus the
+previous per-call `grep -rn` with its 5s timeout.
+
+Run from src/:  python -m benchmarks.code_search_benchmark [files]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+from tools.code_index import CodeIndex
+
+WORDS = ["project", "region", "bucket", "network", "subnet", "service", "account", "cluster", "node",
+         "pool", "labels", "name", "value", "config", "module", "source", "output", "variable", "zone"]
+QUERIES = [
+    ("rare literal", "needle_identifier_42", {}),
+    ("common literal", "resource \"google_storage_bucket\"", {}),
+    ("regex", r"def\s+handle_[a-z]+_request\(", {"regex": True}),
+    ("case-insensitive", "NETWORK_PEERING", {"case_sensitive": False}),
+    ("glob filter", "variable", {"glob": "*.tf"}),
+]
+
+
+def synthetic_line(rng):
+    kind = rng.random()
+    if kind < 0.1:
+        return f'resource "google_storage_bucket" "{rng.choice(WORDS)}_{rng.randrange(10 ** 6)}" {{'
+    if kind < 0.15:
+        return f"def handle_{rng.choice(WORDS)}_request(event, context):"
+    return "    " + " = ".join(f"{rng.choice(WORDS)}_{rng.randrange(1000)}" for _ in range(rng.randint(2, 5)))
+
+
+def build_repository(root, files, rng):
+    repo = os.path.join(root, "repo")
+    for index in range(files):
+        directory = os.path.join(repo, f"module_{index // 500}", f"pkg_{index // 50 % 10}")
+        os.makedirs(directory, exist_ok=True)
+        suffix = ".tf" if index % 3 == 0 else ".py"
+        lines = [synthetic_line(rng) for _ in range(rng.randint(10, 60))]
+        if index % 20000 == 7:
+            lines.append("needle_identifier_42 = True")
+        if index % 1000 == 3:
+            lines.append("network_peering = enabled")
+        with open(os.path.join(directory, f"file_{index}{suffix}"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+    # Files the index skips and grep does not.
+    for name, count in ((".git/objects", 5000), ("node_modules/lib", 5000), (".terraform/providers", 200)):
+        directory = os.path.join(repo, name)
+        os.makedirs(directory, exist_ok=True)
+        for index in range(count):
+            with open(os.path.join(directory, f"blob_{index}"), "w") as f:
+                f.write(f"network_{index} = needle_identifier_{index}\n" * 20)
+    with open(os.path.join(repo, ".gitignore"), "w") as f:
+        f.write("node_modules/\n*.tfstate\n")
+    return repo
+
+
+def timed(func, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def grep(root, query, options):
+    flags = "-rn" + ("E" if options.get("regex") else "F") + ("" if options.get("case_sensitive", True) else "i")
+    include = [f"--include={options['glob']}"] if options.get("glob") else []
+    result = subprocess.run(["timeout", "5s", "grep", flags, "--exclude=*.ipynb", *include, "--", query.replace(r"\s", "[[:space:]]"), "."],
+                            cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return result.returncode == 124, result.stdout.count("\n")
+
+
+def main(files=50000):
+    rng = random.Random(0)
+    root = tempfile.mkdtemp(prefix="code-search-benchmark-")
+    try:
+        start = time.perf_counter()
+        repo = build_repository(root, files, rng)
+        print(f"generated {files} files in {time.perf_counter() - start:.1f}s")
+
+        index = CodeIndex(root)
+        start = time.perf_counter()
+        index.build()
+        print(f"index build: {time.perf_counter() - start:.2f}s  {index.stats()}")
+
+        edited = os.path.join("repo", "module_0", "pkg_0", "file_1.py")
+        with open(os.path.join(root, edited), "a") as f:
+            f.write("needle_identifier_42 = False\n")
+        refresh_ms, _ = timed(lambda: index.refresh(edited), 1)
+        refresh_repo_ms, _ = timed(lambda: index.refresh("repo"), 1)
+        print(f"refresh one file: {refresh_ms:.2f} ms  refresh whole repo (stat walk): {refresh_repo_ms:.0f} ms\n")
+
+        print(f"{'query':18s} {'index ms':>9s} {'shown':>6s} {'cands':>6s} {'grep ms':>9s} {'grep lines':>11s}")
+        for label, query, options in QUERIES:
+            index_ms, results = timed(lambda: index.search(query, **options))
+            grep_ms, (timed_out, lines) = timed(lambda: grep(root, query, options), 3)
+            print(f"{label:18s} {index_ms:9.1f} {results['matches']:6d} {results['candidates']:6d} "
+                  f"{grep_ms:9.1f} {lines:11d}{'  (timed out)' if timed_out else ''}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
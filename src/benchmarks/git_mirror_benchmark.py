@@ -0,0 +1,76 @@
+"""
+Per-session clone time of a local file:// repository: a direct 'git clone --branch' (previous
+behaviour) versus a checkout from the shared mirror cache, cold (mirror created in each cold
+clone mode) and warm (mirror fresh, or fetched once its TTL expired).
+
+Run from src/:  python -m benchmarks.git_mirror_benchmark [files] [commits] [sessions]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+from utlis.git_mirror import GitMirrorCache, run_git
+
+
+def build_source(root, files, commits):
+    source = os.path.join(root, "source")
+    run_git(["init", "--quiet", "-b", "main", source])
+    run_git(["config", "uploadpack.allowFilter", "true"], cwd=source)
+    for commit in range(commits):
+        for index in range(commit, files, commits):
+            directory = os.path.join(source, f"module_{index % 50}")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f"file_{index}.tf"), "w") as f:
+                f.write(f'resource "google_storage_bucket" "b{index}" {{\n  name = "bucket-{index}-{commit}"\n}}\n' * 20)
+        run_git(["add", "-A"], cwd=source)
+        run_git(["-c", "user.email=bench@example.com", "-c", "user.name=bench", "commit", "--quiet", "-m", f"commit {commit}"], cwd=source)
+    return "file://" + source
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def direct_clone(url, destination):
+    subprocess.run(["git", "clone", "--quiet", "--branch", "main", url, destination], check=True)
+
+
+def main(files=5000, commits=20, sessions=10):
+    root = tempfile.mkdtemp(prefix="git-mirror-benchmark-")
+    try:
+        url = build_source(root, files, commits)
+        print(f"source: {files} files, {commits} commits")
+        samples = [timed(lambda i=i: direct_clone(url, os.path.join(root, "direct", str(i)))) for i in range(sessions)]
+        print(f"{'direct clone':28s} median {statistics.median(samples):8.1f} ms")
+        for mode in ("full", "partial", "shallow"):
+            mirrors = GitMirrorCache(root=os.path.join(root, f"mirrors-{mode}"), fetch_ttl_seconds=60, cold_clone=mode)
+            destination = lambda i: os.path.join(root, f"sessions-{mode}", str(i))
+            cold = timed(lambda: mirrors.clone(url, "main", destination(0)))
+            warm = [timed(lambda i=i: mirrors.clone(url, "main", destination(i))) for i in range(1, sessions)]
+            mirrors.fetch_ttl_seconds = 0
+            fetched = timed(lambda: mirrors.clone(url, "main", destination(sessions)))
+            print(f"{'mirror (' + mode + ')':28s} cold {cold:8.1f} ms  warm median {statistics.median(warm):8.1f} ms  "
+                  f"warm + fetch {fetched:8.1f} ms")
+        print(f"session checkout size: direct {du(os.path.join(root, 'direct', '0'))} KB, "
+              f"from mirror {du(os.path.join(root, 'sessions-full', '1'))} KB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def du(path):
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            total += os.lstat(os.path.join(directory, name)).st_size
+    return total // 1024
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
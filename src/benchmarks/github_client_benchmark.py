@@ -0,0 +1,124 @@
+"""
+Requests made to find the open PR between two branches on a repository with many open PRs,
+against a local stub of the GitHub pulls API: the previous bare requests.get of the unfiltered
+first page versus the pooled client (head/base filtered, paginated, conditional requests).
+The stub serves pages of 30 PRs with ETags and X-RateLimit headers, and answers the first
+request of each round with 429 + Retry-After when RATE_LIMIT_FIRST=1.
+
+Run from src/:  python -m benchmarks.github_client_benchmark [open_prs] [rounds]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import requests
+
+from utlis.github_client import GitHubClient
+
+PAGE_SIZE = 30
+
+
+class StubGitHub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    pulls = []
+    counters = {"requests": 0, "connections": 0, "bytes": 0, "not_modified": 0}
+    rate_limit_next = False
+
+    def setup(self):
+        super().setup()
+        StubGitHub.counters["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-RateLimit-Remaining", "4000")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        StubGitHub.counters["bytes"] += len(payload)
+
+    def do_GET(self):
+        StubGitHub.counters["requests"] += 1
+        if StubGitHub.rate_limit_next:
+            StubGitHub.rate_limit_next = False
+            return self.send_json(429, {"message": "secondary rate limit"}, [("Retry-After", "0")])
+        parts = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        pulls = [pr for pr in self.pulls
+                 if ("head" not in query or query["head"] == f"owner:{pr['head']['ref']}")
+                 and ("base" not in query or query["base"] == pr["base"]["ref"])]
+        per_page = int(query.get("per_page", PAGE_SIZE))
+        page = int(query.get("page", 1))
+        body = pulls[(page - 1) * per_page:page * per_page]
+        etag = '"' + hashlib.sha1(json.dumps(body).encode()).hexdigest() + '"'
+        headers = [("ETag", etag)]
+        if page * per_page < len(pulls):
+            query["page"] = str(page + 1)
+            next_query = "&".join(f"{key}={value}" for key, value in query.items())
+            headers.append(("Link", f'<http://{self.headers["Host"]}{parts.path}?{next_query}>; rel="next"'))
+        if self.headers.get("If-None-Match") == etag:
+            StubGitHub.counters["not_modified"] += 1
+            return self.send_json(304, None, headers)
+        self.send_json(200, body, headers)
+
+
+def previous_lookup(base_url, agent_branch):
+    response = requests.get(f"{base_url}/repos/owner/repo/pulls", params={"state": "open"},
+                            headers={"Authorization": "token t", "Accept": "application/vnd.github+json"})
+    if response.status_code != 200:
+        return []
+    return [pr for pr in response.json() if pr["head"]["ref"] == agent_branch and pr["base"]["ref"] == "main"]
+
+
+def client_lookup(client, agent_branch):
+    return list(client.paginate("/repos/owner/repo/pulls", "t",
+                                params={"state": "open", "head": f"owner:{agent_branch}", "base": "main"}))
+
+
+def measure(label, lookup, rounds):
+    for counter in StubGitHub.counters:
+        StubGitHub.counters[counter] = 0
+    found = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        StubGitHub.rate_limit_next = os.getenv("RATE_LIMIT_FIRST") == "1"
+        found += len(lookup())
+    elapsed = (time.perf_counter() - start) * 1000
+    counters = StubGitHub.counters
+    print(f"{label:34s} found {found}/{rounds}  {elapsed:8.1f} ms  requests {counters['requests']:4d}  "
+          f"connections {counters['connections']:4d}  304s {counters['not_modified']:4d}  KB {counters['bytes'] // 1024:6d}")
+
+
+def main(open_prs=300, rounds=20):
+    # The PR looked for is the oldest one, past the first page.
+    StubGitHub.pulls = [{"number": n, "title": f"PR {n}", "body": "x" * 500,
+                         "head": {"ref": f"devops-agent-{n}"}, "base": {"ref": "main"}}
+                        for n in range(open_prs, 0, -1)]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        print(f"stub: {open_prs} open PRs, {rounds} lookups of the oldest one")
+        measure("requests.get, first page, no filter", lambda: previous_lookup(base_url, "devops-agent-1"), rounds)
+        client = GitHubClient(base_url=base_url, backoff_seconds=0.01)
+        measure("client, head/base filter", lambda: client_lookup(client, "devops-agent-1"), rounds)
+        measure("client, full scan paginated", lambda: [pr for pr in client.paginate("/repos/owner/repo/pulls", "t", params={"state": "open"})
+                                                        if pr["head"]["ref"] == "devops-agent-1"], rounds)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,139 @@
+"""
+Tail latency of LLM calls with and without hedging, against two local OpenAI-compatible stub
+servers. The primary answers in ~50ms but 10% of its requests take 2s; the secondary always
+takes ~150ms. A third run makes the primary return 429 on 20% of the requests to exercise failover.
+
+Run from src/:  python -m benchmarks.provider_hedging_benchmark [requests]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ["LLM_CACHE_ENABLED"] = "0"
+os.environ.setdefault("STUB_LLM_API_KEY", "stub-key")
+
+from langchain_core.messages import HumanMessage
+from llm_factory.llm_config import LLM_CONFIG
+from llm_factory.openrouter_gen import OpenrouterGen
+from llm_factory.provider_router import HedgedLLM
+
+
+class StubBehaviour():
+    def __init__(self, latency, tail_latency=None, tail_fraction=0.0, error_fraction=0.0):
+        self.latency = latency
+        self.tail_latency = tail_latency
+        self.tail_fraction = tail_fraction
+        self.error_fraction = error_fraction
+
+
+def stub_server(name, behaviour):
+    """Start an OpenAI-compatible /v1/chat/completions stub on a free port, returns its base URL."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            if random.random() < behaviour.error_fraction:
+                body = json.dumps({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}}).encode()
+                self.send_response(429)
+            else:
+                slow = random.random() < behaviour.tail_fraction
+                time.sleep(behaviour.tail_latency if slow else behaviour.latency)
+                body = json.dumps({
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": name,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": f"answer from {name}"},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                }).encode()
+                self.send_response(200)
+            try:
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The hedged request lost and was cancelled by the client.
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def register_stub(config_name, base_url):
+    LLM_CONFIG[config_name] = {
+        "provider": "openrouter",
+        "model_name": config_name,
+        "api_key_env": "STUB_LLM_API_KEY",
+        "base_url": base_url,
+        "requests_per_minute": 10 ** 6,
+        "burst": 10 ** 6,
+        "client_retries": 0,
+        "max_rate_limit_retries": 0,
+    }
+    return OpenrouterGen(config_name, timeout=30)
+
+
+def summary(label, samples, errors=0):
+    ordered = sorted(samples)
+    p = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    print(f"{label:28s} p50 {p(0.5):7.1f} ms  p95 {p(0.95):7.1f} ms  p99 {p(0.99):7.1f} ms  "
+          f"mean {statistics.mean(ordered) * 1000:7.1f} ms  errors {errors}")
+
+
+def run_sync(llm, requests):
+    samples, errors = [], 0
+    for index in range(requests):
+        start = time.perf_counter()
+        try:
+            llm([HumanMessage(content=f"question {index}")], node="benchmark")
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - start)
+    return samples, errors
+
+
+async def run_async(llm, requests):
+    samples, errors = [], 0
+    for index in range(requests):
+        start = time.perf_counter()
+        try:
+            await llm.ainvoke(llm.llm, [HumanMessage(content=f"question {index}")], node="benchmark")
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - start)
+    return samples, errors
+
+
+def main(requests=200):
+    random.seed(0)
+    slow_primary = register_stub("stub-primary", stub_server("primary", StubBehaviour(0.05, 2.0, 0.10)))
+    failing_primary = register_stub("stub-failing", stub_server("failing", StubBehaviour(0.05, error_fraction=0.2)))
+    secondary = register_stub("stub-secondary", stub_server("secondary", StubBehaviour(0.15)))
+
+    summary("primary only", *run_sync(slow_primary, requests))
+    hedged = HedgedLLM(slow_primary, secondary, hedge_percentile=0.85, min_samples=20, hedge_after_seconds=1.0)
+    summary("hedged (sync)", *run_sync(hedged, requests))
+    print(f"  {hedged.stats()['nodes']['benchmark']}")
+    async_hedged = HedgedLLM(slow_primary, secondary, hedge_percentile=0.85, min_samples=20, hedge_after_seconds=1.0)
+    summary("hedged (async)", *asyncio.run(run_async(async_hedged, requests)))
+    print(f"  {async_hedged.stats()['nodes']['benchmark']}")
+
+    summary("429-prone primary only", *run_sync(failing_primary, requests))
+    failover = HedgedLLM(failing_primary, secondary, hedge_percentile=0.85, min_samples=20, hedge_after_seconds=1.0)
+    summary("429-prone primary, failover", *run_sync(failover, requests))
+    print(f"  {failover.stats()['nodes']['benchmark']}")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,110 @@
+"""
+'terraform init' time and .terraform size per session, without network: providers come from
+a local filesystem mirror holding a fake provider of PROVIDER_MB megabytes. Compares the
+previous behaviour (each session installs into its own .terraform), the shared plugin cache
+(sessions link to it) and a repeated init of an unchanged workspace (skipped).
+Needs terraform on the PATH.
+
+Run from src/:  python -m benchmarks.terraform_init_benchmark [sessions]
+"""
+import os
+import sys
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+
+from utlis.terraform_cache import TerraformCache
+
+PROVIDER_MB = int(os.getenv("PROVIDER_MB", "200"))
+CONFIGURATION = """terraform {
+  backend "local" {}
+  required_providers {
+    fake = { source = "example.com/bench/fake", version = "1.0.0" }
+  }
+}
+"""
+
+
+def build_mirror(root):
+    target = f"{platform.system().lower()}_{'arm64' if platform.machine() in ('arm64', 'aarch64') else 'amd64'}"
+    directory = os.path.join(root, "mirror", "example.com", "bench", "fake", "1.0.0", target)
+    os.makedirs(directory)
+    with open(os.path.join(directory, "terraform-provider-fake_v1.0.0"), "wb") as f:
+        f.write(os.urandom(1024 ** 2) * PROVIDER_MB)
+    os.chmod(os.path.join(directory, "terraform-provider-fake_v1.0.0"), 0o755)
+    return os.path.join(root, "mirror")
+
+
+def new_workspace(root, name):
+    work_dir = os.path.join(root, name)
+    os.makedirs(work_dir)
+    with open(os.path.join(work_dir, "main.tf"), "w") as f:
+        f.write(CONFIGURATION)
+    with open(os.path.join(work_dir, "backend.hcl"), "w") as f:
+        f.write('path = "terraform.tfstate"\n')
+    return work_dir
+
+
+def du(path):
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            total += os.lstat(os.path.join(directory, name)).st_size
+    return total // 1024 ** 2
+
+
+def init(cache, work_dir, env, command="terraform init -backend-config=backend.hcl"):
+    if cache.init_is_current(work_dir, command):
+        return
+    with cache.init_lock(work_dir):
+        result = subprocess.run(command, shell=True, cwd=work_dir, env=env, capture_output=True, text=True)
+    cache.record_init(work_dir, command, result.returncode == 0)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+
+def run(label, root, cache, env, sessions, repeat=False):
+    samples, sizes = [], []
+    for session in range(sessions):
+        work_dir = new_workspace(root, f"{label.replace(' ', '-')}-{session}")
+        if repeat:
+            init(cache, work_dir, env)
+        start = time.perf_counter()
+        init(cache, work_dir, env)
+        samples.append((time.perf_counter() - start) * 1000)
+        sizes.append(du(os.path.join(work_dir, ".terraform")))
+    print(f"{label:28s} first {samples[0]:8.1f} ms  next median {sorted(samples[1:])[len(samples[1:]) // 2]:8.1f} ms  "
+          f".terraform {sizes[-1]} MB per session")
+
+
+def main(sessions=5):
+    if shutil.which("terraform") is None:
+        print("terraform is not on the PATH")
+        return
+    root = tempfile.mkdtemp(prefix="terraform-init-benchmark-")
+    try:
+        mirror = build_mirror(root)
+        env = {**os.environ, "CHECKPOINT_DISABLE": "1"}
+        env.pop("TF_CLI_CONFIG_FILE", None)
+        env.pop("TF_PLUGIN_CACHE_DIR", None)
+        print(f"fake provider: {PROVIDER_MB} MB, {sessions} sessions")
+        # Previous behaviour: no plugin cache, every init installs the provider into its workspace.
+        private_config = os.path.join(root, "private.tfrc")
+        with open(private_config, "w") as f:
+            f.write(f'provider_installation {{\n  filesystem_mirror {{\n    path = "{mirror}"\n  }}\n}}\n')
+        private = TerraformCache(root=os.path.join(root, "private"), reuse_init=False)
+        run("per-session install", root, private, {**env, "TF_CLI_CONFIG_FILE": private_config}, sessions)
+        shared = TerraformCache(root=os.path.join(root, "shared"), provider_mirror=mirror, mirror_only=True)
+        shared_env = shared.environment(env)
+        run("shared plugin cache", root, shared, shared_env, sessions)
+        run("unchanged, init skipped", root, shared, shared_env, sessions, repeat=True)
+        print(f"shared plugin cache: {du(shared.plugin_cache_dir)} MB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,51 @@
+"""
+Per-request setup cost of the workflow: rebuilding Nodes + compiling the graph on every
+request (previous behaviour) versus reusing the process-wide compiled graph.
+
+Run from src/:  python -m benchmarks.workflow_setup_benchmark
+"""
+import os
+import time
+import statistics
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+
+from langgraph.checkpoint.memory import MemorySaver
+from workflow.nodes import Nodes
+from workflow.graph import WorkFlow, build_workflow, get_workflow
+from tools.registry import TOOLS, get_tool
+
+
+class BenchmarkRequest():
+    query = "hi"
+    codebase = []
+    session_id = "benchmark-session"
+    sa_key_bucket_link = ""
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(repeat=20):
+    startup_ms = timed(get_workflow, 1)
+    per_request_rebuild_ms = timed(lambda: build_workflow(Nodes(), MemorySaver()), repeat)
+    per_request_shared_ms = timed(lambda: WorkFlow(BenchmarkRequest), repeat)
+    tool_name = TOOLS[-1].__name__
+    lookup_scan_ms = timed(lambda: next(t for t in Nodes().tools if t.__name__ == tool_name), repeat)
+    lookup_registry_ms = timed(lambda: get_tool(tool_name), repeat)
+
+    print(f"one-off startup build:             {startup_ms:10.3f} ms")
+    print(f"per-request setup (rebuild):       {per_request_rebuild_ms:10.3f} ms")
+    print(f"per-request setup (shared graph):  {per_request_shared_ms:10.3f} ms")
+    print(f"tool lookup (new Nodes + scan):    {lookup_scan_ms:10.3f} ms")
+    print(f"tool lookup (registry):            {lookup_registry_ms:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from dotenv import load_dotenv
+from llm_factory.llm_config import LLM_CONFIG
+from llm_factory.rate_limiter import get_rate_limiter, is_rate_limit_error
+from llm_factory.response_cache import get_response_cache, cache_key
+from llm_factory.node_metrics import get_node_metrics
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class BaseGen(ABC):
+    """
+    Provider-independent LLM wrapper: response cache, shared rate limiter with retries on
+    quota errors, and per-node metrics. Subclasses build the LangChain chat model in build_llm.
+    """
+    def __init__(self, config_name, timeout=None, max_tokens=None):
+        load_dotenv()
+        config = LLM_CONFIG[config_name]
+        self.config_name = config_name
+        self.provider = config["provider"]
+        self.model_name = config["model_name"]
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+        self.max_rate_limit_retries = config.get("max_rate_limit_retries", 3)
+        self.rate_limiter = get_rate_limiter(self.provider, self.model_name,
+                                             config.get("requests_per_minute", 60), config.get("burst", 1))
+        self.llm = self.build_llm(config, os.getenv(config["api_key_env"]))
+        self.llm_with_tools = None
+    @abstractmethod
+    def build_llm(self, config, api_key):
+        """The LangChain chat model of config, authenticated with api_key."""
+    def bind_tools(self, tools):
+        self.llm_with_tools = self.llm.bind_tools(tools)
+        return self.llm_with_tools
+    def __call__(self, messages, node=None):
+        response=self.invoke(self.llm, messages, node=node)
+        return response
+    def _cached(self, runnable, messages, node):
+        """Returns (cache, key, cached response) for a node call; cache and key are None when not cached."""
+        cache = get_response_cache() if node else None
+        if cache is None or cache.ttl(node) <= 0:
+            return None, None, None
+        key = cache_key(self.model_name, runnable, messages)
+        response = cache.get(key, node)
+        if response is not None:
+            # A new message id, so the reducer appends it instead of replacing an earlier message.
+            response.id = None
+            logger.info(f"LLM cache hit for node {node}")
+        return cache, key, response
+    def invoke(self, runnable, messages, node=None, rate_limit_retries=None):
+        """
+        Invoke runnable (the LLM or the LLM with tools) through the response cache of the
+        node, then the shared rate limiter. Cache hits are marked response_metadata['cached'].
+        rate_limit_retries overrides the configured retries, e.g. 0 to fail over at once.
+        """
+        start = time.perf_counter()
+        cache, key, response = self._cached(runnable, messages, node)
+        if response is None:
+            try:
+                response = self._invoke_with_retries(runnable, messages, rate_limit_retries)
+            except Exception:
+                get_node_metrics().record_error(node, self.model_name)
+                raise
+            if cache is not None:
+                cache.put(key, node, response)
+        get_node_metrics().record(node, self.model_name, time.perf_counter() - start, response)
+        return response
+    def _invoke_with_retries(self, runnable, messages, rate_limit_retries=None):
+        """
+        Quota errors shrink the limiter rate and are retried; the total time spent waiting
+        for budget is reported in response_metadata['rate_limit_wait_seconds'].
+        """
+        retries = self.max_rate_limit_retries if rate_limit_retries is None else rate_limit_retries
+        waited = 0.0
+        for attempt in range(retries + 1):
+            waited += self.rate_limiter.acquire()
+            try:
+                response = runnable.invoke(messages)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.rate_limiter.on_rate_limited()
+                if attempt == retries:
+                    raise
+                continue
+            self.rate_limiter.on_success()
+            response.response_metadata["rate_limit_wait_seconds"] = waited
+            if waited:
+                logger.info(f"Waited {waited:.2f}s for {self.provider}/{self.model_name} rate limit budget")
+            return response
+    async def ainvoke(self, runnable, messages, node=None, rate_limit_retries=None):
+        """Async variant of invoke: waits for budget and for the provider without holding a thread."""
+        start = time.perf_counter()
+        cache, key, response = self._cached(runnable, messages, node)
+        if response is None:
+            try:
+                response = await self._ainvoke_with_retries(runnable, messages, rate_limit_retries)
+            except Exception:
+                get_node_metrics().record_error(node, self.model_name)
+                raise
+            if cache is not None:
+                cache.put(key, node, response)
+        get_node_metrics().record(node, self.model_name, time.perf_counter() - start, response)
+        return response
+    async def _ainvoke_with_retries(self, runnable, messages, rate_limit_retries=None):
+        retries = self.max_rate_limit_retries if rate_limit_retries is None else rate_limit_retries
+        waited = 0.0
+        for attempt in range(retries + 1):
+            waited += await self.rate_limiter.aacquire()
+            try:
+                response = await runnable.ainvoke(messages)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self.rate_limiter.on_rate_limited()
+                if attempt == retries:
+                    raise
+                continue
+            self.rate_limiter.on_success()
+            response.response_metadata["rate_limit_wait_seconds"] = waited
+            if waited:
+                logger.info(f"Waited {waited:.2f}s for {self.provider}/{self.model_name} rate limit budget")
+            return response
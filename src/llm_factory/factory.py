@@ -0,0 +1,68 @@
+import os
+import json
+import threading
+import logging
+from llm_factory.llm_config import LLM_CONFIG, NODE_MODELS
+from llm_factory.google import GoogleGen
+from llm_factory.openrouter_gen import OpenrouterGen
+from llm_factory.provider_router import HedgedLLM
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    "gemini": GoogleGen,
+    "openrouter": OpenrouterGen,
+}
+
+_llms = {}
+_llms_lock = threading.Lock()
+
+
+def create_llm(config_name, timeout=None, max_tokens=None):
+    """
+    Return the LLM wrapper for an LLM_CONFIG entry. Wrappers are shared by the nodes with the
+    same model, timeout and token limit.
+    """
+    key = (config_name, timeout, max_tokens)
+    with _llms_lock:
+        if key not in _llms:
+            provider = LLM_CONFIG[config_name]["provider"]
+            if provider not in PROVIDERS:
+                raise ValueError(f"Unsupported LLM provider: {provider}")
+            _llms[key] = PROVIDERS[provider](config_name, timeout=timeout, max_tokens=max_tokens)
+        return _llms[key]
+
+
+def node_model_assignments():
+    """NODE_MODELS, with overrides from the LLM_NODE_MODELS environment variable (JSON, same shape)."""
+    assignments = {node: dict(assignment) for node, assignment in NODE_MODELS.items()}
+    overrides = os.getenv("LLM_NODE_MODELS")
+    if overrides:
+        for node, assignment in json.loads(overrides).items():
+            assignments.setdefault(node, {}).update(assignment)
+    return assignments
+
+
+def get_node_llm(node):
+    assignment = node_model_assignments().get(node, {})
+    llm = create_llm(assignment.get("model", "gemini"), assignment.get("timeout"), assignment.get("max_tokens"))
+    logger.info(f"Node {node} uses {llm.provider}/{llm.model_name}")
+    fallback = assignment.get("fallback")
+    if not fallback:
+        return llm
+    if not os.getenv(LLM_CONFIG[fallback["model"]]["api_key_env"]):
+        logger.warning(f"Fallback model {fallback['model']} of node {node} has no API key, hedging disabled")
+        return llm
+    secondary = create_llm(fallback["model"], fallback.get("timeout"), fallback.get("max_tokens"))
+    logger.info(f"Node {node} hedges to {secondary.provider}/{secondary.model_name}")
+    return HedgedLLM(
+        llm,
+        secondary,
+        hedge_percentile=assignment.get("hedge_percentile", 0.95),
+        min_samples=assignment.get("hedge_min_samples", 20),
+        hedge_after_seconds=assignment.get("hedge_after_seconds", 20.0),
+    )
@@ -1,15 +1,10 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
-from llm_factory.llm_config import LLM_CONFIG
-import os
+from llm_factory.base import BaseGen
 
 
-class GoogleGen():
-    def __init__(self):
-        load_dotenv()
-        config = LLM_CONFIG["gemini"]
-        api_key = os.getenv(config["api_key_env"])
-        self.llm = ChatGoogleGenerativeAI(model=config["model_name"], temperature=0, google_api_key=api_key)    
-    def __call__(self, messages):
-        response=self.llm.invoke(messages)
-        return response
\ No newline at end of file
+class GoogleGen(BaseGen):
+    def __init__(self, config_name="gemini", timeout=None, max_tokens=None):
+        super().__init__(config_name, timeout=timeout, max_tokens=max_tokens)
+    def build_llm(self, config, api_key):
+        return ChatGoogleGenerativeAI(model=config["model_name"], temperature=0, google_api_key=api_key,
+                                      timeout=self.timeout, max_output_tokens=self.max_tokens)
@@ -3,7 +3,28 @@ LLM_CONFIG = {
     "gemini": {
         "provider": "gemini",
         "model_name": "gemini-2.5-flash",
-        "api_key_env": "GOOGLE_API_KEY"
+        "api_key_env": "GOOGLE_API_KEY",
+        # Shared by every session of the process, see llm_factory/rate_limiter.py
+        "requests_per_minute": 60,
+        "burst": 5,
+        "max_rate_limit_retries": 3
+    },
+    "gemini-lite": {
+        "provider": "gemini",
+        "model_name": "gemini-2.5-flash-lite",
+        "api_key_env": "GOOGLE_API_KEY",
+        "requests_per_minute": 60,
+        "burst": 5,
+        "max_rate_limit_retries": 3
+    },
+    "openrouter": {
+        "provider": "openrouter",
+        "model_name": "openai/chatgpt-4o-latest",
+        "api_key_env": "OPENROUTER_API_KEY",
+        "base_url": "https://openrouter.ai/api/v1",
+        "requests_per_minute": 60,
+        "burst": 5,
+        "max_rate_limit_retries": 3
     },
     "anthropic": {
         "provider": "anthropic",
@@ -15,4 +36,22 @@ LLM_CONFIG = {
         "model_name": "gpt-3.5-turbo",
         "api_key_env": "OPENAI_API_KEY"
     }
-}
\ No newline at end of file
+}
+
+# Model used by each graph node, with its own request timeout (seconds) and output token limit.
+# Routing, small talk and summaries go to the low-latency model, planning and tool use to the
+# stronger one. See llm_factory/factory.py; per-node metrics are reported under /llm/metrics.
+# An optional fallback model gets a hedged duplicate request when the primary is slower than its
+# hedge_percentile latency, and the request on primary errors (llm_factory/provider_router.py).
+# It is only used when the fallback's API key is set.
+NODE_MODELS = {
+    "router": {"model": "gemini-lite", "timeout": 15, "max_tokens": 1024},
+    "chatbot": {"model": "gemini-lite", "timeout": 30, "max_tokens": 2048},
+    "planner": {"model": "gemini", "timeout": 120, "max_tokens": 4096,
+                "fallback": {"model": "openrouter", "timeout": 120, "max_tokens": 4096},
+                "hedge_percentile": 0.95},
+    "executor": {"model": "gemini", "timeout": 120, "max_tokens": 8192,
+                 "fallback": {"model": "openrouter", "timeout": 120, "max_tokens": 8192},
+                 "hedge_percentile": 0.95},
+    "summarizer": {"model": "gemini-lite", "timeout": 60, "max_tokens": 4096},
+}
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+
+LATENCY_SAMPLES = 500
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class NodeMetrics():
+    """Per graph node LLM latency and token usage, to tune which model each node is assigned."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes = {}
+
+    def _node(self, node, model):
+        node = node or "unassigned"
+        if node not in self.nodes:
+            self.nodes[node] = {
+                "model": model,
+                "calls": 0,
+                "cached_calls": 0,
+                "errors": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "latencies": deque(maxlen=LATENCY_SAMPLES),
+            }
+        metrics = self.nodes[node]
+        metrics["model"] = model
+        return metrics
+
+    def record(self, node, model, latency, response):
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self.lock:
+            metrics = self._node(node, model)
+            if response.response_metadata.get("cached"):
+                metrics["cached_calls"] += 1
+                return
+            metrics["calls"] += 1
+            metrics["input_tokens"] += usage.get("input_tokens", 0)
+            metrics["output_tokens"] += usage.get("output_tokens", 0)
+            # Provider latency: the time spent waiting for rate limit budget is reported by the limiter.
+            metrics["latencies"].append(max(0.0, latency - response.response_metadata.get("rate_limit_wait_seconds", 0)))
+
+    def record_error(self, node, model):
+        with self.lock:
+            self._node(node, model)["errors"] += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                node: {
+                    "model": metrics["model"],
+                    "calls": metrics["calls"],
+                    "cached_calls": metrics["cached_calls"],
+                    "errors": metrics["errors"],
+                    "input_tokens": metrics["input_tokens"],
+                    "output_tokens": metrics["output_tokens"],
+                    "avg_input_tokens": round(metrics["input_tokens"] / metrics["calls"], 1) if metrics["calls"] else 0.0,
+                    "avg_output_tokens": round(metrics["output_tokens"] / metrics["calls"], 1) if metrics["calls"] else 0.0,
+                    "p50_latency_seconds": round(percentile(metrics["latencies"], 0.5), 3),
+                    "p95_latency_seconds": round(percentile(metrics["latencies"], 0.95), 3),
+                } for node, metrics in self.nodes.items()
+            }
+
+
+_node_metrics = NodeMetrics()
+
+def get_node_metrics():
+    return _node_metrics
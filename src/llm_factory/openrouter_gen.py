@@ -1,15 +1,26 @@
-from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from langchain_core.tools import StructuredTool
+from llm_factory.base import BaseGen
 
-class OpenrouterGen():
-    def __init__(self):
-        load_dotenv() 
-        llm = ChatOpenAI(
-            model="openai/chatgpt-4o-latest",
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class OpenrouterGen(BaseGen):
+    def __init__(self, config_name="openrouter", timeout=None, max_tokens=None):
+        super().__init__(config_name, timeout=timeout, max_tokens=max_tokens)
+    def build_llm(self, config, api_key):
+        return ChatOpenAI(
+            model=config["model_name"],
             temperature=0,
-            base_url="https://openrouter.ai/api/v1"
+            api_key=api_key,
+            base_url=config.get("base_url", OPENROUTER_BASE_URL),
+            timeout=self.timeout,
+            max_tokens=self.max_tokens,
+            # Retries inside the OpenAI client; 0 leaves quota errors to BaseGen retries and failover.
+            max_retries=config.get("client_retries", 2),
         )
-    def __call__(self, messages):
-        response=self.llm.invoke(messages)
-        return response
-    
\ No newline at end of file
+    def bind_tools(self, tools):
+        # The OpenAI converter parses plain functions' docstrings strictly (Google style) and rejects
+        # ours; as StructuredTools the docstring is kept whole as the description.
+        self.llm_with_tools = self.llm.bind_tools([StructuredTool.from_function(tool) for tool in tools])
+        return self.llm_with_tools
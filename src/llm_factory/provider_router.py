@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from llm_factory.node_metrics import percentile
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 200
+
+# Sync hedged calls run both requests on this pool; the calling thread only waits.
+hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_MAX_WORKERS", "32")), thread_name_prefix="llm-hedge")
+
+
+class HedgedLLM():
+    """
+    Pair of LLM wrappers (BaseGen) used as one. A request goes to the primary; when it has not
+    answered after the hedge_percentile latency of its recent calls (hedge_after_seconds
+    until min_samples are known), a duplicate goes to the secondary and the first response wins,
+    the other request being cancelled. Primary errors, quota exhaustion included, fail over to the
+    secondary at once.
+    """
+    def __init__(self, primary, secondary, hedge_percentile=0.95, min_samples=20, hedge_after_seconds=20.0):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.hedge_after_seconds = hedge_after_seconds
+        self.provider = primary.provider
+        self.model_name = primary.model_name
+        self.llm = primary.llm
+        self.llm_with_tools = None
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.counters = {}
+        _routers.append(self)
+
+    def bind_tools(self, tools):
+        self.llm_with_tools = self.primary.bind_tools(tools)
+        self.secondary.bind_tools(tools)
+        return self.llm_with_tools
+
+    def __call__(self, messages, node=None):
+        return self.invoke(self.llm, messages, node=node)
+
+    def hedge_delay(self, node):
+        with self.lock:
+            samples = self.latencies.get(node)
+            if not samples or len(samples) < self.min_samples:
+                return self.hedge_after_seconds
+            return percentile(samples, self.hedge_percentile)
+
+    def _count(self, node, counter):
+        with self.lock:
+            counters = self.counters.setdefault(node, {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "failures": 0})
+            counters[counter] += 1
+
+    def _record_latency(self, node, latency):
+        with self.lock:
+            self.latencies.setdefault(node, deque(maxlen=LATENCY_SAMPLES)).append(latency)
+
+    def _runnable(self, llm, with_tools):
+        return llm.llm_with_tools if with_tools else llm.llm
+
+    def _call_primary(self, with_tools, messages, node):
+        start = time.perf_counter()
+        response = self.primary.invoke(self._runnable(self.primary, with_tools), messages, node=node, rate_limit_retries=0)
+        self._record_latency(node, time.perf_counter() - start)
+        return response
+
+    def _call_secondary(self, with_tools, messages, node):
+        return self.secondary.invoke(self._runnable(self.secondary, with_tools), messages, node=node)
+
+    def _submit(self, func, *args):
+        # Each request runs in a copy of the caller's context, so LangGraph streaming callbacks still see it.
+        return hedge_pool.submit(contextvars.copy_context().run, func, *args)
+
+    def invoke(self, runnable, messages, node=None):
+        with_tools = runnable is not None and runnable is self.llm_with_tools
+        self._count(node, "requests")
+        primary = self._submit(self._call_primary, with_tools, messages, node)
+        done, _ = wait([primary], timeout=self.hedge_delay(node))
+        if primary in done:
+            try:
+                return primary.result()
+            except Exception as e:
+                logger.warning(f"Primary {self.primary.model_name} failed for node {node}, failing over: {str(e)}")
+                self._count(node, "failovers")
+                try:
+                    return self._call_secondary(with_tools, messages, node)
+                except Exception:
+                    self._count(node, "failures")
+                    raise
+        self._count(node, "hedged")
+        logger.info(f"Primary {self.primary.model_name} slow for node {node}, hedging to {self.secondary.model_name}")
+        secondary = self._submit(self._call_secondary, with_tools, messages, node)
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                # A request already sent cannot be interrupted from another thread; its result is dropped.
+                for other in pending:
+                    other.cancel()
+                if future is secondary:
+                    self._count(node, "hedge_wins")
+                return response
+        self._count(node, "failures")
+        raise error
+
+    async def _acall_primary(self, with_tools, messages, node):
+        start = time.perf_counter()
+        try:
+            response = await self.primary.ainvoke(self._runnable(self.primary, with_tools), messages, node=node, rate_limit_retries=0)
+        except asyncio.CancelledError:
+            # Lost to the hedge: its latency is at least the time elapsed, keep that so that slow
+            # primaries are not dropped from the samples (which would lower the hedge delay).
+            self._record_latency(node, time.perf_counter() - start)
+            raise
+        self._record_latency(node, time.perf_counter() - start)
+        return response
+
+    async def _acall_secondary(self, with_tools, messages, node):
+        return await self.secondary.ainvoke(self._runnable(self.secondary, with_tools), messages, node=node)
+
+    async def ainvoke(self, runnable, messages, node=None):
+        with_tools = runnable is not None and runnable is self.llm_with_tools
+        self._count(node, "requests")
+        primary = asyncio.ensure_future(self._acall_primary(with_tools, messages, node))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay(node))
+            if primary in done:
+                pending = set()
+                if primary.exception() is None:
+                    return primary.result()
+                logger.warning(f"Primary {self.primary.model_name} failed for node {node}, failing over: {str(primary.exception())}")
+                self._count(node, "failovers")
+                try:
+                    return await self._acall_secondary(with_tools, messages, node)
+                except Exception:
+                    self._count(node, "failures")
+                    raise
+            self._count(node, "hedged")
+            logger.info(f"Primary {self.primary.model_name} slow for node {node}, hedging to {self.secondary.model_name}")
+            secondary = asyncio.ensure_future(self._acall_secondary(with_tools, messages, node))
+            pending = {primary, secondary}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is secondary:
+                        self._count(node, "hedge_wins")
+                    return task.result()
+            self._count(node, "failures")
+            raise error
+        finally:
+            # The losing request (or both, if the caller is cancelled) is cancelled, closing its connection.
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        with self.lock:
+            nodes = {}
+            for node, counters in self.counters.items():
+                requests = counters["requests"]
+                samples = self.latencies.get(node)
+                nodes[node or "unassigned"] = {
+                    **counters,
+                    "hedge_rate": round(counters["hedged"] / requests, 4) if requests else 0.0,
+                    "fallback_rate": round(counters["failovers"] / requests, 4) if requests else 0.0,
+                    "hedge_after_seconds": round(
+                        percentile(samples, self.hedge_percentile)
+                        if samples and len(samples) >= self.min_samples else self.hedge_after_seconds, 3),
+                }
+            return {
+                "primary": f"{self.primary.provider}/{self.primary.model_name}",
+                "secondary": f"{self.secondary.provider}/{self.secondary.model_name}",
+                "hedge_percentile": self.hedge_percentile,
+                "nodes": nodes,
+            }
+
+
+_routers = []
+
+def provider_router_stats():
+    return [router.stats() for router in _routers]
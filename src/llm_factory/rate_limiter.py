@@ -0,0 +1,137 @@
+import time
+import asyncio
+import threading
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ERROR_NAMES = ("ResourceExhausted", "RateLimitError", "TooManyRequests")
+RESOURCE_EXHAUSTED = "RESOURCE_EXHAUSTED"
+
+
+def error_statuses(error):
+    """HTTP and gRPC statuses an SDK error carries, as attributes of the error or of its response."""
+    statuses = [getattr(error, "status_code", None), getattr(error, "status", None),
+                getattr(getattr(error, "response", None), "status_code", None),
+                getattr(error, "grpc_status_code", None)]
+    code = getattr(error, "code", None)
+    if callable(code):
+        # grpc.RpcError.code() returns the grpc.StatusCode.
+        try:
+            code = code()
+        except Exception:
+            code = None
+    statuses.append(code)
+    # HTTPStatus values compare as ints, grpc.StatusCode values by name.
+    return [status if isinstance(status, int) else getattr(status, "name", status) for status in statuses if status is not None]
+
+
+def is_rate_limit_error(error):
+    """True for provider quota errors (HTTP 429 / gRPC RESOURCE_EXHAUSTED), whatever the SDK wrapping them."""
+    while error is not None:
+        if type(error).__name__ in RATE_LIMIT_ERROR_NAMES:
+            return True
+        for status in error_statuses(error):
+            if status == 429 or status == RESOURCE_EXHAUSTED:
+                return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucket():
+    """
+    Token bucket shared by every caller of one provider/model.
+    Calls go out immediately while tokens are available. The refill rate is halved on every
+    rate-limit error (down to min_rate_per_minute) and recovers additively on successes.
+    """
+    def __init__(self, name, rate_per_minute, burst=1, min_rate_per_minute=1):
+        self.name = name
+        self.max_rate = rate_per_minute / 60
+        self.min_rate = min(min_rate_per_minute, rate_per_minute) / 60
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled_calls = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        """Take one token, possibly going into debt, and return how long the caller must wait."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            self.calls += 1
+            if wait > 0:
+                self.throttled_calls += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_rate_limited(self):
+        with self.lock:
+            self.rate_limited += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Drop the buffered burst: the provider just told us we are over quota.
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning(f"Rate limited on {self.name}, backing off to {self.rate * 60:.1f} requests/min")
+
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests_per_minute": round(self.rate * 60, 2),
+                "max_requests_per_minute": round(self.max_rate * 60, 2),
+                "calls": self.calls,
+                "throttled_calls": self.throttled_calls,
+                "rate_limited": self.rate_limited,
+                "total_wait_seconds": round(self.total_wait, 3),
+                "avg_wait_seconds": round(self.total_wait / self.calls, 3) if self.calls else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider, model_name, requests_per_minute=60, burst=1):
+    """Return the process-wide limiter for (provider, model_name), creating it on first use."""
+    key = (provider, model_name)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = TokenBucket(f"{provider}/{model_name}", requests_per_minute, burst)
+        return _limiters[key]
+
+
+def rate_limiter_stats():
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {limiter.name: limiter.stats() for limiter in limiters.values()}
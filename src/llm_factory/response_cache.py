@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from langchain_core.messages import messages_to_dict, messages_from_dict
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Seconds a response stays valid, per node. 0 disables caching for the node. Router and
+# chatbot answers only depend on the query; planner/executor prompts embed the tool outputs,
+# so a hit means the exact same situation, but is kept short since the world may have moved on.
+DEFAULT_NODE_TTLS = {
+    "router": 24 * 3600,
+    "chatbot": 24 * 3600,
+    "summarizer": 3600,
+    "planner": 600,
+    "executor": 600,
+}
+
+
+def normalize_message(message):
+    """The parts of a message that reach the model: ids and response metadata are left out."""
+    normalized = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in tool_calls]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        normalized["tool_call_id"] = tool_call_id
+    return normalized
+
+
+def cache_key(model_name, runnable, messages):
+    """Hash of the model, the kwargs bound to the runnable (e.g. tools) and the normalized messages."""
+    payload = json.dumps({
+        "model": model_name,
+        "bound": getattr(runnable, "kwargs", {}),
+        "messages": [normalize_message(message) for message in messages],
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache():
+    """
+    LLM response cache: an in-process LRU, backed by an optional SQLite table shared by
+    workers and restarts. Entries expire after the TTL of the node that produced them.
+    """
+    def __init__(self, max_entries=1024, node_ttls=None, db_path=None):
+        self.max_entries = max_entries
+        self.node_ttls = dict(DEFAULT_NODE_TTLS if node_ttls is None else node_ttls)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def ttl(self, node):
+        return self.node_ttls.get(node, 0)
+
+    def _count(self, counter, node):
+        with self.lock:
+            counter[node] = counter.get(node, 0) + 1
+
+    def get(self, key, node):
+        """Return a fresh copy of the cached response marked cached=True, or None."""
+        now = time.time()
+        value = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.entries.move_to_end(key)
+                    value = entry[0]
+                else:
+                    del self.entries[key]
+            if value is None and self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT value, expires_at FROM llm_responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self._store(key, value, row[1])
+        if value is None:
+            self._count(self.misses, node)
+            return None
+        self._count(self.hits, node)
+        response = messages_from_dict(json.loads(value))[0]
+        response.response_metadata["cached"] = True
+        response.response_metadata["rate_limit_wait_seconds"] = 0.0
+        return response
+
+    def _store(self, key, value, expires_at):
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key, node, response):
+        ttl = self.ttl(node)
+        if ttl <= 0:
+            return
+        value = json.dumps(messages_to_dict([response]), default=str)
+        expires_at = time.time() + ttl
+        with self.lock:
+            self._store(key, value, expires_at)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self.conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+                self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            nodes = sorted(set(self.hits) | set(self.misses))
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "sqlite": self.conn is not None,
+                "nodes": {
+                    node: {
+                        "hits": self.hits.get(node, 0),
+                        "misses": self.misses.get(node, 0),
+                        "ttl_seconds": self.ttl(node),
+                    } for node in nodes
+                },
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """
+    Return the process-wide cache, or None when LLM_CACHE_ENABLED=0. Per node TTLs can be
+    overridden with LLM_CACHE_TTL_<NODE> (seconds), the SQLite tier is enabled by LLM_CACHE_DB_PATH.
+    """
+    global _cache
+    if os.getenv("LLM_CACHE_ENABLED", "1") != "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                node_ttls = {
+                    node: int(os.getenv(f"LLM_CACHE_TTL_{node.upper()}", str(ttl)))
+                    for node, ttl in DEFAULT_NODE_TTLS.items()
+                }
+                _cache = ResponseCache(
+                    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                    node_ttls=node_ttls,
+                    db_path=os.getenv("LLM_CACHE_DB_PATH"),
+                )
+    return _cache
+
+
+def response_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
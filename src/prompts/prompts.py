@@ -0,0 +1,113 @@
+import os
+import json
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+from jinja2 import Environment, FileSystemLoader
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+TEMPLATES_DIR = os.path.join(current_dir, "templates")
+
+
+class PromptRegistry():
+    """
+    Compiles every template of templates_dir once and renders them from memory.
+    With hot_reload, Jinja re-checks each template's mtime on use and recompiles it when
+    it changed on disk, for editing prompts without restarting the server.
+
+    render(name, static=..., **dynamic) also caches the template rendered with the static
+    variables (e.g. codebase and tool names, fixed for a whole session), so later calls only
+    splice the dynamic values in. Dynamic variables must be plain {{ name }} outputs for that.
+    """
+    def __init__(self, templates_dir=TEMPLATES_DIR, hot_reload=False, max_cached_renders=256):
+        self.templates_dir = templates_dir
+        self.hot_reload = hot_reload
+        self.env = Environment(
+            loader=FileSystemLoader(templates_dir),
+            auto_reload=hot_reload,
+            cache_size=-1,
+        )
+        self.max_cached_renders = max_cached_renders
+        self.renders = OrderedDict()
+        self.lock = threading.Lock()
+        self.render_hits = 0
+        self.render_misses = 0
+        for name in self.env.list_templates(extensions=["jinja"]):
+            self.env.get_template(name)
+        logger.info(f"Compiled prompt templates from {templates_dir} (hot reload: {hot_reload})")
+
+    def get_template(self, name):
+        return self.env.get_template(name)
+
+    def _skeleton(self, name, static, dynamic_names):
+        template = self.get_template(name)
+        # A reloaded template is a new object, so its id keeps stale skeletons out.
+        key = (name, id(template), json.dumps(static, sort_keys=True, default=str), dynamic_names)
+        with self.lock:
+            skeleton = self.renders.get(key)
+            if skeleton is not None:
+                self.renders.move_to_end(key)
+                self.render_hits += 1
+                return skeleton
+            self.render_misses += 1
+        markers = {variable: f"\x00{uuid.uuid4().hex}\x00" for variable in dynamic_names}
+        rendered = template.render(**static, **markers)
+        # Split the rendered text into literal parts and variable slots, in order of appearance.
+        skeleton = [rendered]
+        for variable, marker in markers.items():
+            parts = []
+            for part in skeleton:
+                if isinstance(part, tuple):
+                    parts.append(part)
+                    continue
+                pieces = part.split(marker)
+                for index, piece in enumerate(pieces):
+                    if index:
+                        parts.append((variable,))
+                    parts.append(piece)
+            skeleton = parts
+        with self.lock:
+            self.renders[key] = skeleton
+            while len(self.renders) > self.max_cached_renders:
+                self.renders.popitem(last=False)
+        return skeleton
+
+    def render(self, name, static=None, **dynamic):
+        if not static:
+            return self.get_template(name).render(**dynamic)
+        skeleton = self._skeleton(name, static, tuple(sorted(dynamic)))
+        return "".join(str(dynamic[part[0]]) if isinstance(part, tuple) else part for part in skeleton)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "templates": len(self.env.list_templates(extensions=["jinja"])),
+                "hot_reload": self.hot_reload,
+                "cached_renders": len(self.renders),
+                "render_hits": self.render_hits,
+                "render_misses": self.render_misses,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_prompt_registry():
+    """Return the process-wide registry; PROMPTS_HOT_RELOAD=1 enables the dev reload mode."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry(hot_reload=os.getenv("PROMPTS_HOT_RELOAD", "0") == "1")
+    return _registry
+
+
+def load_prompt(template_name, static=None, **kwargs):
+    return get_prompt_registry().render(template_name, static=static, **kwargs)
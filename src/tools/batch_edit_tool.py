@@ -0,0 +1,182 @@
+import os
+import logging
+from typing import List
+from langgraph.prebuilt import InjectedState
+from typing_extensions import Annotated, TypedDict, NotRequired
+from tools.file_windows import get_file_windows
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DIFF_CONTEXT_LINES = 3
+
+
+class EditHunk(TypedDict):
+    """One hunk of a batch edit (see batch_edit)."""
+    file_path: str
+    starting_line: int
+    ending_line: int
+    new_code: str
+    expected_old_code: NotRequired[str]
+
+
+def normalize_code(code):
+    return code.replace("\r\n", "\n").rstrip("\n")
+
+
+def check_hunks(codebase_dir, edits):
+    """
+    Validate the hunks against the current files. Returns (hunks by absolute path, errors);
+    each hunk is a dict with 0-based [first, last) line range, new text and line count.
+    """
+    files, errors, windows = {}, [], get_file_windows()
+    for number, hunk in enumerate(edits, 1):
+        try:
+            file_path = str(hunk["file_path"]).strip("/")
+            starting_line = int(hunk["starting_line"])
+            ending_line = int(hunk["ending_line"])
+            new_code = str(hunk.get("new_code", ""))
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append(f"hunk {number}: needs file_path, starting_line, ending_line and new_code ({str(e)})")
+            continue
+        full_path = os.path.abspath(os.path.join(codebase_dir, file_path))
+        if not full_path.startswith(codebase_dir + os.sep):
+            errors.append(f"hunk {number}: '{file_path}' is outside the codebase")
+            continue
+        if not os.path.isfile(full_path):
+            errors.append(f"hunk {number}: file '{file_path}' does not exist")
+            continue
+        if starting_line < 1 or ending_line < starting_line - 1:
+            errors.append(f"hunk {number}: starting_line must be >= 1 and ending_line >= starting_line - 1 (insertion)")
+            continue
+        old_lines, line_count = windows.read_window(full_path, starting_line, ending_line)
+        if starting_line > line_count + 1:
+            errors.append(f"hunk {number}: starting_line {starting_line} is past the end of '{file_path}' ({line_count} lines)")
+            continue
+        expected = hunk.get("expected_old_code")
+        if expected is not None and normalize_code(expected) != normalize_code("".join(old_lines)):
+            errors.append(f"hunk {number}: lines {starting_line}-{ending_line} of '{file_path}' do not match expected_old_code, "
+                          f"they are:\n{''.join(old_lines)}")
+            continue
+        if new_code and not new_code.endswith("\n"):
+            new_code += "\n"
+        files.setdefault(full_path, {"file_path": file_path, "line_count": line_count, "hunks": []})["hunks"].append({
+            "number": number,
+            "first": starting_line - 1,
+            "last": min(max(ending_line, starting_line - 1), line_count),
+            "old_lines": old_lines,
+            "new_lines": new_code.splitlines(keepends=True),
+        })
+    # A batch is serialized with the other writes of its repository (see tools.registry), one repository only.
+    repositories = sorted({file["file_path"].split("/")[0] for file in files.values()})
+    if len(repositories) > 1:
+        errors.append(f"the hunks span several repositories ({', '.join(repositories)}): use one batch_edit per repository")
+    for file in files.values():
+        file["hunks"].sort(key=lambda hunk: (hunk["first"], hunk["last"]))
+        for previous, hunk in zip(file["hunks"], file["hunks"][1:]):
+            if hunk["first"] < previous["last"] or hunk["first"] == previous["first"]:
+                errors.append(f"hunks {previous['number']} and {hunk['number']} overlap in '{file['file_path']}'")
+    return files, errors
+
+
+def unified_diff(full_path, file):
+    """Unified diff of the hunks of one file, reading only the context lines around them."""
+    windows = get_file_windows()
+    diff = [f"--- a/{file['file_path']}\n", f"+++ b/{file['file_path']}\n"]
+    groups = []
+    for hunk in file["hunks"]:
+        if groups and hunk["first"] - groups[-1][-1]["last"] <= 2 * DIFF_CONTEXT_LINES:
+            groups[-1].append(hunk)
+        else:
+            groups.append([hunk])
+    shift = 0
+    for group in groups:
+        context_start = max(0, group[0]["first"] - DIFF_CONTEXT_LINES)
+        context_end = min(file["line_count"], group[-1]["last"] + DIFF_CONTEXT_LINES)
+        body, position, old_count, new_count = [], context_start, 0, 0
+        for hunk in group + [None]:
+            until = hunk["first"] if hunk is not None else context_end
+            if until > position:
+                context, _ = windows.read_window(full_path, position + 1, until)
+                body.extend(" " + line for line in context)
+                old_count += len(context)
+                new_count += len(context)
+            if hunk is None:
+                break
+            body.extend("-" + line for line in hunk["old_lines"])
+            body.extend("+" + line for line in hunk["new_lines"])
+            old_count += len(hunk["old_lines"])
+            new_count += len(hunk["new_lines"])
+            position = hunk["last"]
+        old_start = context_start + 1 if old_count else context_start
+        new_start = context_start + shift + 1 if new_count else context_start + shift
+        diff.append(f"@@ -{old_start},{old_count} +{new_start},{new_count} @@\n")
+        diff.extend(line if line.endswith("\n") else line + "\n" for line in body)
+        shift += new_count - old_count
+    return "".join(diff)
+
+
+def batch_edit(edits: List[EditHunk], state: Annotated[dict, InjectedState]):
+    """
+    This tool applies several edits (hunks), in one or more files of a repository, in a single call. Each hunk replaces a range of lines with new code. All hunks are checked first: if any is invalid, none is applied. Line numbers always refer to the files as they are BEFORE this call: the shift caused by earlier hunks in the same file is handled automatically. Prefer it over several edit calls when a change touches several places.
+
+    Args:
+        edits (list of dict): The hunks. Each hunk is a dict with:
+            - file_path (str): Path to the file (relative to codebase root, e.g., 'repo/main.tf').
+            - starting_line (int): The first line to replace (1-based, inclusive).
+            - ending_line (int): The last line to replace (1-based, inclusive). Use starting_line - 1 to insert new_code before starting_line without replacing anything.
+            - new_code (str): The code to put in place of the lines. An empty string deletes them.
+            - expected_old_code (str, optional): The current content of the lines being replaced. If given and the file differs, nothing is applied and the actual lines are returned, so stale line numbers cannot corrupt the file.
+        state: Automatically injected by the system - do not include this parameter in tool calls.
+    Returns:
+        str: A summary and the unified diff of all the changes, or an error message listing every invalid hunk (in which case no file was changed). If writing a file fails, the error lists the files that were changed and those that were not.
+
+    Example:
+        >>> batch_edit(
+        ...     edits=[
+        ...         {'file_path': 'repo/main.tf', 'starting_line': 12, 'ending_line': 12, 'new_code': '  machine_type = "e2-medium"', 'expected_old_code': '  machine_type = "e2-small"'},
+        ...         {'file_path': 'repo/main.tf', 'starting_line': 40, 'ending_line': 39, 'new_code': '  labels = { env = "prod" }'},
+        ...         {'file_path': 'repo/variables.tf', 'starting_line': 3, 'ending_line': 5, 'new_code': ''}
+        ...     ]
+        ... )
+
+    Edge Cases:
+        - Hunks overlapping in the same file are rejected.
+        - Hunks in several repositories are rejected: send one batch_edit per repository.
+        - If a file does not exist or a line range is past the end of a file, nothing is applied.
+    """
+    if not edits:
+        return "Error: no edits given."
+    codebase_dir = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"], "codebase"))
+    files, errors = check_hunks(codebase_dir, edits)
+    if errors:
+        return "Error: no file was changed.\n" + "\n".join(errors)
+    diffs = [unified_diff(full_path, file) for full_path, file in files.items()]
+    windows, staged = get_file_windows(), []
+    try:
+        for full_path, file in files.items():
+            staged.append(windows.stage(full_path, [(hunk["first"], hunk["last"], "".join(hunk["new_lines"]))
+                                                    for hunk in file["hunks"]]))
+    except Exception:
+        for staged_file in staged:
+            windows.discard(staged_file)
+        raise
+    # Every file is written before the first rename, so a failed write leaves the codebase untouched.
+    # Renames can still fail midway: the files already renamed stay changed.
+    for position, staged_file in enumerate(staged):
+        try:
+            windows.publish(staged_file)
+        except Exception as e:
+            for remaining in staged[position:]:
+                windows.discard(remaining)
+            applied = [files[item.path]["file_path"] for item in staged[:position]]
+            not_applied = [files[item.path]["file_path"] for item in staged[position:]]
+            logger.error(f"Batch edit stopped at {not_applied[0]}: {str(e)}")
+            return (f"Error writing '{not_applied[0]}': {str(e)}\n"
+                    f"Changed files: {', '.join(applied) or 'none'}\nUnchanged files: {', '.join(not_applied)}")
+    logger.info(f"Applied {len(edits)} hunks to {len(files)} files")
+    return f"Applied {len(edits)} hunks to {len(files)} files.\n" + "".join(diffs)
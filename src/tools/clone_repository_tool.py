@@ -3,9 +3,11 @@ from typing_extensions import Annotated
 import subprocess
 from langchain_core.messages import ToolMessage
 import os
+import shutil
 import  logging
 import time
-from utlis.githubapp_privatekey import get_jwt, get_installation_token
+from utlis.githubapp_privatekey import get_cached_installation_token, get_token_cache
+from utlis.git_mirror import get_git_mirrors
 from langgraph.types import Command
 
 logging.basicConfig(
@@ -17,6 +19,36 @@ logger = logging.getLogger(__name__)
 
 
 current_dir=os.path.dirname(os.path.abspath(__file__))
+# What git prints when GitHub rejects the token of an HTTPS remote.
+GIT_AUTH_FAILURES = ("Authentication failed", "returned error: 401", "could not read Username")
+
+
+def is_auth_failure(stderr):
+    return any(failure in (stderr or "") for failure in GIT_AUTH_FAILURES)
+
+
+def clone_with_token(repo_url, branch, codebase_dir, repo_name, session_id, install_token):
+    """Clone from the mirror cache, or directly from GitHub if that fails. Returns the direct clone's process, None after a mirror clone."""
+    auth_repo_url = repo_url.replace("https://", f"https://x_access-token:{install_token}@")
+    try:
+        # Local clone borrowing the objects of the shared mirror of the repository.
+        get_git_mirrors().clone(repo_url, branch, os.path.join(codebase_dir, repo_name),
+                                token=install_token, origin_url=auth_repo_url)
+        return None
+    except Exception as e:
+        logger.warning(f"Clone of {repo_name} from the mirror cache failed, cloning from GitHub: {str(e)}")
+        shutil.rmtree(os.path.join(codebase_dir, repo_name), ignore_errors=True)
+        command=f'cd .. && cd tmp && cd {session_id} && cd codebase && git clone --branch {branch} {auth_repo_url}'
+        result1 = subprocess.run(
+            command,
+            cwd=current_dir,         # Start from current_dir
+            shell=True,              # Required for using 'cd' and '&&'
+            stdout=subprocess.PIPE,  # Capture standard output
+            stderr=subprocess.PIPE,  # Capture standard error
+            text=True                # Decode output as string
+        )
+        logger.info(result1)
+        return result1
 
 def clone_repository(repo_url: str,branch: str,state: Annotated[dict, InjectedState]):
     """
@@ -58,20 +90,15 @@ def clone_repository(repo_url: str,branch: str,state: Annotated[dict, InjectedSt
                 githubapp_installation_id = project['githubapp_installation_id']
                 break
         if githubapp_installation_id:
-            jwt_token = get_jwt(state['githubapp_privatekey'], state['githubapp_id'])
-            install_token = get_installation_token(jwt_token, githubapp_installation_id)
-
-            repo_url = repo_url.replace("https://", f"https://x_access-token:{install_token}@")
-            command=f'cd .. && cd tmp && cd {state["session_id"]} && cd codebase && git clone --branch {branch} {repo_url}'
-            result1 = subprocess.run(
-                command,
-                cwd=current_dir,         # Start from current_dir
-                shell=True,              # Required for using 'cd' and '&&'
-                stdout=subprocess.PIPE,  # Capture standard output
-                stderr=subprocess.PIPE,  # Capture standard error
-                text=True                # Decode output as string
-            )
-            logger.info(result1)
+            install_token = get_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], githubapp_installation_id)
+            result1 = clone_with_token(repo_url, branch, codebase_dir, repo_name, state["session_id"], install_token)
+            if result1 is not None and result1.returncode != 0 and is_auth_failure(result1.stderr):
+                # The cached token was revoked or rejected: retry once with a new one.
+                logger.warning(f"GitHub rejected the installation token of {githubapp_installation_id}, retrying with a new one")
+                get_token_cache().invalidate(githubapp_installation_id)
+                install_token = get_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], githubapp_installation_id)
+                shutil.rmtree(os.path.join(codebase_dir, repo_name), ignore_errors=True)
+                result1 = clone_with_token(repo_url, branch, codebase_dir, repo_name, state["session_id"], install_token)
             agent_branch=f'devops-agent-{int(time.time())}'
             command=f'cd .. && cd tmp && cd {state["session_id"]} && cd codebase && cd {repo_name} && git checkout -b {agent_branch}'
             result2 = subprocess.run(
@@ -85,7 +112,9 @@ def clone_repository(repo_url: str,branch: str,state: Annotated[dict, InjectedSt
             logger.info(result2)
             return Command(
             update={
-                "session_repositories": state.get("session_repositories", []) + [{"repository_name":repo_name,"agent_branch":agent_branch}],
+                # Kept across the runs of the session: one entry per repository, the latest clone.
+                "session_repositories": [repo for repo in state.get("session_repositories", []) if repo["repository_name"] != repo_name]
+                                        + [{"repository_name":repo_name,"agent_branch":agent_branch}],
                 "executor_messages": [ToolMessage(content={"success": f"Repository {repo_name} cloned successfully and branch {agent_branch} checked out."}, tool_call_id=state['executor_messages'][-1].tool_calls[0]['id'])]
             }
             )
@@ -0,0 +1,407 @@
+import os
+import re
+import fnmatch
+import threading
+import logging
+from array import array
+from collections import OrderedDict
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Never indexed: VCS metadata, provider caches and vendored dependencies.
+SKIPPED_DIRS = {".git", ".terraform", "node_modules", "vendor", "third_party", "__pycache__", ".venv", "venv"}
+SKIPPED_SUFFIXES = (".ipynb", ".min.js", ".min.css", ".map")
+BINARY_SNIFF_BYTES = 8000
+
+
+def codebase_root(session_id):
+    return os.path.abspath(os.path.join(current_dir, "..", "tmp", session_id, "codebase"))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def gitignore_regex(pattern):
+    """Translate a .gitignore glob (without its leading '!' or trailing '/') to a regex."""
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "/.*"
+            i += 3
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            regex += "[" + pattern[i + 1:end].replace("!", "^", 1) + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + r"\Z")
+
+
+def parse_gitignore(text):
+    """Rules of a .gitignore file as (regex, negate, dir_only, anchored) tuples, in file order."""
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        # A slash anywhere but at the end anchors the pattern to the .gitignore directory.
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line:
+            rules.append((gitignore_regex(line), negate, dir_only, anchored))
+    return rules
+
+
+def required_literals(pattern, flags=0):
+    """
+    Literal strings every match of a regex must contain, taken from its top-level sequence;
+    an alternation, optional or repeated part breaks the current run. Empty if none is known.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre_constants.error, re.error):
+        return []
+    literals, run = [], ""
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run += chr(value)
+            continue
+        if op is sre_constants.MAX_REPEAT or op is sre_constants.MIN_REPEAT:
+            low, _, item = value
+            if low >= 1 and len(item) == 1 and item[0][0] is sre_constants.LITERAL:
+                # 'a+' requires one 'a', then the run stops.
+                run += chr(item[0][1])
+        if run:
+            literals.append(run)
+        run = ""
+    if run:
+        literals.append(run)
+    return literals
+
+
+class CodeIndex():
+    """
+    Trigram index of the text files of a session codebase. A file is looked up by the
+    trigrams of its lowercased content, so a query only reads the files holding all the
+    trigrams of its literal parts. .gitignore rules are honoured and binary, oversized and
+    vendored files are skipped.
+
+    A changed file gets a new id and its old id is left dead in the posting lists, which
+    are rebuilt once dead ids outnumber live ones.
+    """
+    def __init__(self, root, max_file_bytes=1024 ** 2):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.lock = threading.RLock()
+        self.files = []
+        # rel_path -> (file id or None when skipped, mtime_ns, size)
+        self.entries = {}
+        self.postings = {}
+        self.dead = 0
+        self.gitignores = {}
+        self.built = False
+
+    # -- ignore rules
+
+    def _gitignore_rules(self, rel_dir):
+        if rel_dir not in self.gitignores:
+            try:
+                with open(os.path.join(self.root, rel_dir, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                    self.gitignores[rel_dir] = parse_gitignore(f.read())
+            except OSError:
+                self.gitignores[rel_dir] = []
+        return self.gitignores[rel_dir]
+
+    def _ignored_by(self, rel_dir, rel_path, is_dir):
+        """Verdict of the .gitignore of rel_dir for rel_path: True, False or None when no rule matches."""
+        verdict = None
+        relative = rel_path[len(rel_dir) + 1:] if rel_dir else rel_path
+        name = relative.rsplit("/", 1)[-1]
+        for regex, negate, dir_only, anchored in self._gitignore_rules(rel_dir):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative if anchored else name):
+                verdict = not negate
+        return verdict
+
+    def ignored(self, rel_path, is_dir):
+        """Whether rel_path or one of its directories is skipped or ignored by a .gitignore."""
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts) + 1):
+            path = "/".join(parts[:depth])
+            path_is_dir = is_dir or depth < len(parts)
+            if path_is_dir and parts[depth - 1] in SKIPPED_DIRS:
+                return True
+            verdict = None
+            for level in range(depth):
+                rel_dir = "/".join(parts[:level])
+                level_verdict = self._ignored_by(rel_dir, path, path_is_dir)
+                if level_verdict is not None:
+                    verdict = level_verdict
+            if verdict:
+                return True
+        return False
+
+    # -- indexing
+
+    def _walk(self, rel_dir):
+        """(rel_path, mtime_ns, size) of the files under rel_dir that are not skipped or ignored."""
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(os.path.join(self.root, current)) as entries:
+                    for entry in entries:
+                        rel_path = f"{current}/{entry.name}" if current else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.name not in SKIPPED_DIRS and not self._ignored_here(current, rel_path, True):
+                                    stack.append(rel_path)
+                            elif entry.is_file(follow_symlinks=False) and not entry.name.endswith(SKIPPED_SUFFIXES):
+                                if not self._ignored_here(current, rel_path, False):
+                                    stat = entry.stat(follow_symlinks=False)
+                                    yield rel_path, stat.st_mtime_ns, stat.st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _ignored_here(self, rel_dir, rel_path, is_dir):
+        # While walking, the directories above rel_path are known not to be ignored.
+        parts = rel_dir.split("/") if rel_dir else []
+        verdict = None
+        for level in range(len(parts) + 1):
+            level_verdict = self._ignored_by("/".join(parts[:level]), rel_path, is_dir)
+            if level_verdict is not None:
+                verdict = level_verdict
+        return bool(verdict)
+
+    def _read_text(self, rel_path, size):
+        if size > self.max_file_bytes:
+            return None
+        try:
+            with open(os.path.join(self.root, rel_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def _add(self, rel_path, mtime_ns, size):
+        text = self._read_text(rel_path, size)
+        if text is None:
+            self.entries[rel_path] = (None, mtime_ns, size)
+            return
+        file_id = len(self.files)
+        self.files.append(rel_path)
+        self.entries[rel_path] = (file_id, mtime_ns, size)
+        postings = self.postings
+        for gram in trigrams(text.lower()):
+            posting = postings.get(gram)
+            if posting is None:
+                postings[gram] = array("I", (file_id,))
+            else:
+                posting.append(file_id)
+
+    def _remove(self, rel_path):
+        file_id = self.entries.pop(rel_path)[0]
+        if file_id is not None:
+            self.files[file_id] = None
+            self.dead += 1
+
+    def build(self):
+        with self.lock:
+            self.files, self.entries, self.postings, self.dead, self.gitignores = [], {}, {}, 0, {}
+            for rel_path, mtime_ns, size in sorted(self._walk("")):
+                self._add(rel_path, mtime_ns, size)
+            self.built = True
+            logger.info(f"Indexed {len(self.files)} files of {self.root} ({len(self.postings)} trigrams)")
+
+    def ensure_built(self):
+        with self.lock:
+            if not self.built:
+                self.build()
+
+    def refresh(self, rel_path=""):
+        """Re-index the files under rel_path (a file or a directory) that were added, changed or removed."""
+        rel_path = rel_path.strip("/")
+        with self.lock:
+            if rel_path.endswith(".gitignore") or not rel_path:
+                self.gitignores = {}
+            full_path = os.path.join(self.root, rel_path)
+            if os.path.isdir(full_path):
+                ignored = bool(rel_path) and self.ignored(rel_path, True)
+                seen = {} if ignored else {path: (mtime_ns, size) for path, mtime_ns, size in self._walk(rel_path)}
+            elif os.path.isfile(full_path) and not self.ignored(rel_path, False) and not rel_path.endswith(SKIPPED_SUFFIXES):
+                stat = os.stat(full_path)
+                seen = {rel_path: (stat.st_mtime_ns, stat.st_size)}
+            else:
+                seen = {}
+            prefix = rel_path + "/" if rel_path else ""
+            for path in [p for p in self.entries if p == rel_path or p.startswith(prefix)]:
+                if path not in seen or self.entries[path][1:] != seen[path]:
+                    self._remove(path)
+            for path in sorted(seen):
+                if path not in self.entries:
+                    self._add(path, *seen[path])
+            if self.dead > 1000 and self.dead > len(self.files) - self.dead:
+                self.build()
+
+    # -- queries
+
+    def _candidates(self, literals):
+        """Live file ids holding every trigram of the literals, all live files if none has three characters."""
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal.lower())
+        with self.lock:
+            if not grams:
+                return [(path, file_id) for file_id, path in enumerate(self.files) if path is not None]
+            postings = []
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids.intersection_update(posting)
+                if not ids:
+                    return []
+            return [(self.files[file_id], file_id) for file_id in ids if self.files[file_id] is not None]
+
+    def search(self, query, regex=False, case_sensitive=True, glob=None, page=1, page_size=50, max_matches_per_file=20):
+        """
+        Lines matching query (a literal string, or a Python regex when regex is True), grouped by
+        file in path order. glob filters paths ('*.tf', 'repo/modules/**'). Returns a dict with
+        the files of the page, the number of matches shown and whether another page follows.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        if regex:
+            matcher = re.compile(query, flags)
+            literals = required_literals(query, flags)
+            matches = lambda line: matcher.search(line) is not None
+        elif case_sensitive:
+            literals = [query]
+            matches = lambda line: query in line
+        else:
+            literals = [query]
+            lowered = query.lower()
+            matches = lambda line: lowered in line.lower()
+        candidates = sorted(self._candidates(literals))
+        if glob:
+            candidates = [(path, file_id) for path, file_id in candidates
+                          if fnmatch.fnmatch(path, glob) or fnmatch.fnmatch(path.rsplit("/", 1)[-1], glob)]
+        skip = (max(1, page) - 1) * page_size
+        files, shown, has_more = [], 0, False
+        for path, file_id in candidates:
+            text = self._read_text(path, 0)
+            if text is None:
+                continue
+            file_matches, extra = [], 0
+            for number, line in enumerate(text.splitlines(), 1):
+                if not matches(line):
+                    continue
+                if len(file_matches) >= max_matches_per_file:
+                    extra += 1
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                if shown == page_size:
+                    has_more = True
+                    break
+                file_matches.append({"line": number, "text": line.rstrip()})
+                shown += 1
+            if file_matches:
+                files.append({"path": path, "matches": file_matches, "more_in_file": extra})
+            if has_more:
+                break
+        return {"files": files, "matches": shown, "page": max(1, page), "has_more": has_more,
+                "candidates": len(candidates)}
+
+    def stats(self):
+        with self.lock:
+            return {"files": len(self.files) - self.dead, "dead": self.dead, "trigrams": len(self.postings)}
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _session_index(session_id):
+    with _indexes_lock:
+        index = _indexes.get(session_id)
+        if index is not None:
+            _indexes.move_to_end(session_id)
+        else:
+            index = CodeIndex(codebase_root(session_id), max_file_bytes=int(os.getenv("CODE_INDEX_MAX_FILE_BYTES", str(1024 ** 2))))
+            _indexes[session_id] = index
+            while len(_indexes) > int(os.getenv("CODE_INDEX_MAX_SESSIONS", "16")):
+                _indexes.popitem(last=False)
+        return index
+
+
+def get_code_index(session_id):
+    """
+    Return the code index of a session, built on first use. At most CODE_INDEX_MAX_SESSIONS
+    indexes are kept, the least recently used being dropped.
+    """
+    index = _session_index(session_id)
+    # Built outside the registry lock; concurrent first searches of the session wait on the index lock.
+    index.ensure_built()
+    return index
+
+
+def update_code_index(session_id, rel_path):
+    """
+    Bring the session index up to date after a tool wrote rel_path. A session without an index
+    (e.g. after its first clone) gets one built in the background, searches waiting for it.
+    """
+    index = _session_index(session_id)
+    if index.built:
+        index.refresh(rel_path)
+    else:
+        # The refresh covers a write that lands while the build is walking the tree.
+        def build():
+            index.ensure_built()
+            index.refresh(rel_path)
+        threading.Thread(target=build, name=f"code-index-{session_id}", daemon=True).start()
+
+
+def drop_code_index(session_id):
+    with _indexes_lock:
+        _indexes.pop(session_id, None)
+
+
+def code_index_stats():
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    return {session_id: index.stats() for session_id, index in indexes.items()}
@@ -3,6 +3,7 @@ import ast
 import subprocess
 from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
+from tools.file_windows import get_file_windows
 import logging
 logging.basicConfig(
     level=logging.INFO,
@@ -51,16 +52,6 @@ def edit(file_path: str, new_code: str, starting_line: int, ending_line: int, st
     if starting_line < 1:
         return "Error: Starting line must be greater than 0."
 
-    with open(full_path, "r") as file:
-        lines = file.readlines()
-
-    # Patch the lines
-    updated_lines = lines[:]
-    updated_lines[starting_line - 1:ending_line] = [new_code if new_code.endswith("\n") else new_code + "\n"]
-
-    updated_code = "".join(updated_lines)
-
-    with open(full_path, "w") as file:
-        file.writelines(updated_lines)
-
+    # Only the replaced byte range is rewritten (temp file + rename), the line index is shifted in place.
+    get_file_windows().splice(full_path, starting_line, ending_line, new_code if new_code.endswith("\n") else new_code + "\n")
     return "File edited successfully"
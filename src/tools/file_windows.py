@@ -0,0 +1,208 @@
+import os
+import mmap
+import tempfile
+import threading
+import logging
+from array import array
+from collections import OrderedDict
+from itertools import accumulate, islice
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(current_dir, "..", "tmp"))
+SCAN_CHUNK_BYTES = 8 * 1024 ** 2
+
+
+def scan_line_starts(data, base=0):
+    """Offsets (plus base) of the lines of data, a trailing newline not starting an extra line."""
+    starts = array("Q")
+    if not len(data):
+        return starts
+    starts.append(base)
+    # Split a chunk at a time (bounded memory) and sum the part lengths in C.
+    for chunk_start in range(0, len(data), SCAN_CHUNK_BYTES):
+        parts = data[chunk_start:chunk_start + SCAN_CHUNK_BYTES].split(b"\n")
+        offsets = accumulate(map((1).__add__, map(len, parts[:-1])), initial=base + chunk_start)
+        starts.extend(islice(offsets, 1, None))
+    if starts[-1] == base + len(data):
+        starts.pop()
+    return starts
+
+
+class LineIndex():
+    """Byte offset of every line start of a file, as of its (mtime_ns, size)."""
+    def __init__(self, starts, size, mtime_ns):
+        self.starts = starts
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def line_count(self):
+        return len(self.starts)
+
+    def offset(self, line):
+        """Byte offset of the start of 0-based line, the file size past the last line."""
+        return self.starts[line] if line < len(self.starts) else self.size
+
+
+class StagedFile():
+    """New content of path written to temp_path, with the line starts of that content."""
+    def __init__(self, path, temp_path, starts):
+        self.path = path
+        self.temp_path = temp_path
+        self.starts = starts
+
+
+class FileWindows():
+    """
+    Line-offset indexes of workspace files, cached by path and validated against (mtime_ns, size),
+    so that a window of lines is read through mmap in O(window) instead of reading the file,
+    and an edit only rewrites the file once (temp file + rename) and shifts the index.
+    """
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.indexes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, path, index):
+        with self.lock:
+            self.indexes[path] = index
+            self.indexes.move_to_end(path)
+            while len(self.indexes) > self.max_entries:
+                self.indexes.popitem(last=False)
+
+    def line_index(self, path, stat=None, data=None):
+        stat = stat or os.stat(path)
+        with self.lock:
+            index = self.indexes.get(path)
+            if index is not None and (index.mtime_ns, index.size) == (stat.st_mtime_ns, stat.st_size):
+                self.indexes.move_to_end(path)
+                self.hits += 1
+                return index
+            self.misses += 1
+        if data is None:
+            with open(path, "rb") as f:
+                with self._map(f, stat.st_size) as data:
+                    index = LineIndex(scan_line_starts(data), stat.st_size, stat.st_mtime_ns)
+        else:
+            index = LineIndex(scan_line_starts(data), stat.st_size, stat.st_mtime_ns)
+        self._store(path, index)
+        return index
+
+    def _map(self, f, size):
+        # mmap cannot map an empty file.
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else _EmptyMap()
+
+    def read_window(self, path, starting_line, ending_line):
+        """
+        Lines starting_line..ending_line (1-based, inclusive, clamped to the file) with their line
+        endings normalized to '\\n', and the number of lines of the file.
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            with self._map(f, stat.st_size) as data:
+                index = self.line_index(path, stat, data)
+                first = min(max(starting_line - 1, 0), index.line_count)
+                last = min(max(ending_line, first), index.line_count)
+                window = data[index.offset(first):index.offset(last)]
+        text = window.decode("utf-8", errors="replace").replace("\r\n", "\n")
+        return text.splitlines(keepends=True), index.line_count
+
+    def splice(self, path, starting_line, ending_line, new_text):
+        """
+        Replace lines starting_line..ending_line (1-based, inclusive) with new_text, like the
+        list slice assignment lines[starting_line - 1:ending_line] = [new_text]. The file is
+        rewritten to a temporary file and renamed over the original, and the index shifted.
+        """
+        self.publish(self.stage(path, [(starting_line - 1, ending_line, new_text)]))
+
+    def stage(self, path, replacements):
+        """
+        Write path with replacements applied to a temporary file next to it, without touching
+        the original. replacements are (first, last, new_text) tuples replacing the 0-based
+        lines [first, last), sorted and disjoint, line numbers referring to the current file.
+        new_text not ending with a newline gets one, unless it ends the file.
+        Returns the StagedFile to publish (or discard).
+        """
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            with self._map(f, stat.st_size) as data:
+                index = self.line_index(path, stat, data)
+                chunks, new_starts, position, previous, delta = [], array("Q"), 0, 0, 0
+                for first, last, new_text in replacements:
+                    first = min(max(first, 0), index.line_count)
+                    last = min(max(last, first), index.line_count)
+                    start, end = index.offset(first), index.offset(last)
+                    new_bytes = new_text.encode("utf-8")
+                    if new_bytes and not new_bytes.endswith(b"\n") and last < index.line_count:
+                        new_bytes += b"\n"
+                    # Text appended after a last line without newline starts on a line of its own.
+                    separator = b"\n" if new_bytes and start == index.size and index.size and data[index.size - 1:index.size] != b"\n" else b""
+                    new_starts.extend(map(delta.__add__, index.starts[previous:first]))
+                    new_starts.extend(scan_line_starts(new_bytes, start + delta + len(separator)))
+                    chunks.append(data[position:start])
+                    chunks.append(separator + new_bytes)
+                    delta += len(separator) + len(new_bytes) - (end - start)
+                    position, previous = end, last
+                new_starts.extend(map(delta.__add__, index.starts[previous:]))
+                directory = os.path.dirname(path)
+                descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+                try:
+                    with os.fdopen(descriptor, "wb") as out:
+                        for chunk in chunks:
+                            out.write(chunk)
+                        out.write(data[position:])
+                    os.chmod(temp_path, stat.st_mode & 0o7777)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+        return StagedFile(path, temp_path, new_starts)
+
+    def publish(self, staged):
+        """Rename a staged file over the original and cache its shifted line index."""
+        os.replace(staged.temp_path, staged.path)
+        stat = os.stat(staged.path)
+        self._store(staged.path, LineIndex(staged.starts, stat.st_size, stat.st_mtime_ns))
+
+    def discard(self, staged):
+        if os.path.exists(staged.temp_path):
+            os.unlink(staged.temp_path)
+
+    def evict_session(self, session_id):
+        prefix = os.path.join(WORKSPACE_ROOT, session_id) + os.sep
+        with self.lock:
+            for path in [path for path in self.indexes if path.startswith(prefix)]:
+                del self.indexes[path]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.indexes), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+class _EmptyMap(bytes):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_file_windows = None
+_file_windows_lock = threading.Lock()
+
+def get_file_windows():
+    global _file_windows
+    if _file_windows is None:
+        with _file_windows_lock:
+            if _file_windows is None:
+                _file_windows = FileWindows(max_entries=int(os.getenv("FILE_INDEX_MAX_ENTRIES", "512")))
+    return _file_windows
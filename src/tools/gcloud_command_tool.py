@@ -1,63 +1,73 @@
 import os
+import asyncio
 import subprocess
-import json
 from typing_extensions import Annotated
 from langgraph.prebuilt import InjectedState
+from utlis.subprocess_runner import arun_command
+from utlis.gcp.gcloud_config import get_gcloud_configs
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 
-def run_gcloud_command(command: str, state: Annotated[dict, InjectedState]) -> str:
+def gcloud_result(returncode, stdout="", stderr=""):
+    return {
+        "success": returncode == 0,
+        "returncode": returncode,
+        "stdout": stdout,
+        "stderr": stderr
+    }
+
+
+def validate_gcloud_command(command):
+    """Return the error result for the agent if the command is not a gcloud command, None otherwise."""
+    if command.split(' ')[0] != 'gcloud':
+        return gcloud_result(-1, stderr=f"Error: gcloud command not found in the command: {command}")
+    return None
+
+
+def prepare_gcloud_command(command, session_id):
+    """(error result, None) if the command cannot run, (None, environment of the session configuration) otherwise."""
+    error = validate_gcloud_command(command)
+    if error:
+        return error, None
+    env, project_id = get_gcloud_configs().environment(session_id)
+    return None, env
+
+
+def run_gcloud_command(command: str, state: Annotated[dict, InjectedState]) -> dict:
     """
     Execute a gcloud command.
     gcloud: Command-line interface for Google Cloud Platform, used to manage cloud resources, 
     deploy services, configure infrastructure, and interact with GCP APIs.
+    The command runs authenticated as the session service account, in the session project.
 
     Args:
         command (str): The gcloud command to execute (e.g., "gcloud compute instances list")
         state: Automatically injected by the system - do not include this parameter in tool calls.
         
     Returns:
-        str: The stdout output from the gcloud command if successful, or an error message
-             if the command fails or encounters an exception.
-             
-    Raises:
-        FileNotFoundError: If the service account key file is not found
-        json.JSONDecodeError: If the service account key file is malformed
-        subprocess.CalledProcessError: If the gcloud command fails to execute
+        dict: Contains 'success' (bool), 'returncode' (int), 'stdout' (str) and 'stderr' (str).
+              If the command is not a gcloud command or the session credentials cannot be set
+              up, 'success' is False, 'returncode' is -1 and 'stderr' explains why.
     """
     try:
-        if command.split(' ')[0] != 'gcloud':
-            return f"Error: gcloud command not found in the command: {command}"
-            
-        sa_key_path = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"], "sa_key.json"))
-        
-        # Get project id from sa_key.json
-        with open(sa_key_path, "r") as f:
-            sa_key = json.load(f)
-        project_id = sa_key["project_id"]
-        
-        # Set environment variables
-        env = os.environ.copy()
-        env["GOOGLE_APPLICATION_CREDENTIALS"] = sa_key_path
-        
-        # First, authenticate gcloud with the service account
-        auth_cmd = f"gcloud auth activate-service-account --key-file={sa_key_path}"
-        auth_result = subprocess.run(auth_cmd, shell=True, capture_output=True, text=True, env=env)
-        
-        if auth_result.returncode != 0:
-            return f"Error authenticating with service account: {auth_result.stderr}"
-        
-        # Set the project
-        project_cmd = f"gcloud config set project {project_id}"
-        project_result = subprocess.run(project_cmd, shell=True, capture_output=True, text=True, env=env)
-        
-        if project_result.returncode != 0:
-            return f"Error setting project: {project_result.stderr}"
-        
-        # Run the actual command
-        cmd = f"{command} --project={project_id}"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, env=env)
-        return result
+        error, env = prepare_gcloud_command(command, state["session_id"])
+        if error:
+            return error
+        result = subprocess.run(command, shell=True, capture_output=True, text=True, env=env)
+        return gcloud_result(result.returncode, result.stdout, result.stderr)
+    except Exception as e:
+        return gcloud_result(-1, stderr=f"Error running gcloud command: {e}")
+
+
+async def arun_gcloud_command(command: str, state: Annotated[dict, InjectedState]) -> dict:
+    """Async variant of run_gcloud_command, used when the workflow runs on the event loop."""
+    try:
+        # Only the first command of a session initializes its configuration (one gcloud process).
+        error, env = await asyncio.to_thread(prepare_gcloud_command, command, state["session_id"])
+        if error:
+            return error
+        result = await arun_command(command, env=env)
+        return gcloud_result(result.returncode, result.stdout, result.stderr)
     except Exception as e:
-        return f"Error running gcloud command: {e}"
\ No newline at end of file
+        return gcloud_result(-1, stderr=f"Error running gcloud command: {e}")
@@ -1,57 +1,192 @@
-import subprocess
 import os
+import codecs
+import fnmatch
+import threading
+from collections import OrderedDict
 from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
 current_dir = os.path.dirname(os.path.abspath(__file__))
-def run_command(command, cwd):
-    return subprocess.run(
-        command,
-        cwd=cwd,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-
-def list_directory_contents(dir_path, state: Annotated[dict, InjectedState]):
-    """
-    This tool returns the names of files and subdirectories in the specified directory. For files, it also reports the number of lines. Useful for codebase exploration and navigation.
 
+# Listed but never entered.
+SKIPPED_DIRS = (".git", ".terraform", "node_modules")
+BINARY_SNIFF_BYTES = 8000
+MAX_ENTRIES = int(os.getenv("LIST_MAX_ENTRIES", "400"))
+# Below the listed directory, a directory shows at most this many files.
+MAX_FILES_PER_SUBDIRECTORY = int(os.getenv("LIST_MAX_FILES_PER_SUBDIRECTORY", "40"))
+
+
+def human_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class LineCountCache():
+    """Line count (or None for a binary file) of files, keyed by (device, inode) and validated by (mtime_ns, size)."""
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def count(self, path, stat):
+        key = (stat.st_dev, stat.st_ino)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+                self.entries.move_to_end(key)
+                return entry[2]
+        line_count = count_lines(path)
+        with self.lock:
+            self.entries[key] = (stat.st_mtime_ns, stat.st_size, line_count)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return line_count
+
+
+def count_lines(path):
+    """Number of lines of a text file, as readlines() would count them; None for a binary or non UTF-8 file."""
+    count, last = 0, b"\n"
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        chunk = f.read(1024 ** 2)
+        if b"\0" in chunk[:BINARY_SNIFF_BYTES]:
+            return None
+        try:
+            while chunk:
+                decoder.decode(chunk)
+                count += chunk.count(b"\n")
+                last = chunk[-1:]
+                chunk = f.read(1024 ** 2)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return None
+    return count + (last != b"\n")
+
+
+_line_counts = LineCountCache()
+
+
+def describe_file(entry):
+    stat = entry.stat(follow_symlinks=False)
+    try:
+        line_count = _line_counts.count(entry.path, stat)
+    except OSError:
+        return f"{entry.name} (unreadable, {human_size(stat.st_size)})"
+    if line_count is None:
+        return f"{entry.name} (binary, {human_size(stat.st_size)})"
+    return f"{entry.name} ({line_count} lines)"
+
+
+def scan(path):
+    """Subdirectories and files of path, sorted by name."""
+    dirs, files = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                (dirs if entry.is_dir(follow_symlinks=False) else files).append(entry)
+            except OSError:
+                continue
+    return sorted(dirs, key=lambda e: e.name), sorted(files, key=lambda e: e.name)
+
+
+class TreeLister():
+    """Indented listing of a directory down to depth levels, limited to max_entries lines."""
+    def __init__(self, depth, glob, max_entries):
+        self.depth = depth
+        self.glob = glob
+        self.max_entries = max_entries
+        self.lines = 0
+        self.truncated = False
+
+    def matches(self, entry, rel_path):
+        return not self.glob or fnmatch.fnmatch(entry.name, self.glob) or fnmatch.fnmatch(rel_path, self.glob)
+
+    def take(self, count=1):
+        if self.lines + count > self.max_entries:
+            self.truncated = True
+            return False
+        self.lines += count
+        return True
+
+    def list(self, path, rel_path, level):
+        indent = "  " * level
+        items = []
+        dirs, files = scan(path)
+        for entry in dirs:
+            if entry.name in SKIPPED_DIRS:
+                if not self.glob and self.take():
+                    items.append(f"{indent}{entry.name}/ (not listed)")
+                continue
+            # A chain of directories holding a single subdirectory is shown on one line.
+            label, dir_path, dir_rel = entry.name, entry.path, f"{rel_path}/{entry.name}" if rel_path else entry.name
+            try:
+                sub_dirs, sub_files = scan(dir_path)
+                while len(sub_dirs) == 1 and not sub_files and sub_dirs[0].name not in SKIPPED_DIRS:
+                    label += "/" + sub_dirs[0].name
+                    dir_path, dir_rel = sub_dirs[0].path, f"{dir_rel}/{sub_dirs[0].name}"
+                    sub_dirs, sub_files = scan(dir_path)
+            except OSError:
+                continue
+            if level + 1 >= self.depth:
+                if not self.glob and self.take():
+                    items.append(f"{indent}{label}/ ({len(sub_dirs)} dirs, {len(sub_files)} files)")
+                continue
+            if self.truncated or not self.take():
+                break
+            children = self.list(dir_path, dir_rel, level + 1)
+            if children or not self.glob:
+                items.append(f"{indent}{label}/")
+                items.extend(children)
+            else:
+                self.lines -= 1
+        shown = 0
+        matching = [entry for entry in files if self.matches(entry, f"{rel_path}/{entry.name}" if rel_path else entry.name)]
+        for entry in matching:
+            if level > 0 and shown == MAX_FILES_PER_SUBDIRECTORY:
+                if self.take():
+                    items.append(f"{indent}... {len(matching) - shown} more files")
+                break
+            if not self.take():
+                break
+            try:
+                items.append(f"{indent}{describe_file(entry)}")
+            except OSError:
+                self.lines -= 1
+                continue
+            shown += 1
+        return items
+
+
+def list_directory_contents(dir_path, state: Annotated[dict, InjectedState], depth: int = 1, glob: str = None):
+    """
+    This tool returns the files and subdirectories of the specified directory, as an indented tree when depth is more than 1. Files are shown with their number of lines (binary and non UTF-8 files with their size). Useful for codebase exploration and navigation: a depth of 3 or 4 usually shows the shape of a whole repository in one call.
     Args:
         dir_path (str): Path to the directory (relative to codebase root, e.g., 'repo/').
         state: Automatically injected by the system - do not include this parameter in tool calls.
+        depth (int): Optional. Number of directory levels to list, 1 (default) for the directory itself only. Directories at the last level are shown with their number of subdirectories and files.
+        glob (str): Optional. Only list files whose name or path matches this glob (e.g. '*.tf'), and the directories containing them.
     Returns:
-        dict: {'items': list of str} with file/subdirectory names and line counts, or {'error': str} if the directory is not found or another error occurs.
-
+        dict: {'items': list of str} with one file or directory per line ('main.tf (120 lines)', 'modules/', 'logo.png (binary, 12.0 KB)'), indented by level, or {'error': str} if the directory is not found or another error occurs. .git, .terraform and node_modules are shown but not listed, and long listings are cut with a note.
     Example:
         >>> list_directory_contents(dir_path='repo/')
-
+        >>> list_directory_contents(dir_path='repo/', depth=3, glob='*.tf')
     Edge Cases:
         - If the directory does not exist, returns an error.
-        - If a file cannot be read, it is skipped or an error is returned.
+        - If the listing exceeds the entry limit, the last item says so; list a subdirectory or use a lower depth.
     """
     try:
         abs_dir_path = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"], "codebase", dir_path))
         if not os.path.isdir(abs_dir_path):
             return {"error": f"Directory '{dir_path}' not found."}
-        
-        items = []
-        for item in os.listdir(abs_dir_path):
-            item_path = os.path.join(abs_dir_path, item)
-            if os.path.isfile(item_path):
-                try:
-                    with open(item_path, 'r', encoding='utf-8') as f:
-                        line_count = sum(1 for _ in f)
-                    items.append(f"{item}, it has {line_count} lines")
-                except:
-                    continue
-            else:
-                items.append(item)
-
+        lister = TreeLister(max(1, int(depth or 1)), glob or None, MAX_ENTRIES)
+        items = lister.list(abs_dir_path, "", 0)
+        if lister.truncated:
+            items.append(f"... listing cut at {MAX_ENTRIES} entries: list a subdirectory, use a lower depth or a glob.")
         return {
             "items": items
         }
-        
     except FileNotFoundError:
         return {"error": f"Directory '{dir_path}' not found."}
     except Exception as e:
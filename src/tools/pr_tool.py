@@ -2,9 +2,10 @@ from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
 import os
 import subprocess
-import requests
 import logging
-from utlis.githubapp_privatekey import get_jwt, get_installation_token
+from utlis.githubapp_privatekey import get_cached_installation_token, aget_cached_installation_token, get_token_cache
+from utlis.subprocess_runner import arun_command
+from utlis.github_client import get_github_client, get_async_github_client
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,34 +31,62 @@ def run_git(command, cwd):
         text=True
     )
 
+async def arun_git(command, cwd):
+    """Async variant of run_git."""
+    return await arun_command(command, cwd=cwd)
+
+def find_installation_id(state, repo_name):
+    for project in state['codebase']:
+        if repo_name in project['repository_url']:
+            return project['githubapp_installation_id']
+    return None
+
+def find_pr_target(state, repo_name):
+    """Full name ('owner/repo') and base branch of the repository the PR is opened against."""
+    for repo in state['codebase']:
+        if repo_name in repo["repository_url"]:
+            repo_url = repo["repository_url"]
+            branch=repo["branch"]
+    repo_fullname=repo_url.split("https://github.com/")[1]
+    repo_fullname=repo_fullname.split(".git")[0]
+    return repo_fullname, branch
+
+def repo_command(state, repo_name, git_command):
+    return f'cd .. && cd tmp && cd {state["session_id"]} && cd codebase && cd {repo_name} && {git_command}'
+
+def existing_pr_filter(repo_fullname, agent_branch, base_branch):
+    """Query parameters selecting the open PRs from agent_branch into base_branch on GitHub's side."""
+    return {"state": "open", "head": f"{repo_fullname.split('/')[0]}:{agent_branch}", "base": base_branch}
+
 def check_and_delete_existing_pr(repo_fullname, agent_branch, base_branch, install_token):
-    """Check for existing PR between the same branches and delete it if found."""
+    """Check for an existing PR between the same branches and close it if found (PRs cannot be deleted)."""
     try:
-        # Get all open pull requests
-        url = f"https://api.github.com/repos/{repo_fullname}/pulls"
-        headers = {
-            "Authorization": f"token {install_token}",
-            "Accept": "application/vnd.github+json"
-        }
-        params = {"state": "open"}
-        
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            existing_prs = response.json()
-            
-            # Check for existing PR with same head and base branches
-            for pr in existing_prs:
-                if pr["head"]["ref"] == agent_branch and pr["base"]["ref"] == base_branch:
-                    # Delete the existing PR
-                    delete_url = f"https://api.github.com/repos/{repo_fullname}/pulls/{pr['number']}"
-                    delete_response = requests.delete(delete_url, headers=headers)
-                    if delete_response.status_code == 204:
-                        logger.info(f"✅ Deleted existing PR #{pr['number']} between {agent_branch} and {base_branch}")
-                    else:
-                        logger.warning(f"Failed to delete existing PR #{pr['number']}: {delete_response.status_code}")
-                    break
+        github = get_github_client()
+        for pr in github.paginate(f"/repos/{repo_fullname}/pulls", install_token,
+                                  params=existing_pr_filter(repo_fullname, agent_branch, base_branch)):
+            response = github.patch(f"/repos/{repo_fullname}/pulls/{pr['number']}", install_token,
+                                    json_body={"state": "closed"}, raise_for_status=False)
+            if response.status_code == 200:
+                logger.info(f"✅ Closed existing PR #{pr['number']} between {agent_branch} and {base_branch}")
+            else:
+                logger.warning(f"Failed to close existing PR #{pr['number']}: {response.status_code}")
     except Exception as e:
-        logger.error(f"Error checking/deleting existing PR: {str(e)}")
+        logger.error(f"Error checking/closing existing PR: {str(e)}")
+def open_pull_request(state, installation_id, install_token, repo_fullname, payload):
+    """
+    Close the open PR between the same branches and open a new one. If GitHub rejects the
+    cached installation token (401), it is dropped from the cache and the PR retried once with a new one.
+    """
+    for attempt in range(2):
+        check_and_delete_existing_pr(repo_fullname, payload["head"], payload["base"], install_token)
+        response = get_github_client().post(f"/repos/{repo_fullname}/pulls", install_token,
+                                            json_body=payload, raise_for_status=False)
+        if response.status_code != 401 or attempt:
+            return response
+        logger.warning(f"GitHub rejected the installation token of {installation_id}, retrying with a new one")
+        get_token_cache().invalidate(installation_id)
+        install_token = get_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], installation_id)
+
 # Parse the current branch
 def extract_current_branch(git_stdout: str) -> str:
     for line in git_stdout.splitlines():
@@ -89,14 +118,9 @@ def create_pull_request(repo_name,pr_title,pr_body,state: Annotated[dict, Inject
         - If there are no changes to commit, git may return an error.
     """
     try:
-        githubapp_installation_id = None
-        for project in state['codebase']:
-            if repo_name in project['repository_url']:
-                githubapp_installation_id = project['githubapp_installation_id']
-                break
+        githubapp_installation_id = find_installation_id(state, repo_name)
         if githubapp_installation_id:
-            jwt_token = get_jwt(state['githubapp_privatekey'], state['githubapp_id'])
-            install_token = get_installation_token(jwt_token, githubapp_installation_id)
+            install_token = get_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], githubapp_installation_id)
 
             ## get agent branch name using repo_name
             command=f'cd .. && cd tmp && cd {state["session_id"]} && cd codebase && cd {repo_name} && git branch'
@@ -121,29 +145,17 @@ def create_pull_request(repo_name,pr_title,pr_body,state: Annotated[dict, Inject
                 print("//////")
             #########################################################################################
             # Open PR
-            for repo in state['codebase']:
-                if repo_name in repo["repository_url"]:
-                    repo_url = repo["repository_url"]
-                    branch=repo["branch"]
-            repo_fullname=repo_url.split("https://github.com/")[1]
-            repo_fullname=repo_fullname.split(".git")[0]
+            repo_fullname, branch = find_pr_target(state, repo_name)
             logger.info(repo_fullname)
             
-            # Check and delete existing PR between the same branches
-            check_and_delete_existing_pr(repo_fullname, agent_branch, branch, install_token)
-            
-            url = f"https://api.github.com/repos/{repo_fullname}/pulls"
-            headers = {
-            "Authorization": f"token {install_token}",
-            "Accept": "application/vnd.github+json"
-            }
             payload = {
                 "title": pr_title,
                 "head": agent_branch,
                 "base": branch,
                 "body": pr_body
             }
-            response = requests.post(url, json=payload, headers=headers)
+            # Check and delete existing PR between the same branches, then open the new one
+            response = open_pull_request(state, githubapp_installation_id, install_token, repo_fullname, payload)
             if response.status_code == 201:
                 pr_url = response.json().get("html_url")
                 logger.info(f"✅ Pull Request created: {pr_url}")
@@ -157,4 +169,70 @@ def create_pull_request(repo_name,pr_title,pr_body,state: Annotated[dict, Inject
             return "❌ Repository not found in codebase"
     except Exception as e:
         logger.error(f"Error creating pull request: {str(e)}", exc_info=True)
-        return f"❌ Error creating pull request: {str(e)}"
\ No newline at end of file
+        return f"❌ Error creating pull request: {str(e)}"
+
+async def acheck_and_delete_existing_pr(repo_fullname, agent_branch, base_branch, install_token):
+    """Async variant of check_and_delete_existing_pr."""
+    try:
+        github = get_async_github_client()
+        async for pr in github.paginate(f"/repos/{repo_fullname}/pulls", install_token,
+                                        params=existing_pr_filter(repo_fullname, agent_branch, base_branch)):
+            response = await github.patch(f"/repos/{repo_fullname}/pulls/{pr['number']}", install_token,
+                                          json_body={"state": "closed"}, raise_for_status=False)
+            if response.status_code == 200:
+                logger.info(f"✅ Closed existing PR #{pr['number']} between {agent_branch} and {base_branch}")
+            else:
+                logger.warning(f"Failed to close existing PR #{pr['number']}: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Error checking/closing existing PR: {str(e)}")
+
+async def aopen_pull_request(state, installation_id, install_token, repo_fullname, payload):
+    """Async variant of open_pull_request."""
+    for attempt in range(2):
+        await acheck_and_delete_existing_pr(repo_fullname, payload["head"], payload["base"], install_token)
+        response = await get_async_github_client().post(f"/repos/{repo_fullname}/pulls", install_token,
+                                                        json_body=payload, raise_for_status=False)
+        if response.status_code != 401 or attempt:
+            return response
+        logger.warning(f"GitHub rejected the installation token of {installation_id}, retrying with a new one")
+        get_token_cache().invalidate(installation_id)
+        install_token = await aget_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], installation_id)
+
+async def acreate_pull_request(repo_name,pr_title,pr_body,state: Annotated[dict, InjectedState]):
+    """Async variant of create_pull_request, used when the workflow runs on the event loop."""
+    try:
+        githubapp_installation_id = find_installation_id(state, repo_name)
+        if not githubapp_installation_id:
+            return "❌ Repository not found in codebase"
+        install_token = await aget_cached_installation_token(state['githubapp_privatekey'], state['githubapp_id'], githubapp_installation_id)
+
+        result = await arun_git(repo_command(state, repo_name, 'git branch'), current_dir)
+        agent_branch=extract_current_branch(result.stdout)
+
+        result = await arun_git(repo_command(state, repo_name, f'git add . && git commit -m"{pr_title}"'), current_dir)
+        logger.info(f"commit command: {result}")
+        result = await arun_git(repo_command(state, repo_name, f'git push --set-upstream origin {agent_branch}'), current_dir)
+        logger.info(f"First push command: {result}")
+        if result.returncode ==1:
+            result = await arun_git(repo_command(state, repo_name, f'git push --force origin {agent_branch}'), current_dir)
+            logger.info(f"Second push command: {result}")
+
+        repo_fullname, branch = find_pr_target(state, repo_name)
+        payload = {
+            "title": pr_title,
+            "head": agent_branch,
+            "base": branch,
+            "body": pr_body
+        }
+        response = await aopen_pull_request(state, githubapp_installation_id, install_token, repo_fullname, payload)
+        if response.status_code == 201:
+            pr_url = response.json().get("html_url")
+            logger.info(f"✅ Pull Request created: {pr_url}")
+            return f"✅ Pull Request created: {pr_url}"
+        logger.info("❌ Failed to create pull request:")
+        logger.info(f"Status Code: {response.status_code}")
+        logger.info(response.json())
+        return f"❌ Failed to create pull request {response.status_code}"
+    except Exception as e:
+        logger.error(f"Error creating pull request: {str(e)}", exc_info=True)
+        return f"❌ Error creating pull request: {str(e)}"
@@ -0,0 +1,175 @@
+import posixpath
+from tools.edit_tool import edit
+from tools.batch_edit_tool import batch_edit
+from tools.pr_tool import create_pull_request, acreate_pull_request
+from tools.view_tool import view
+from tools.search_tool import search
+from tools.gcloud_command_tool import run_gcloud_command, arun_gcloud_command
+from tools.terraform_tool import terraform_command_executor, aterraform_command_executor
+from tools.terraform_plan_tool import terraform_plan_details, SHELL_OPERATORS
+from tools.create_file_tool import create_file
+from tools.list_directory_contents_tool import list_directory_contents
+from tools.clone_repository_tool import clone_repository
+from tools.retrieve_log_tool import retrieve_logs
+
+READ_ONLY_TERRAFORM_OPERATIONS = ("plan", "validate", "show", "state list", "fmt -check")
+READ_ONLY_GCLOUD_VERBS = ("list", "describe", "get-iam-policy", "get-value", "read", "search", "lookup")
+# Verbs ending the command groups of a mutating gcloud command; arguments follow the verb.
+MUTATING_GCLOUD_VERBS = ("create", "delete", "update", "set", "unset", "add", "remove", "patch", "deploy", "enable",
+                         "disable", "start", "stop", "reset", "resize", "import", "export", "set-iam-policy",
+                         "add-iam-policy-binding", "remove-iam-policy-binding", "activate-service-account", "submit",
+                         "cancel", "rollback", "restore", "undelete", "move", "attach", "detach", "ssh", "scp", "publish")
+
+
+def terraform_is_read_only(args):
+    # Commands are run by a shell: a chained command may write whatever its first part is.
+    command = args.get("terraform_command", "")
+    if SHELL_OPERATORS.search(command):
+        return False
+    operation = " ".join(command.split()[1:])
+    return operation.startswith(READ_ONLY_TERRAFORM_OPERATIONS)
+
+
+def gcloud_is_read_only(args):
+    """True if the verb of the command, the first known verb after the command groups, is read-only."""
+    command = args.get("command", "")
+    if SHELL_OPERATORS.search(command):
+        return False
+    for word in command.split():
+        if word in READ_ONLY_GCLOUD_VERBS:
+            return True
+        if word in MUTATING_GCLOUD_VERBS:
+            return False
+    return False
+
+
+def repository_from_path(arg_name):
+    """Repository of a tool call whose argument is a path relative to the codebase root ('repo/...')."""
+    def repository(args):
+        return str(args.get(arg_name, "")).strip("/").split("/")[0] or None
+    return repository
+
+
+def repository_from_url(args):
+    return str(args.get("repo_url", "")).split("/")[-1].split(".")[0] or None
+
+
+def repository_from_name(args):
+    return args.get("repo_name") or None
+
+
+def codebase_path(arg_name):
+    """Normalized path of a tool call argument relative to the codebase root, '' for the root itself."""
+    def path(args):
+        normalized = posixpath.normpath(str(args.get(arg_name, "")).strip("/"))
+        return "" if normalized == "." else normalized
+    return path
+
+
+def whole_codebase(args):
+    return ""
+
+
+def batch_edit_paths(args):
+    paths = [codebase_path("file_path")(hunk) for hunk in args.get("edits") or [] if isinstance(hunk, dict)]
+    return [path for path in paths if path]
+
+
+def batch_edit_repository(args):
+    # batch_edit rejects a batch spanning several repositories without writing anything.
+    repositories = {path.split("/")[0] for path in batch_edit_paths(args)}
+    return repositories.pop() if len(repositories) == 1 else None
+
+
+def batch_edit_common_path(args):
+    paths = batch_edit_paths(args)
+    return posixpath.commonpath(paths) if paths else ""
+
+
+# Tools bound to the executor LLM, in the order they are presented to it.
+# read_only is a bool or a function of the call args; mutating calls are serialized per
+# repository, the repository being given by the 'repository' function of the call args.
+# afunc is the optional coroutine variant used by the async workflow, other tools run on a thread.
+# cacheable gives the codebase path a read-only result depends on, for the per-session result
+# cache; invalidates gives the path a mutating call writes, whose cached results are dropped.
+# serialized_by gives a key (e.g. a terraform working directory) whose calls never run at the
+# same time within a session, read-only ones included.
+TOOL_SPECS = {
+    "edit": {"func": edit, "read_only": False, "repository": repository_from_path("file_path"),
+             "invalidates": codebase_path("file_path")},
+    "batch_edit": {"func": batch_edit, "read_only": False, "repository": batch_edit_repository,
+                   "invalidates": batch_edit_common_path},
+    "create_pull_request": {"func": create_pull_request, "afunc": acreate_pull_request, "read_only": False,
+                            "repository": repository_from_name},
+    "view": {"func": view, "read_only": True, "repository": repository_from_path("file_path"),
+             "cacheable": codebase_path("file_path")},
+    "search": {"func": search, "read_only": True, "repository": None, "cacheable": whole_codebase},
+    "terraform_command_executor": {"func": terraform_command_executor, "afunc": aterraform_command_executor,
+                                   "read_only": terraform_is_read_only, "repository": repository_from_path("dir_execution"),
+                                   "invalidates": codebase_path("dir_execution"), "serialized_by": codebase_path("dir_execution")},
+    "terraform_plan_details": {"func": terraform_plan_details, "read_only": True, "repository": repository_from_path("dir_execution")},
+    "create_file": {"func": create_file, "read_only": False, "repository": repository_from_path("file_path"),
+                    "invalidates": codebase_path("file_path")},
+    "list_directory_contents": {"func": list_directory_contents, "read_only": True, "repository": repository_from_path("dir_path"),
+                                "cacheable": codebase_path("dir_path")},
+    "clone_repository": {"func": clone_repository, "read_only": False, "repository": repository_from_url,
+                         "invalidates": lambda args: repository_from_url(args) or ""},
+    "retrieve_logs": {"func": retrieve_logs, "read_only": True, "repository": None},
+    "run_gcloud_command": {"func": run_gcloud_command, "afunc": arun_gcloud_command, "read_only": gcloud_is_read_only,
+                           "repository": None},
+}
+
+TOOLS = [spec["func"] for spec in TOOL_SPECS.values()]
+
+# Name-indexed lookup used by the tool node, built once at import time.
+TOOL_REGISTRY = {func.__name__: func for func in TOOLS}
+
+TOOL_NAMES = list(TOOL_REGISTRY)
+
+
+def get_tool(tool_name):
+    return TOOL_REGISTRY.get(tool_name)
+
+
+def get_async_tool(tool_name):
+    spec = TOOL_SPECS.get(tool_name)
+    return spec.get("afunc") if spec is not None else None
+
+
+def is_read_only(tool_name, args):
+    spec = TOOL_SPECS.get(tool_name)
+    if spec is None:
+        return False
+    read_only = spec["read_only"]
+    return read_only(args) if callable(read_only) else read_only
+
+
+def repository_of(tool_name, args):
+    spec = TOOL_SPECS.get(tool_name)
+    if spec is None or spec["repository"] is None:
+        return None
+    return spec["repository"](args)
+
+
+def serialization_key(tool_name, args):
+    """Key of the calls a call must not run concurrently with, None when it has none."""
+    spec = TOOL_SPECS.get(tool_name)
+    if spec is None or spec.get("serialized_by") is None:
+        return None
+    return (tool_name, spec["serialized_by"](args))
+
+
+def cache_path(tool_name, args):
+    """Codebase path a cacheable call depends on, None when its result must not be cached."""
+    spec = TOOL_SPECS.get(tool_name)
+    if spec is None or spec.get("cacheable") is None:
+        return None
+    return spec["cacheable"](args)
+
+
+def invalidated_path(tool_name, args):
+    """Codebase path written by a mutating call, None when it leaves the codebase untouched."""
+    spec = TOOL_SPECS.get(tool_name)
+    if spec is None or spec.get("invalidates") is None or is_read_only(tool_name, args):
+        return None
+    return spec["invalidates"](args)
@@ -1,39 +1,49 @@
 import os
-import subprocess
 from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
+from tools.code_index import get_code_index
 current_dir = os.path.dirname(os.path.abspath(__file__))
-
-def search(query:str,state: Annotated[dict, InjectedState]):
+PAGE_SIZE = int(os.getenv("CODE_SEARCH_PAGE_SIZE", "50"))
+def format_results(results):
+    lines = []
+    for file in results["files"]:
+        lines.append(file["path"])
+        lines.extend(f"  {match['line']}: {match['text']}" for match in file["matches"])
+        if file["more_in_file"]:
+            lines.append(f"  ... {file['more_in_file']} more matches in this file")
+    if not lines:
+        return "No matches found." if results["page"] == 1 else "No more matches."
+    if results["has_more"]:
+        lines.append(f"\nShowing {results['matches']} matches (page {results['page']}). More matches exist: call again with page={results['page'] + 1} or narrow the query/glob.")
+    return "\n".join(lines)
+def search(query:str,state: Annotated[dict, InjectedState],regex:bool=False,glob:str=None,case_sensitive:bool=True,page:int=1):
     """
-    This tool runs a recursive search (excluding .ipynb files) for the given query string in all files of the user's codebase directory. It returns matching lines with file names and line numbers.
-
+    This tool searches the text files of the user's codebase for the given query and returns the matching lines grouped by file, with line numbers. Files ignored by .gitignore, binary files and vendored directories (.git, .terraform, node_modules, vendor) are not searched.
     Args:
-        query (str): The text or code snippet to search for. Can be a word, phrase, or code fragment. Quoting and escaping are handled automatically.
+        query (str): The text or code snippet to search for. Can be a word, phrase, or code fragment, matched literally unless regex is true.
         state: Automatically injected by the system - do not include this parameter in tool calls.
+        regex (bool): Optional. Treat the query as a Python regular expression, matched line by line. Defaults to false.
+        glob (str): Optional. Only search files whose path or name matches this glob (e.g. '*.tf', 'repo/modules/*').
+        case_sensitive (bool): Optional. Defaults to true.
+        page (int): Optional. Page of results to return when a previous call reported more matches. Defaults to 1.
     Returns:
-        str: The grep output, listing matches as 'filename:line_number:matched_line'. If no matches are found, returns an empty string. If an error occurs, stderr is included in the output.
-
+        str: The matching files, each followed by its matching lines as 'line_number: line'. At most 50 matches are returned per page and 20 per file; the output says when more matches exist. If no matches are found, returns 'No matches found.'.
     Example:
         >>> search(
         ...     query='def my_function'
         ... )
-
+        >>> search(
+        ...     query='resource "google_.*_bucket"',
+        ...     regex=True,
+        ...     glob='*.tf'
+        ... )
     Edge Cases:
-        - If the query is empty, grep will return no results.
+        - If the query is empty, returns no results.
+        - If regex is true and the query is not a valid regular expression, returns an error.
     """
-    
-
-    # Build the full command as a single shell string
-    command = f'cd .. && cd tmp && cd {state["session_id"]} && cd codebase && timeout 5s grep -rn --exclude="*.ipynb" "{query}"'
-
-    # Run the command in a shell
-    result = subprocess.run(
-        command,
-        cwd=current_dir,         # Start from current_dir
-        shell=True,              # Required for using 'cd' and '&&'
-        stdout=subprocess.PIPE,  # Capture standard output
-        stderr=subprocess.PIPE,  # Capture standard error
-        text=True                # Decode output as string
-    )
-    return result.stdout
\ No newline at end of file
+    if not query:
+        return "No matches found."
+    index = get_code_index(state["session_id"])
+    results = index.search(query, regex=bool(regex), case_sensitive=bool(case_sensitive), glob=glob or None,
+                           page=int(page or 1), page_size=PAGE_SIZE)
+    return format_results(results)
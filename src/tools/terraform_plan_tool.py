@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import shlex
+import tempfile
+import logging
+from collections import Counter
+from langgraph.prebuilt import InjectedState
+from typing_extensions import Annotated
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Last plan of a directory, as 'terraform show -json' prints it, read by terraform_plan_details.
+PLAN_JSON = os.path.join(".terraform", "agent-plan.json")
+MAX_LISTED_CHANGES = int(os.getenv("TERRAFORM_PLAN_MAX_LISTED_CHANGES", "50"))
+MAX_LISTED_ATTRIBUTES = 20
+SHELL_OPERATORS = re.compile(r"[;&|<>`$()]")
+# Plan options the summary mode sets itself, or that change what the plan prints or its exit code.
+UNSUMMARIZED_PLAN_FLAGS = ("-out", "-json", "-no-color", "-input", "-detailed-exitcode")
+ACTION_ORDER = ("create", "update", "replace", "delete", "read")
+
+
+def plan_arguments(terraform_command):
+    """Arguments of a plain 'terraform plan ...' command that can be summarized, None otherwise."""
+    if SHELL_OPERATORS.search(terraform_command):
+        return None
+    try:
+        words = shlex.split(terraform_command)
+    except ValueError:
+        return None
+    if words[:2] != ["terraform", "plan"] or any(word.startswith(("-out", "-json")) for word in words[2:]):
+        return None
+    return [word for word in words[2:] if not word.startswith(UNSUMMARIZED_PLAN_FLAGS)]
+
+
+def plan_commands(arguments, work_dir):
+    """The plan command writing a plan file, the command printing it as JSON, and the plan file."""
+    os.makedirs(os.path.join(work_dir, ".terraform"), exist_ok=True)
+    descriptor, plan_file = tempfile.mkstemp(dir=os.path.join(work_dir, ".terraform"), prefix="agent-", suffix=".tfplan")
+    os.close(descriptor)
+    plan = " ".join(["terraform", "plan", "-input=false", "-no-color", f"-out={shlex.quote(plan_file)}",
+                     *map(shlex.quote, arguments)])
+    return plan, f"terraform show -json -no-color {shlex.quote(plan_file)}", plan_file
+
+
+def action_name(actions):
+    if actions in (["delete", "create"], ["create", "delete"]):
+        return "replace"
+    return actions[0] if len(actions) == 1 else "-".join(actions)
+
+
+def changed_attributes(change):
+    """Top-level attributes whose value changes, 'known after apply' ones included."""
+    before = change.get("before") or {}
+    after = change.get("after") or {}
+    after_unknown = change.get("after_unknown") or {}
+    if not isinstance(before, dict) or not isinstance(after, dict):
+        return []
+    forcing = {path[0] for path in change.get("replace_paths") or [] if path}
+    attributes = []
+    for key in sorted(set(before) | set(after) | set(after_unknown if isinstance(after_unknown, dict) else {})):
+        unknown = isinstance(after_unknown, dict) and after_unknown.get(key)
+        if before.get(key) == after.get(key) and not unknown:
+            continue
+        label = key + (" (known after apply)" if unknown and after.get(key) is None else "")
+        attributes.append(label + (" (forces replacement)" if key in forcing else ""))
+    return attributes
+
+
+def describe_change(resource_change):
+    change = resource_change.get("change") or {}
+    action = action_name(change.get("actions") or ["no-op"])
+    described = {"address": resource_change.get("address"), "action": action}
+    if action in ("update", "replace"):
+        attributes = changed_attributes(change)
+        described["changed_attributes"] = attributes[:MAX_LISTED_ATTRIBUTES]
+        if len(attributes) > MAX_LISTED_ATTRIBUTES:
+            described["changed_attributes"].append(f"... {len(attributes) - MAX_LISTED_ATTRIBUTES} more")
+    if resource_change.get("action_reason"):
+        described["reason"] = resource_change["action_reason"]
+    return described
+
+
+def summarize_plan(plan, plan_output=""):
+    """Compact summary of a JSON plan: counts per action and resource type, changed attributes, drift."""
+    changes = [change for change in plan.get("resource_changes") or []
+               if action_name((change.get("change") or {}).get("actions") or ["no-op"]) != "no-op"]
+    by_type, totals = {}, Counter()
+    for change in changes:
+        action = action_name(change["change"]["actions"])
+        by_type.setdefault(change.get("type", "?"), Counter())[action] += 1
+        totals[action] += 1
+    drift = [describe_change(change) for change in plan.get("resource_drift") or []]
+    outputs = {name: action_name(change.get("actions") or ["no-op"])
+               for name, change in (plan.get("output_changes") or {}).items()
+               if action_name(change.get("actions") or ["no-op"]) != "no-op"}
+    summary = {
+        "summary": (f"Plan: {totals['create']} to add, {totals['update']} to change, {totals['delete']} to destroy, "
+                    f"{totals['replace']} to replace. {len(outputs)} output changes, {len(drift)} resources changed "
+                    f"outside of Terraform." if changes or outputs or drift else
+                    "No changes. Your infrastructure matches the configuration."),
+        "changes_by_type": {resource_type: {action: counts[action] for action in ACTION_ORDER if counts[action]}
+                            for resource_type, counts in sorted(by_type.items())},
+        "resource_changes": [describe_change(change) for change in changes[:MAX_LISTED_CHANGES]],
+    }
+    if len(changes) > MAX_LISTED_CHANGES:
+        summary["resource_changes"].append(f"... {len(changes) - MAX_LISTED_CHANGES} more resource changes, see changes_by_type")
+    if drift:
+        summary["drift"] = drift[:MAX_LISTED_CHANGES]
+    if outputs:
+        summary["output_changes"] = outputs
+    if plan.get("errored"):
+        summary["errored"] = True
+    warnings = [line.strip() for line in plan_output.splitlines() if line.startswith(("Warning:", "│ Warning:"))]
+    if warnings:
+        summary["warnings"] = warnings[:MAX_LISTED_ATTRIBUTES]
+    if changes or drift:
+        summary["details"] = "Call terraform_plan_details with a resource address for its full change."
+    return summary
+
+
+def finish_plan(work_dir, plan_file, plan_result, show_result):
+    """Tool result of a summarized plan, from the plan and show processes; the JSON plan is kept for details."""
+    try:
+        if plan_result.returncode != 0:
+            return {'success': False, 'stdout': "", 'stderr': plan_result.stderr or plan_result.stdout}
+        if show_result.returncode != 0:
+            return {'success': False, 'stdout': plan_result.stdout, 'stderr': show_result.stderr}
+        plan = json.loads(show_result.stdout)
+        temp_path = os.path.join(work_dir, PLAN_JSON + f".{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(show_result.stdout)
+        os.replace(temp_path, os.path.join(work_dir, PLAN_JSON))
+        return {'success': True, **summarize_plan(plan, plan_result.stdout), 'stderr': plan_result.stderr}
+    finally:
+        if os.path.exists(plan_file):
+            os.unlink(plan_file)
+
+
+def mask(value, unknown=None, sensitive=None):
+    """value with its sensitive parts replaced by '(sensitive)' and unknown ones by '(known after apply)'."""
+    if sensitive is True:
+        return "(sensitive)"
+    if unknown is True:
+        return "(known after apply)"
+    if isinstance(value, dict) or isinstance(unknown, dict) or isinstance(sensitive, dict):
+        value = value if isinstance(value, dict) else {}
+        unknown = unknown if isinstance(unknown, dict) else {}
+        sensitive = sensitive if isinstance(sensitive, dict) else {}
+        return {key: mask(value.get(key), unknown.get(key), sensitive.get(key))
+                for key in sorted(set(value) | set(unknown) | set(sensitive))}
+    if isinstance(value, list) or isinstance(unknown, list) or isinstance(sensitive, list):
+        value = value if isinstance(value, list) else []
+        unknown = unknown if isinstance(unknown, list) else []
+        sensitive = sensitive if isinstance(sensitive, list) else []
+        return [mask(item, unknown[index] if index < len(unknown) else None,
+                     sensitive[index] if index < len(sensitive) else None)
+                for index, item in enumerate(value + [None] * (max(len(unknown), len(sensitive)) - len(value)))]
+    return value
+
+
+def full_change(resource_change):
+    change = resource_change.get("change") or {}
+    detail = {
+        "address": resource_change.get("address"),
+        "action": action_name(change.get("actions") or ["no-op"]),
+        "before": mask(change.get("before"), None, change.get("before_sensitive")),
+        "after": mask(change.get("after"), change.get("after_unknown"), change.get("after_sensitive")),
+    }
+    for key in ("action_reason", "replace_paths"):
+        if resource_change.get(key) or change.get(key):
+            detail[key] = resource_change.get(key) or change.get(key)
+    return detail
+
+
+def terraform_plan_details(dir_execution: str, address: str, state: Annotated[dict, InjectedState]):
+    """
+    This tool returns the full change of one resource from the last plan summarized by terraform_command_executor in a directory: its action, the values before and after (sensitive values hidden, values only known after apply marked so) and what forces a replacement.
+
+    Args:
+        dir_execution (str): Path (relative to codebase root) where the plan was run (e.g., 'repo/infra').
+        address (str): The resource address, as listed in the plan summary (e.g., 'module.vpc.google_compute_network.main').
+        state: Automatically injected by the system - do not include this parameter in tool calls.
+    Returns:
+        dict: {'change': dict} for a planned change, plus {'drift': dict} if the resource also changed outside of Terraform, or {'error': str, 'similar_addresses': list} if the address is not in the plan.
+
+    Example:
+        >>> terraform_plan_details(dir_execution='repo/infra', address='google_storage_bucket.logs')
+
+    Edge Cases:
+        - If no plan was run in the directory, returns an error: run 'terraform plan' first.
+    """
+    try:
+        plan_path = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"], "codebase", dir_execution, PLAN_JSON))
+        if not os.path.isfile(plan_path):
+            return {"error": f"No plan found in '{dir_execution}': run 'terraform plan' there first."}
+        with open(plan_path, "r") as f:
+            plan = json.load(f)
+        result = {}
+        for key, entries in (("change", plan.get("resource_changes")), ("drift", plan.get("resource_drift"))):
+            for resource_change in entries or []:
+                if resource_change.get("address") == address:
+                    result[key] = full_change(resource_change)
+        if result:
+            return result
+        addresses = [change.get("address", "") for change in plan.get("resource_changes") or []]
+        needle = address.split(".")[-1]
+        return {"error": f"Resource '{address}' is not in the last plan of '{dir_execution}'.",
+                "similar_addresses": [candidate for candidate in addresses if needle and needle in candidate][:20]}
+    except Exception as e:
+        return {"error": str(e)}
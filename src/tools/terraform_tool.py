@@ -1,6 +1,10 @@
 import os        # Execute terraform command
 import subprocess
 import logging
+from contextlib import nullcontext
+from utlis.subprocess_runner import arun_command
+from utlis.terraform_cache import get_terraform_cache, is_init
+from tools.terraform_plan_tool import plan_arguments, plan_commands, finish_plan
 from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
 
@@ -14,9 +18,105 @@ logger = logging.getLogger(__name__)
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-def terraform_command_executor(terraform_command: str, dir_execution: str,state: Annotated[dict, InjectedState]):
+def validate_terraform_command(terraform_command):
+    """Return an error message for the agent if the command is not allowed, None otherwise."""
+    # Validate operation parameter
+    valid_operations = ['init', 'plan','validate', 'fmt', 'show','state list']
+    valid_operation=False
+    for op in valid_operations:
+        if op in terraform_command:
+            valid_operation=True
+            break
+    if terraform_command.split(" ")[1] == "apply":
+        valid_operation=False
+    if not valid_operation:
+        return f"The operation in your command is not valid. Valid operations: {valid_operations}"
+    if 'init' in terraform_command and '-backend-config' not in terraform_command:
+        return "To use init command you should always provide backend config file to get the state"
+    return None
+
+def terraform_shell_command(terraform_command, dir_execution, state):
+    """Shell command and environment running terraform_command in the session codebase."""
+    sa_key_path = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"],"sa_key.json"))
+
+    # Set env var and run Terraform
+    env = os.environ.copy()
+    env["GOOGLE_APPLICATION_CREDENTIALS"] = sa_key_path
+    env = get_terraform_cache().environment(env)
+    cmd = f"cd .. && cd tmp && cd {state['session_id']} && cd codebase && cd {dir_execution} && {terraform_command}"
+    return cmd, env
+
+def terraform_work_dir(dir_execution, state):
+    return os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"], "codebase", dir_execution))
+
+def terraform_result(result):
+    return {
+        'success': result.returncode == 0,
+        'stdout': result.stdout,
+        'stderr': result.stderr
+    }
+
+def run_terraform_shell(cmd, env):
+    return subprocess.run(
+        cmd,
+        cwd=current_dir,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env
+    )
+
+def skipped_init_result():
+    return {
+        'success': True,
+        'stdout': "Terraform is already initialized in this directory with the same backend config, lock file and "
+                  "module sources: init was skipped. Run init with -upgrade or -reconfigure to force it.",
+        'stderr': ""
+    }
+
+def terraform_error(error):
+    return {
+        'success': False,
+        'stdout': "",
+        'stderr': str(error)
+    }
+
+def terraform_steps(terraform_command, dir_execution, state, raw_output=False):
+    """
+    The logic of terraform_command_executor, apart from running processes, shared by its sync
+    and async variants. A generator: it yields (cmd, env, init_work_dir) for each terraform
+    process to run, init_work_dir being set for an init (run under the plugin cache lock),
+    is sent back the CompletedProcess, and returns the tool result.
+    """
+    logger.info("In terraform operation tool")
+    error = validate_terraform_command(terraform_command)
+    if error:
+        return error
+    cache = get_terraform_cache()
+    work_dir = terraform_work_dir(dir_execution, state)
+    if is_init(terraform_command) and cache.init_is_current(work_dir, terraform_command):
+        return skipped_init_result()
+    arguments = None if raw_output else plan_arguments(terraform_command)
+    if arguments is not None:
+        plan_command, show_command, plan_file = plan_commands(arguments, work_dir)
+        plan_result = yield (*terraform_shell_command(plan_command, dir_execution, state), None)
+        show_result = None
+        if plan_result.returncode == 0:
+            show_result = yield (*terraform_shell_command(show_command, dir_execution, state), None)
+        logger.info("out of terraform operation tool")
+        return finish_plan(work_dir, plan_file, plan_result, show_result)
+    init = is_init(terraform_command)
+    result = yield (*terraform_shell_command(terraform_command, dir_execution, state), work_dir if init else None)
+    if init:
+        cache.record_init(work_dir, terraform_command, result.returncode == 0)
+    logger.info("out of terraform operation tool")
+    return terraform_result(result)
+
+def terraform_command_executor(terraform_command: str, dir_execution: str,state: Annotated[dict, InjectedState], raw_output: bool = False):
     """
     This tool validates the requested Terraform operation, sets up credentials, and runs the command in the user's codebase directory. Only safe read-only operations are allowed (e.g., init, plan, validate, fmt, show, state list).
+    'terraform plan' returns a compact summary of the plan instead of its full output: counts per action and resource type, the changed attributes of each resource, drift and warnings. Use terraform_plan_details to see the full change of one resource.
 
     Important:
         - For any Terraform command, you must run 'terraform init' (with the appropriate backend config) in the target directory before running other Terraform commands. This ensures the working directory is initialized and the backend is configured.
@@ -25,8 +125,10 @@ def terraform_command_executor(terraform_command: str, dir_execution: str,state:
         terraform_command (str): The Terraform command to run (e.g., 'terraform plan', 'terraform validate'). Only certain operations are allowed. 'apply' is not permitted.
         dir_execution (str): Path (relative to codebase root) where the Terraform command should be executed (e.g., 'repo/infra').
         state: Automatically injected by the system - do not include this parameter in tool calls.
+        raw_output (bool): Optional. If true, 'terraform plan' returns its full text output instead of the summary. Rarely needed.
     Returns:
         dict: Contains 'success' (bool), 'stdout' (str), and 'stderr' (str). If the operation is invalid or an error occurs, returns an error message in 'stdout' or 'stderr'.
+        For a plan: 'success', 'summary' (str), 'changes_by_type' (dict), 'resource_changes' (list of {'address', 'action', 'changed_attributes'}), and when present 'drift', 'output_changes', 'warnings'.
 
     Example:
         >>> terraform_command_executor(
@@ -39,49 +141,36 @@ def terraform_command_executor(terraform_command: str, dir_execution: str,state:
         - If the backend config is missing for 'init', returns an error.
     """
     try:
-        logger.info("In terraform operation tool")
-        # Validate operation parameter
-        valid_operations = ['init', 'plan','validate', 'fmt', 'show','state list']
-        valid_operation=False
-        for op in valid_operations:
-            if op in terraform_command:
-                valid_operation=True
-                break
-        if terraform_command.split(" ")[1] == "apply":
-            valid_operation=False
-        if not valid_operation:
-            return f"The operation in your command is not valid. Valid operations: {valid_operations}"
-        if 'init' in terraform_command and '-backend-config' not in terraform_command:
-            return "To use init command you should always provide backend config file to get the state"
-
-  
-
-        sa_key_path = os.path.abspath(os.path.join(current_dir, "..", "tmp", state["session_id"],"sa_key.json"))
-
-        # Set env var and run Terraform
-        env = os.environ.copy()
-        env["GOOGLE_APPLICATION_CREDENTIALS"] = sa_key_path
-        cmd = f"cd .. && cd tmp && cd {state['session_id']} && cd codebase && cd {dir_execution} && {terraform_command}"
-        result = subprocess.run(
-            cmd,
-            cwd=current_dir,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            env=env
-        )
-        logger.info("out of terraform operation tool")
-        return {
-            'success': True,
-            'stdout': result.stdout,
-            'stderr': result.stderr
-        }
-                
+        steps = terraform_steps(terraform_command, dir_execution, state, raw_output)
+        process = None
+        while True:
+            try:
+                cmd, env, init_work_dir = steps.send(process)
+            except StopIteration as done:
+                return done.value
+            # Inits downloading providers write to the shared plugin cache, one at a time.
+            with get_terraform_cache().init_lock(init_work_dir) if init_work_dir else nullcontext():
+                process = run_terraform_shell(cmd, env)
+    except Exception as e:
+        logger.error(f"Error running terraform command: {e}", exc_info=True)
+        return terraform_error(e)
+
+
+async def aterraform_command_executor(terraform_command: str, dir_execution: str,state: Annotated[dict, InjectedState], raw_output: bool = False):
+    """Async variant of terraform_command_executor, used when the workflow runs on the event loop."""
+    try:
+        steps = terraform_steps(terraform_command, dir_execution, state, raw_output)
+        process = None
+        while True:
+            try:
+                cmd, env, init_work_dir = steps.send(process)
+            except StopIteration as done:
+                return done.value
+            if init_work_dir:
+                async with get_terraform_cache().ainit_lock(init_work_dir):
+                    process = await arun_command(cmd, cwd=current_dir, env=env)
+            else:
+                process = await arun_command(cmd, cwd=current_dir, env=env)
     except Exception as e:
-        print(e)
-        return {
-            'success': True,
-            'stdout': "result.stdout",
-            'stderr': "result.stderr"
-        }
\ No newline at end of file
+        logger.error(f"Error running terraform command: {e}", exc_info=True)
+        return terraform_error(e)
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def canonical_args(args):
+    """Call args as a stable string: keys sorted, the injected state left out."""
+    return json.dumps({k: v for k, v in args.items() if k != 'state'}, sort_keys=True, default=str)
+
+
+def paths_overlap(path, other):
+    """Whether one of two codebase-relative paths contains the other ('' is the whole codebase)."""
+    if not path or not other or path == other:
+        return True
+    return path.startswith(other + "/") or other.startswith(path + "/")
+
+
+class ToolResultCache():
+    """
+    Results of read-only tool calls per session, keyed by tool name and canonical args, so that
+    a call the executor repeats is answered without touching the workspace. Each entry records
+    the codebase path its result depends on; a mutating call drops the entries of the session
+    whose path overlaps the path it wrote. Entries also expire after ttl_seconds, for changes
+    made outside the tools.
+    """
+    def __init__(self, max_entries_per_session=256, ttl_seconds=600):
+        self.max_entries_per_session = max_entries_per_session
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.sessions = {}
+        # Bumped by every invalidation, so that a read that started before a write is not stored.
+        self.generations = {}
+        self.counters = {}
+
+    def _count(self, tool_name, counter, amount=1):
+        counters = self.counters.setdefault(tool_name, {"hits": 0, "misses": 0, "invalidated": 0})
+        counters[counter] += amount
+
+    def generation(self, session_id):
+        with self.lock:
+            return self.generations.get(session_id, 0)
+
+    def get(self, session_id, tool_name, args):
+        key = (tool_name, canonical_args(args))
+        with self.lock:
+            entries = self.sessions.get(session_id)
+            entry = entries.get(key) if entries is not None else None
+            if entry is not None and time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                del entries[key]
+                entry = None
+            if entry is None:
+                self._count(tool_name, "misses")
+                return None
+            entries.move_to_end(key)
+            self._count(tool_name, "hits")
+            return entry["result"]
+
+    def put(self, session_id, tool_name, args, path, result, generation):
+        key = (tool_name, canonical_args(args))
+        with self.lock:
+            if self.generations.get(session_id, 0) != generation:
+                return
+            entries = self.sessions.setdefault(session_id, OrderedDict())
+            entries[key] = {"path": path, "result": result, "stored_at": time.monotonic()}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries_per_session:
+                entries.popitem(last=False)
+
+    def invalidate(self, session_id, path):
+        """Drop the entries of the session that depend on path, or on a directory above or below it."""
+        with self.lock:
+            self.generations[session_id] = self.generations.get(session_id, 0) + 1
+            entries = self.sessions.get(session_id)
+            if not entries:
+                return 0
+            stale = [key for key, entry in entries.items() if paths_overlap(entry["path"], path)]
+            for key in stale:
+                del entries[key]
+                self._count(key[0], "invalidated")
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached tool results of session {session_id} under '{path}'")
+        return len(stale)
+
+    def evict_session(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            self.generations.pop(session_id, None)
+
+    def stats(self):
+        with self.lock:
+            tools = {}
+            for tool_name, counters in self.counters.items():
+                lookups = counters["hits"] + counters["misses"]
+                tools[tool_name] = {**counters, "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0}
+            return {
+                "enabled": True,
+                "sessions": len(self.sessions),
+                "entries": sum(len(entries) for entries in self.sessions.values()),
+                "ttl_seconds": self.ttl_seconds,
+                "tools": tools,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_tool_cache():
+    """Return the process-wide tool result cache, or None when TOOL_CACHE_ENABLED=0."""
+    global _cache
+    if os.getenv("TOOL_CACHE_ENABLED", "1") != "1":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ToolResultCache(
+                    max_entries_per_session=int(os.getenv("TOOL_CACHE_MAX_ENTRIES_PER_SESSION", "256")),
+                    ttl_seconds=int(os.getenv("TOOL_CACHE_TTL_SECONDS", "600")),
+                )
+    return _cache
+
+
+def tool_cache_stats():
+    cache = get_tool_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
@@ -1,6 +1,7 @@
 import os
 from langgraph.prebuilt import InjectedState
 from typing_extensions import Annotated
+from tools.file_windows import get_file_windows
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 def view(file_path: str, starting_line: int, ending_line:int,state: Annotated[dict, InjectedState]):
@@ -30,12 +31,11 @@ def view(file_path: str, starting_line: int, ending_line:int,state: Annotated[di
     starting_line = int(starting_line)
     ending_line = int(ending_line)
 
-    with open(os.path.abspath(os.path.join(current_dir, "..", "tmp",state["session_id"], "codebase", file_path)), "r") as file:
-        lines = file.readlines()
+    window, line_count = get_file_windows().read_window(
+        os.path.abspath(os.path.join(current_dir, "..", "tmp",state["session_id"], "codebase", file_path)), starting_line, ending_line)
     if starting_line>0:
-        window=lines[starting_line-1:ending_line]
         number_lines_above=starting_line-1
-        number_lines_below=len(lines)-ending_line
+        number_lines_below=line_count-ending_line
         if number_lines_below <=0:
             number_lines_below=0
         for i in range(len(window)):
@@ -0,0 +1,132 @@
+import os
+import json
+import fcntl
+import shlex
+import threading
+import subprocess
+import configparser
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(current_dir, "..", "..", "tmp"))
+CONFIG_DIR_NAME = "gcloud_config"
+INITIALIZED_MARKER = "agent-initialized"
+# Properties written to each session configuration: no prompts, update checks or usage reporting
+# slowing down non-interactive commands.
+QUIET_PROPERTIES = {
+    "core": {"disable_prompts": "True", "disable_usage_reporting": "True"},
+    "component_manager": {"disable_update_check": "True"},
+    "survey": {"disable_prompts": "True"},
+}
+
+
+class GcloudSessionConfigs():
+    """
+    A gcloud configuration directory (CLOUDSDK_CONFIG) per session, under the session workspace.
+    It is initialized once, with the session service account activated and its project set,
+    and reused by every later command of the session, so that a command is one gcloud process
+    and sessions never touch each other's (or the global) gcloud configuration.
+    The directory is re-initialized if the session's sa_key.json changes.
+    """
+    def __init__(self, workspace_root=WORKSPACE_ROOT, timeout=120):
+        self.workspace_root = workspace_root
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.counters = {"initializations": 0, "reuses": 0, "failures": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def paths(self, session_id):
+        session_dir = os.path.join(self.workspace_root, session_id)
+        return os.path.join(session_dir, "sa_key.json"), os.path.join(session_dir, CONFIG_DIR_NAME)
+
+    def _key_version(self, sa_key_path):
+        stat = os.stat(sa_key_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _is_initialized(self, config_dir, key_version):
+        try:
+            with open(os.path.join(config_dir, INITIALIZED_MARKER)) as f:
+                return f.read() == key_version
+        except OSError:
+            return False
+
+    def environment(self, session_id):
+        """
+        Environment running gcloud with the session configuration, and the session project id.
+        Initializes the configuration on first use.
+        """
+        sa_key_path, config_dir = self.paths(session_id)
+        with open(sa_key_path, "r") as f:
+            project_id = json.load(f)["project_id"]
+        key_version = self._key_version(sa_key_path)
+        if self._is_initialized(config_dir, key_version):
+            self._count("reuses")
+        else:
+            self._initialize(sa_key_path, config_dir, project_id, key_version)
+        env = os.environ.copy()
+        env["GOOGLE_APPLICATION_CREDENTIALS"] = sa_key_path
+        env["CLOUDSDK_CONFIG"] = config_dir
+        env["CLOUDSDK_CORE_PROJECT"] = project_id
+        return env, project_id
+
+    def _initialize(self, sa_key_path, config_dir, project_id, key_version):
+        os.makedirs(config_dir, exist_ok=True)
+        # Concurrent tool calls of a session (and other workers) wait for one initialization.
+        with open(config_dir + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._is_initialized(config_dir, key_version):
+                    self._count("reuses")
+                    return
+                env = {**os.environ, "CLOUDSDK_CONFIG": config_dir, "CLOUDSDK_CORE_DISABLE_PROMPTS": "1"}
+                result = subprocess.run(f"gcloud auth activate-service-account --key-file={shlex.quote(sa_key_path)}",
+                                        shell=True, capture_output=True, text=True, env=env, timeout=self.timeout)
+                if result.returncode != 0:
+                    self._count("failures")
+                    raise RuntimeError(f"Error authenticating with service account: {result.stderr.strip()}")
+                self._set_properties(config_dir, {**QUIET_PROPERTIES, "core": {**QUIET_PROPERTIES["core"], "project": project_id}})
+                with open(os.path.join(config_dir, INITIALIZED_MARKER), "w") as f:
+                    f.write(key_version)
+                self._count("initializations")
+                logger.info(f"Initialized gcloud configuration {config_dir} for project {project_id}")
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _set_properties(self, config_dir, properties):
+        """Write properties to the active configuration directly, instead of one 'gcloud config set' process each."""
+        path = os.path.join(config_dir, "configurations", "config_default")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        config = configparser.ConfigParser()
+        config.read(path)
+        for section, values in properties.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for key, value in values.items():
+                config.set(section, key, value)
+        with open(path, "w") as f:
+            config.write(f)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+_gcloud_configs = None
+_gcloud_configs_lock = threading.Lock()
+
+def get_gcloud_configs():
+    global _gcloud_configs
+    if _gcloud_configs is None:
+        with _gcloud_configs_lock:
+            if _gcloud_configs is None:
+                _gcloud_configs = GcloudSessionConfigs(timeout=int(os.getenv("GCLOUD_INIT_TIMEOUT_SECONDS", "120")))
+    return _gcloud_configs
@@ -0,0 +1,249 @@
+import os
+import re
+import time
+import fcntl
+import base64
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MIRROR_ROOT = os.path.abspath(os.path.join(current_dir, "..", "tmp", "_mirrors"))
+COLD_CLONE_MODES = ("full", "partial", "shallow")
+FETCH_STAMP = "agent-last-fetch"
+HEAD_REFSPECS = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+
+class GitCommandError(Exception):
+    def __init__(self, result):
+        super().__init__(f"{' '.join(result.args[:3])}... exited with {result.returncode}: {result.stderr.strip()}")
+        self.result = result
+
+
+def clean_url(url):
+    """Repository URL without credentials, the key of its mirror."""
+    parts = urlsplit(url)
+    netloc = parts.netloc.rsplit("@", 1)[-1].lower()
+    return urlunsplit((parts.scheme, netloc, parts.path.rstrip("/"), "", ""))
+
+
+def mirror_name(url):
+    url = clean_url(url)
+    readable = re.sub(r"[^A-Za-z0-9._-]+", "_", url.split("://", 1)[-1])[-80:].strip("_")
+    return f"{readable}-{hashlib.sha1(url.encode()).hexdigest()[:10]}.git"
+
+
+def auth_options(token):
+    """git -c options authenticating HTTPS requests with a GitHub token, without writing it to any config."""
+    if not token:
+        return []
+    credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    return ["-c", f"http.extraHeader=Authorization: Basic {credentials}"]
+
+
+def run_git(args, cwd=None, token=None, timeout=600):
+    result = subprocess.run(["git", *auth_options(token), *args], cwd=cwd, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, timeout=timeout,
+                            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"})
+    if result.returncode != 0:
+        raise GitCommandError(result)
+    return result
+
+
+class GitMirrorCache():
+    """
+    Bare mirrors of remote repositories shared by all sessions, keyed by clean repository URL.
+    A session clone is a local 'git clone --shared' of the mirror (objects are borrowed through
+    alternates, nothing is copied), so mirrors must never be deleted or garbage collected while
+    sessions use them. A mirror is refreshed with 'git fetch' when its last fetch is older than
+    fetch_ttl_seconds. Creating and fetching a mirror hold an exclusive fcntl lock on it, session
+    clones a shared one, so that concurrent sessions and workers cooperate.
+
+    cold_clone sets how a missing mirror is created: 'full', 'partial' (--filter=blob:none, the
+    blobs of a branch tip being fetched into the mirror the first time a session checks it out)
+    or 'shallow' (--depth shallow_depth).
+    """
+    def __init__(self, root=DEFAULT_MIRROR_ROOT, fetch_ttl_seconds=60, cold_clone="full", shallow_depth=50):
+        if cold_clone not in COLD_CLONE_MODES:
+            raise ValueError(f"cold_clone must be one of {COLD_CLONE_MODES}, got {cold_clone!r}")
+        self.root = root
+        self.fetch_ttl_seconds = fetch_ttl_seconds
+        self.cold_clone = cold_clone
+        self.shallow_depth = shallow_depth
+        self.lock = threading.Lock()
+        self.counters = {"cold_clones": 0, "fetches": 0, "fresh_hits": 0, "hydrations": 0, "session_clones": 0, "failures": 0}
+        self.hydrated = set()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def mirror_path(self, url):
+        return os.path.join(self.root, mirror_name(url))
+
+    @contextmanager
+    def _locked(self, url, exclusive):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.mirror_path(url) + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _last_fetch(self, path):
+        try:
+            return os.path.getmtime(os.path.join(path, FETCH_STAMP))
+        except OSError:
+            return None
+
+    def _stamp(self, path):
+        with open(os.path.join(path, FETCH_STAMP), "w") as f:
+            f.write(str(time.time()))
+
+    def _clone_mirror(self, url, path, token):
+        """Create the mirror in a temporary directory renamed into place, so it is never seen half-built."""
+        temp_path = tempfile.mkdtemp(dir=self.root, prefix=".cloning-")
+        try:
+            options = []
+            if self.cold_clone == "partial":
+                options = ["--filter=blob:none"]
+            elif self.cold_clone == "shallow":
+                options = ["--depth", str(self.shallow_depth), "--no-single-branch"]
+            run_git(["clone", "--bare", "--quiet", *options, url, temp_path], token=token)
+            run_git(["remote", "set-url", "origin", clean_url(url)], cwd=temp_path)
+            # Objects borrowed by session clones must never be pruned.
+            run_git(["config", "gc.auto", "0"], cwd=temp_path)
+            self._stamp(temp_path)
+            os.rename(temp_path, path)
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+        self._count("cold_clones")
+
+    def _fetch(self, path, token):
+        depth = ["--depth", str(self.shallow_depth)] if os.path.exists(os.path.join(path, "shallow")) else []
+        run_git(["fetch", "--quiet", "--prune", *depth, "origin", *HEAD_REFSPECS], cwd=path, token=token)
+        self._stamp(path)
+        self._count("fetches")
+
+    def ensure(self, url, token=None, force_fetch=False):
+        """Return the path of an up to date mirror of url, creating or fetching it if needed."""
+        path = self.mirror_path(url)
+        ttl = 0 if force_fetch else self.fetch_ttl_seconds
+        last_fetch = self._last_fetch(path)
+        if last_fetch is not None and time.time() - last_fetch < ttl:
+            self._count("fresh_hits")
+            return path
+        with self._locked(url, exclusive=True):
+            # Another session or worker may have cloned or fetched it while we waited for the lock.
+            last_fetch = self._last_fetch(path)
+            if last_fetch is None:
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                self._clone_mirror(url, path, token)
+            elif time.time() - last_fetch >= ttl:
+                self._fetch(path, token)
+            else:
+                self._count("fresh_hits")
+        return path
+
+    def clone(self, url, branch, destination, token=None, origin_url=None):
+        """
+        Check branch of url out in destination from the shared mirror. The clone's origin is
+        origin_url (e.g. with credentials, for pushes), url by default.
+        """
+        start = time.perf_counter()
+        try:
+            path = self.ensure(url, token=token)
+            partial = self._config(path, "remote.origin.promisor") == "true"
+            if partial:
+                self._hydrate(url, path, branch, token)
+            try:
+                self._clone_from(url, path, branch, destination)
+            except GitCommandError:
+                # The branch may have been pushed since the last fetch.
+                shutil.rmtree(destination, ignore_errors=True)
+                path = self.ensure(url, token=token, force_fetch=True)
+                if partial:
+                    self._hydrate(url, path, branch, token)
+                self._clone_from(url, path, branch, destination)
+            run_git(["remote", "set-url", "origin", origin_url or url], cwd=destination)
+            if partial:
+                # Blobs of older commits stay missing from the mirror, the session fetches them on demand.
+                run_git(["config", "remote.origin.promisor", "true"], cwd=destination)
+                run_git(["config", "remote.origin.partialclonefilter", "blob:none"], cwd=destination)
+            run_git(["reset", "--quiet", "--hard", "HEAD"], cwd=destination, token=token)
+        except Exception:
+            self._count("failures")
+            raise
+        self._count("session_clones")
+        logger.info(f"Cloned {clean_url(url)}@{branch} from mirror in {time.perf_counter() - start:.3f}s")
+
+    def _hydrate(self, url, path, branch, token):
+        """
+        Fetch into a partial mirror the blobs of the tip of branch it lacks, in one request, so that
+        session checkouts of that tip are local. Tips already complete are remembered.
+        """
+        tip = self._branch_tip(path, branch)
+        if tip is None or (path, tip) in self.hydrated:
+            return
+        with self._locked(url, exclusive=True):
+            listing = run_git(["rev-list", "--objects", "--missing=print", "-n", "1", tip], cwd=path).stdout
+            missing = [line[1:] for line in listing.splitlines() if line.startswith("?")]
+            if missing:
+                subprocess.run(["git", *auth_options(token), "fetch", "--quiet", "--no-tags", "--no-write-fetch-head",
+                                "--filter=blob:none", "--stdin", "origin"], cwd=path, input="\n".join(missing) + "\n",
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True,
+                               env={**os.environ, "GIT_TERMINAL_PROMPT": "0"})
+                self._count("hydrations")
+        with self.lock:
+            self.hydrated.add((path, tip))
+
+    def _branch_tip(self, path, branch):
+        result = subprocess.run(["git", "rev-parse", "--verify", "--quiet", f"refs/heads/{branch}"], cwd=path,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def _clone_from(self, url, path, branch, destination):
+        with self._locked(url, exclusive=False):
+            run_git(["clone", "--quiet", "--shared", "--no-checkout", "--branch", branch, path, destination])
+
+    def _config(self, path, key):
+        result = subprocess.run(["git", "config", "--get", key], cwd=path, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def stats(self):
+        with self.lock:
+            return {"root": self.root, "cold_clone": self.cold_clone, "fetch_ttl_seconds": self.fetch_ttl_seconds,
+                    **self.counters}
+
+
+_mirrors = None
+_mirrors_lock = threading.Lock()
+
+def get_git_mirrors():
+    """Return the process-wide mirror cache, configured from GIT_MIRROR_* environment variables."""
+    global _mirrors
+    if _mirrors is None:
+        with _mirrors_lock:
+            if _mirrors is None:
+                _mirrors = GitMirrorCache(
+                    root=os.getenv("GIT_MIRROR_ROOT", DEFAULT_MIRROR_ROOT),
+                    fetch_ttl_seconds=int(os.getenv("GIT_MIRROR_FETCH_TTL_SECONDS", "60")),
+                    cold_clone=os.getenv("GIT_MIRROR_COLD_CLONE", "full"),
+                    shallow_depth=int(os.getenv("GIT_MIRROR_SHALLOW_DEPTH", "50")),
+                )
+    return _mirrors
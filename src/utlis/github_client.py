@@ -0,0 +1,357 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import threading
+import weakref
+import logging
+from collections import OrderedDict
+from urllib.parse import urlencode
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.github.com"
+ACCEPT = "application/vnd.github+json"
+RETRIED_STATUSES = (500, 502, 503, 504)
+NEXT_LINK = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+class GitHubError(Exception):
+    def __init__(self, method, url, status_code, data):
+        message = data.get("message") if isinstance(data, dict) else data
+        super().__init__(f"{method} {url} failed with {status_code}: {message}")
+        self.status_code = status_code
+        self.data = data
+
+
+class GitHubRateLimited(GitHubError):
+    """The rate limit resets later than the client is allowed to wait."""
+
+
+class GitHubResponse():
+    def __init__(self, status_code, headers, data, cached=False):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+        # Served from the local cache after a 304 Not Modified.
+        self.cached = cached
+
+    def json(self):
+        return self.data
+
+
+def next_link(headers):
+    """URL of the next page from a Link header, or None on the last page."""
+    match = NEXT_LINK.search(headers.get("Link") or "")
+    return match.group(1) if match else None
+
+
+def token_key(token):
+    """Rate limits are per token: a short hash identifies it without keeping it in logs or metrics."""
+    return hashlib.sha256((token or "").encode()).hexdigest()[:12]
+
+
+def decode(response):
+    if response.status_code == 204 or not response.content:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+class ConditionalCache():
+    """
+    Bodies of GET responses with their ETag / Last-Modified, replayed when GitHub answers a
+    conditional request with 304 Not Modified (which does not count against the rate limit).
+    Entries are per token: a body is only replayed to the credentials it was fetched with.
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, token, url):
+        key = (token_key(token), url)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, token, url, headers, data):
+        validators = {name: headers[name] for name in ("ETag", "Last-Modified") if headers.get(name)}
+        if not validators:
+            return
+        key = (token_key(token), url)
+        with self.lock:
+            self.entries[key] = (validators, {"Link": headers.get("Link", "")}, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RateLimits():
+    """Last X-RateLimit-Remaining / X-RateLimit-Reset seen per token."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limits = {}
+
+    def update(self, token, headers):
+        remaining, reset = headers.get("X-RateLimit-Remaining"), headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        with self.lock:
+            self.limits[token_key(token)] = (int(remaining), float(reset))
+
+    def wait_time(self, token):
+        """Seconds to wait before the next request with token: until the reset if none is left."""
+        with self.lock:
+            remaining, reset = self.limits.get(token_key(token), (1, 0))
+        return max(0.0, reset - time.time()) if remaining <= 0 else 0.0
+
+    def stats(self):
+        with self.lock:
+            return {key: {"remaining": remaining, "reset": reset} for key, (remaining, reset) in self.limits.items()}
+
+
+class GitHubClientBase():
+    """
+    Request building, conditional caching and retry decisions shared by the sync and async
+    GitHub REST clients. Rate limited (403/429 with Retry-After or an exhausted
+    X-RateLimit-Remaining) and 5xx responses are retried after the delay GitHub asks for,
+    or exponential backoff, as long as the wait stays under max_wait_seconds.
+    """
+    def __init__(self, base_url=None, max_retries=3, max_wait_seconds=60, backoff_seconds=1.0,
+                 cache=None, rate_limits=None):
+        self.base_url = (base_url or os.getenv("GITHUB_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.max_retries = max_retries
+        self.max_wait_seconds = max_wait_seconds
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache if cache is not None else ConditionalCache()
+        self.rate_limits = rate_limits if rate_limits is not None else RateLimits()
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "not_modified": 0, "retries": 0, "rate_limit_waits": 0, "errors": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def url(self, path, params=None):
+        url = path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(sorted(params.items()))
+        return url
+
+    def headers(self, token, validators=None):
+        headers = {"Accept": ACCEPT, "X-GitHub-Api-Version": "2022-11-28"}
+        if token:
+            headers["Authorization"] = f"token {token}"
+        if validators:
+            if "ETag" in validators:
+                headers["If-None-Match"] = validators["ETag"]
+            if "Last-Modified" in validators:
+                headers["If-Modified-Since"] = validators["Last-Modified"]
+        return headers
+
+    def retry_delay(self, status_code, headers, attempt):
+        """Seconds to wait before retrying a response, or None if it is final."""
+        if attempt >= self.max_retries:
+            return None
+        if status_code in (403, 429):
+            if headers.get("Retry-After"):
+                return float(headers["Retry-After"])
+            if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+                return max(0.0, float(headers["X-RateLimit-Reset"]) - time.time()) + 1
+            # Secondary rate limits do not always say when to come back.
+            return self.backoff_seconds * 2 ** attempt if status_code == 429 else None
+        if status_code in RETRIED_STATUSES:
+            return self.backoff_seconds * 2 ** attempt
+        return None
+
+    def check_wait(self, method, url, delay):
+        if delay > self.max_wait_seconds:
+            self._count("errors")
+            raise GitHubRateLimited(method, url, 403, f"rate limited for {int(delay)}s more")
+
+    def finish(self, method, url, token, response_status, headers, data, entry, raise_for_status):
+        """Turn a final response into a GitHubResponse, replaying the cached body on 304."""
+        if response_status == 304 and entry is not None:
+            self._count("not_modified")
+            validators, cached_headers, cached_data = entry
+            headers = CaseInsensitiveDict(headers)
+            headers.update(cached_headers)
+            return GitHubResponse(200, headers, cached_data, cached=True)
+        if method == "GET" and response_status == 200:
+            self.cache.put(token, url, headers, data)
+        if raise_for_status and response_status >= 400:
+            self._count("errors")
+            raise GitHubError(method, url, response_status, data)
+        return GitHubResponse(response_status, headers, data)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "cached_responses": len(self.cache), "rate_limits": self.rate_limits.stats()}
+
+
+class GitHubClient(GitHubClientBase):
+    """GitHub REST client over one keep-alive requests.Session shared by all callers."""
+    def __init__(self, pool_size=16, timeout=30, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, path, token=None, params=None, json_body=None, raise_for_status=True):
+        url = self.url(path, params)
+        entry = self.cache.get(token, url) if method == "GET" else None
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limits.wait_time(token)
+            if wait:
+                self.check_wait(method, url, wait)
+                self._count("rate_limit_waits")
+                time.sleep(wait)
+            self._count("requests")
+            response = self.session.request(method, url, headers=self.headers(token, entry and entry[0]),
+                                            json=json_body, timeout=self.timeout)
+            self.rate_limits.update(token, response.headers)
+            delay = self.retry_delay(response.status_code, response.headers, attempt)
+            if delay is None:
+                break
+            self.check_wait(method, url, delay)
+            self._count("retries")
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        return self.finish(method, url, token, response.status_code, response.headers, decode(response), entry, raise_for_status)
+
+    def get(self, path, token=None, params=None, **kwargs):
+        return self.request("GET", path, token, params=params, **kwargs)
+
+    def post(self, path, token=None, json_body=None, **kwargs):
+        return self.request("POST", path, token, json_body=json_body, **kwargs)
+
+    def patch(self, path, token=None, json_body=None, **kwargs):
+        return self.request("PATCH", path, token, json_body=json_body, **kwargs)
+
+    def delete(self, path, token=None, **kwargs):
+        return self.request("DELETE", path, token, **kwargs)
+
+    def paginate(self, path, token=None, params=None, per_page=100):
+        """Items of every page of a list endpoint, following the Link header."""
+        url = self.url(path, {**(params or {}), "per_page": per_page})
+        while url:
+            response = self.get(url, token)
+            yield from response.data or []
+            url = next_link(response.headers)
+
+
+class AsyncGitHubClient(GitHubClientBase):
+    """Async variant of GitHubClient, over one httpx.AsyncClient per event loop."""
+    def __init__(self, pool_size=16, timeout=30, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # httpx clients cannot be shared across event loops.
+        self.clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.get(loop)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                client = self.clients[loop] = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        return client
+
+    async def request(self, method, path, token=None, params=None, json_body=None, raise_for_status=True):
+        url = self.url(path, params)
+        entry = self.cache.get(token, url) if method == "GET" else None
+        client = self.client()
+        for attempt in range(self.max_retries + 1):
+            wait = self.rate_limits.wait_time(token)
+            if wait:
+                self.check_wait(method, url, wait)
+                self._count("rate_limit_waits")
+                await asyncio.sleep(wait)
+            self._count("requests")
+            response = await client.request(method, url, headers=self.headers(token, entry and entry[0]),
+                                            json=json_body)
+            self.rate_limits.update(token, response.headers)
+            delay = self.retry_delay(response.status_code, response.headers, attempt)
+            if delay is None:
+                break
+            self.check_wait(method, url, delay)
+            self._count("retries")
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        return self.finish(method, url, token, response.status_code, response.headers, decode(response), entry, raise_for_status)
+
+    async def get(self, path, token=None, params=None, **kwargs):
+        return await self.request("GET", path, token, params=params, **kwargs)
+
+    async def post(self, path, token=None, json_body=None, **kwargs):
+        return await self.request("POST", path, token, json_body=json_body, **kwargs)
+
+    async def patch(self, path, token=None, json_body=None, **kwargs):
+        return await self.request("PATCH", path, token, json_body=json_body, **kwargs)
+
+    async def delete(self, path, token=None, **kwargs):
+        return await self.request("DELETE", path, token, **kwargs)
+
+    async def paginate(self, path, token=None, params=None, per_page=100):
+        """Async variant of GitHubClient.paginate."""
+        url = self.url(path, {**(params or {}), "per_page": per_page})
+        while url:
+            response = await self.get(url, token)
+            for item in response.data or []:
+                yield item
+            url = next_link(response.headers)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_shared_cache = None
+_shared_rate_limits = None
+
+def _client(kind):
+    global _shared_cache, _shared_rate_limits
+    if kind not in _clients:
+        with _clients_lock:
+            if kind not in _clients:
+                if _shared_cache is None:
+                    _shared_cache = ConditionalCache(max_entries=int(os.getenv("GITHUB_CACHE_MAX_ENTRIES", "1024")))
+                    _shared_rate_limits = RateLimits()
+                _clients[kind] = kind(
+                    base_url=os.getenv("GITHUB_API_URL", DEFAULT_API_URL),
+                    pool_size=int(os.getenv("GITHUB_POOL_SIZE", "16")),
+                    max_retries=int(os.getenv("GITHUB_MAX_RETRIES", "3")),
+                    max_wait_seconds=float(os.getenv("GITHUB_MAX_WAIT_SECONDS", "60")),
+                    cache=_shared_cache,
+                    rate_limits=_shared_rate_limits,
+                )
+    return _clients[kind]
+
+def get_github_client():
+    """Return the process-wide GitHub client, configured from GITHUB_* environment variables."""
+    return _client(GitHubClient)
+
+def get_async_github_client():
+    """Return the process-wide async GitHub client, sharing its response cache and rate limits with the sync one."""
+    return _client(AsyncGitHubClient)
+
+def github_client_stats():
+    return {kind.__name__: client.stats() for kind, client in list(_clients.items())}
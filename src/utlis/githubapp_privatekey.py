@@ -3,9 +3,19 @@ import json
 from google.cloud import storage
 from google.oauth2 import service_account
 import time
+import asyncio
+import threading
+import logging
+from datetime import datetime
 import jwt
 import requests
+import httpx
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 def get_github_app_private_key(url):
@@ -47,14 +57,194 @@ def get_jwt(private_key: str, app_id: str) -> str:
     payload = {"iat": now, "exp": now + 600, "iss": app_id}
     return jwt.encode(payload, private_key, algorithm="RS256")
 
-def get_installation_token(jwt_token: str, installation_id: str) -> str:
-    """Exchange the JWT for an installation access token."""
+def installation_token_request(jwt_token: str, installation_id: str):
     url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
     headers = {
         "Authorization": f"Bearer {jwt_token}",
         "Accept": "application/vnd.github+json"
     }
+    return url, headers
+
+def token_expiry(data) -> float:
+    """Expiry (epoch seconds) of an access_tokens response, one hour from now if absent."""
+    expires_at = data.get("expires_at")
+    if not expires_at:
+        return time.time() + 3600
+    return datetime.fromisoformat(expires_at.replace("Z", "+00:00")).timestamp()
+
+def get_installation_token(jwt_token: str, installation_id: str) -> str:
+    """Exchange the JWT for an installation access token."""
+    return request_installation_token(jwt_token, installation_id)[0]
+
+def request_installation_token(jwt_token: str, installation_id: str):
+    """Exchange the JWT for an installation access token, returned with its expiry."""
+    url, headers = installation_token_request(jwt_token, installation_id)
     resp = requests.post(url, headers=headers)
     resp.raise_for_status()
     data = resp.json()
-    return data["token"]
\ No newline at end of file
+    return data["token"], token_expiry(data)
+
+async def aget_installation_token(jwt_token: str, installation_id: str) -> str:
+    """Async variant of get_installation_token."""
+    return (await arequest_installation_token(jwt_token, installation_id))[0]
+
+async def arequest_installation_token(jwt_token: str, installation_id: str):
+    """Async variant of request_installation_token."""
+    url, headers = installation_token_request(jwt_token, installation_id)
+    async with httpx.AsyncClient() as client:
+        resp = await client.post(url, headers=headers)
+    resp.raise_for_status()
+    data = resp.json()
+    return data["token"], token_expiry(data)
+
+
+class InstallationTokenCache():
+    """
+    GitHub App JWTs (per app id) and installation access tokens (per installation id) shared by
+    all tools and sessions. A token is reused until refresh_margin_seconds before the expiry
+    GitHub returned with it, a JWT until jwt_margin_seconds before its 10 minutes expiry.
+    Concurrent refreshes of the same installation are de-duplicated: one caller requests the
+    token, the others wait for it (threads on a per-installation lock, coroutines on the
+    pending request's future).
+    """
+    def __init__(self, refresh_margin_seconds=300, jwt_margin_seconds=60):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.jwt_margin_seconds = jwt_margin_seconds
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.jwts = {}
+        self.refresh_locks = {}
+        self.pending = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "jwt_hits": 0, "jwt_misses": 0, "failures": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _fresh_token(self, installation_id):
+        with self.lock:
+            entry = self.tokens.get(str(installation_id))
+        if entry is not None and entry[1] - time.time() > self.refresh_margin_seconds:
+            return entry[0]
+        return None
+
+    def _store_token(self, installation_id, token, expires_at):
+        with self.lock:
+            self.tokens[str(installation_id)] = (token, expires_at)
+
+    def jwt(self, private_key, app_id):
+        """A JWT for app_id, signed again only when the cached one is about to expire."""
+        key = (str(app_id), hash(private_key))
+        with self.lock:
+            entry = self.jwts.get(key)
+            if entry is not None and entry[1] - time.time() > self.jwt_margin_seconds:
+                self.counters["jwt_hits"] += 1
+                return entry[0]
+            self.counters["jwt_misses"] += 1
+        issued_at = int(time.time())
+        token = get_jwt(private_key, app_id)
+        with self.lock:
+            self.jwts[key] = (token, issued_at + 600)
+        return token
+
+    def get(self, private_key, app_id, installation_id):
+        """Installation access token for installation_id, requested from GitHub only when needed."""
+        token = self._fresh_token(installation_id)
+        if token is not None:
+            self._count("hits")
+            return token
+        with self.lock:
+            refresh_lock = self.refresh_locks.setdefault(str(installation_id), threading.Lock())
+        with refresh_lock:
+            # Another thread may have refreshed it while we waited for the lock.
+            token = self._fresh_token(installation_id)
+            if token is not None:
+                self._count("coalesced")
+                return token
+            self._count("misses")
+            try:
+                token, expires_at = request_installation_token(self.jwt(private_key, app_id), installation_id)
+            except Exception:
+                self._count("failures")
+                raise
+            self._store_token(installation_id, token, expires_at)
+            logger.info(f"Refreshed installation token of {installation_id}, valid for {int(expires_at - time.time())}s")
+            return token
+
+    async def aget(self, private_key, app_id, installation_id):
+        """Async variant of get: coroutines of one event loop share a single pending request."""
+        token = self._fresh_token(installation_id)
+        if token is not None:
+            self._count("hits")
+            return token
+        loop = asyncio.get_running_loop()
+        key = (id(loop), str(installation_id))
+        with self.lock:
+            pending = self.pending.get(key)
+            if pending is None:
+                pending = self.pending[key] = loop.create_future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            self._count("coalesced")
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling() or not pending.cancelled():
+                    raise
+                # The owner was cancelled (e.g. its client disconnected), not this caller: refresh again.
+                return await self.aget(private_key, app_id, installation_id)
+        try:
+            self._count("misses")
+            token, expires_at = await arequest_installation_token(self.jwt(private_key, app_id), installation_id)
+            self._store_token(installation_id, token, expires_at)
+            logger.info(f"Refreshed installation token of {installation_id}, valid for {int(expires_at - time.time())}s")
+            pending.set_result(token)
+            return token
+        except Exception as e:
+            self._count("failures")
+            pending.set_exception(e)
+            # Mark the exception retrieved when nobody was waiting for it.
+            pending.exception()
+            raise
+        finally:
+            if not pending.done():
+                pending.cancel()
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def invalidate(self, installation_id):
+        """Forget the token of installation_id, e.g. after GitHub rejected it."""
+        with self.lock:
+            self.tokens.pop(str(installation_id), None)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+            return {"installations": len(self.tokens), **self.counters,
+                    "hit_rate": round((lookups - self.counters["misses"]) / lookups, 4) if lookups else 0.0}
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+def get_token_cache():
+    """Return the process-wide installation token cache, configured from GITHUB_TOKEN_* environment variables."""
+    global _token_cache
+    if _token_cache is None:
+        with _token_cache_lock:
+            if _token_cache is None:
+                _token_cache = InstallationTokenCache(
+                    refresh_margin_seconds=int(os.getenv("GITHUB_TOKEN_REFRESH_MARGIN_SECONDS", "300")),
+                    jwt_margin_seconds=int(os.getenv("GITHUB_JWT_REFRESH_MARGIN_SECONDS", "60")),
+                )
+    return _token_cache
+
+def get_cached_installation_token(private_key: str, app_id: str, installation_id: str) -> str:
+    """Installation access token from the shared cache (see InstallationTokenCache)."""
+    return get_token_cache().get(private_key, app_id, installation_id)
+
+async def aget_cached_installation_token(private_key: str, app_id: str, installation_id: str) -> str:
+    """Async variant of get_cached_installation_token."""
+    return await get_token_cache().aget(private_key, app_id, installation_id)
@@ -0,0 +1,86 @@
+import os
+import time
+import resource
+import threading
+
+
+def current_rss_bytes():
+    """Resident set size of the current process, in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the process high-water mark (kilobytes on Linux).
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssMonitor():
+    """
+    One process-wide thread sampling the RSS every interval seconds while at least one
+    RssSampler is open, and raising the peak of each open sampler. The thread exits when the
+    last sampler closes and is started again by the next one.
+    """
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samplers = set()
+        self._thread = None
+
+    def register(self, sampler):
+        with self.lock:
+            self.samplers.add(sampler)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="rss-monitor", daemon=True)
+                self._thread.start()
+
+    def unregister(self, sampler):
+        with self.lock:
+            self.samplers.discard(sampler)
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.samplers:
+                    self._thread = None
+                    return
+                samplers = list(self.samplers)
+            rss = current_rss_bytes()
+            for sampler in samplers:
+                sampler.peak_bytes = max(sampler.peak_bytes, rss)
+
+
+_monitor = RssMonitor()
+
+
+class RssSampler():
+    """
+    Peak process RSS while a session runs, sampled by the shared RssMonitor thread (no thread
+    per session). The process is shared by concurrent sessions, so the numbers are an upper
+    bound per session.
+    """
+    def __init__(self, monitor=None):
+        self.monitor = monitor or _monitor
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self.end_bytes = 0
+
+    def __enter__(self):
+        self.start_bytes = current_rss_bytes()
+        self.peak_bytes = self.start_bytes
+        self.monitor.register(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.unregister(self)
+        self.end_bytes = current_rss_bytes()
+        self.peak_bytes = max(self.peak_bytes, self.end_bytes)
+        return False
+
+    def to_dict(self):
+        return {
+            "rss_start_bytes": self.start_bytes,
+            "rss_peak_bytes": self.peak_bytes,
+            "rss_end_bytes": self.end_bytes,
+            "rss_peak_delta_bytes": self.peak_bytes - self.start_bytes,
+        }
@@ -0,0 +1,39 @@
+import asyncio
+import subprocess
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+async def arun_command(command, cwd=None, env=None, timeout=None):
+    """
+    Async counterpart of subprocess.run(command, shell=True, capture_output=True, text=True):
+    the event loop keeps serving other sessions while the process runs.
+    Returns a subprocess.CompletedProcess; raises subprocess.TimeoutExpired after killing the process.
+    """
+    process = await asyncio.create_subprocess_shell(
+        command,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.communicate()
+        raise subprocess.TimeoutExpired(command, timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        raise
+    return subprocess.CompletedProcess(
+        command,
+        process.returncode,
+        stdout.decode("utf-8", errors="replace"),
+        stderr.decode("utf-8", errors="replace"),
+    )
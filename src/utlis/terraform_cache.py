@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import fcntl
+import shlex
+import asyncio
+import hashlib
+import platform
+import threading
+import logging
+from contextlib import contextmanager, asynccontextmanager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_TERRAFORM_ROOT = os.path.abspath(os.path.join(current_dir, "..", "tmp", "_terraform"))
+INIT_STAMP = "agent-init.sha256"
+# Init flags asking for something else than reproducing the last init.
+NEVER_SKIPPED_INIT_FLAGS = ("-upgrade", "-reconfigure", "-migrate-state", "-force-copy", "-from-module")
+SHELL_OPERATORS = re.compile(r"[;&|<>`$()]")
+ATTRIBUTE = re.compile(r'^\s*(source|version)\s*=\s*(.+?)\s*$', re.MULTILINE)
+# Directory of the current platform in the plugin cache layout (<host>/<namespace>/<type>/<version>/<platform>).
+PLUGIN_PLATFORM = f"{platform.system().lower()}_{'arm64' if platform.machine() in ('arm64', 'aarch64') else 'amd64'}"
+
+
+def top_level_blocks(text):
+    """(header, body) of the top-level blocks of an HCL file, e.g. ('module "vpc"', '...')."""
+    blocks, depth, position, header_start, body_start = [], 0, 0, 0, 0
+    length = len(text)
+    while position < length:
+        char = text[position]
+        if char == '"':
+            position += 1
+            while position < length and text[position] != '"':
+                position += 2 if text[position] == "\\" else 1
+        elif char == "#" or text.startswith("//", position):
+            # The newline ending the comment is processed as usual.
+            position = text.find("\n", position)
+            if position < 0:
+                break
+            continue
+        elif text.startswith("/*", position):
+            position = text.find("*/", position)
+            if position < 0:
+                break
+            position += 1
+        elif char == "{":
+            if depth == 0:
+                body_start = position + 1
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                blocks.append((text[header_start:body_start - 1].strip(), text[body_start:position]))
+                header_start = position + 1
+            depth = max(depth, 0)
+        elif char == "\n" and depth == 0:
+            header_start = position + 1
+        position += 1
+    return blocks
+
+
+def init_inputs(module_dir, seen=None):
+    """
+    The parts of the configuration in module_dir that 'terraform init' depends on: the
+    terraform blocks (backend, required providers) and the source/version of every module
+    call, followed into local modules. Any other change (resources, variables, module
+    arguments) does not require a new init.
+    """
+    seen = set() if seen is None else seen
+    module_dir = os.path.realpath(module_dir)
+    if module_dir in seen or not os.path.isdir(module_dir):
+        return []
+    seen.add(module_dir)
+    inputs, local_modules = [], []
+    for name in sorted(os.listdir(module_dir)):
+        if not name.endswith((".tf", ".tf.json")):
+            continue
+        with open(os.path.join(module_dir, name), "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if name.endswith(".tf.json"):
+            # JSON configurations are rare: depend on the whole file.
+            inputs.append(f"{name}:{text}")
+            continue
+        for header, body in top_level_blocks(text):
+            kind = header.split()[0] if header else ""
+            if kind == "terraform":
+                inputs.append(f"{name}:terraform:{body}")
+            elif kind == "module":
+                attributes = dict(ATTRIBUTE.findall(body))
+                source = attributes.get("source", "").strip('"')
+                inputs.append(f"{name}:{header}:{source}:{attributes.get('version', '')}")
+                if source.startswith(("./", "../")):
+                    local_modules.append(os.path.join(module_dir, source))
+    for local_module in local_modules:
+        inputs.extend(init_inputs(local_module, seen))
+    return inputs
+
+
+def init_arguments(terraform_command):
+    """Arguments of a plain 'terraform init ...' command, None for any other command."""
+    if SHELL_OPERATORS.search(terraform_command):
+        return None
+    try:
+        words = shlex.split(terraform_command)
+    except ValueError:
+        return None
+    if words[:2] != ["terraform", "init"]:
+        return None
+    return words[2:]
+
+
+def locked_providers(work_dir):
+    """(address, version) of the providers pinned by the .terraform.lock.hcl of work_dir, None without one."""
+    try:
+        with open(os.path.join(work_dir, ".terraform.lock.hcl"), "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return None
+    providers = []
+    for header, body in top_level_blocks(text):
+        words = header.split()
+        if len(words) == 2 and words[0] == "provider":
+            providers.append((words[1].strip('"'), dict(ATTRIBUTE.findall(body)).get("version", "").strip('"')))
+    return providers
+
+
+def is_init(terraform_command):
+    """True if terraform_command runs an init, possibly along other commands."""
+    return "init" in terraform_command.split()
+
+
+class TerraformCache():
+    """
+    Terraform state shared across sessions and the reuse of init results per workspace.
+
+    - Providers are downloaded once into a shared plugin cache (plugin_cache_dir), that session
+      .terraform directories link to. Terraform does not support concurrent writes to the cache:
+      an init whose locked providers are all cached only reads it and takes a shared fcntl lock,
+      concurrently with other such inits; the others (a provider version not downloaded yet,
+      no lock file) take it exclusively.
+    - With provider_mirror, providers are installed from that local filesystem mirror
+      ('terraform providers mirror' layout), and only from it when mirror_only is set.
+    - After a successful init, a fingerprint of its inputs (command, backend config files,
+      .terraform.lock.hcl, terraform blocks and module sources) is written to .terraform.
+      A later init with the same fingerprint is skipped.
+    """
+    def __init__(self, root=DEFAULT_TERRAFORM_ROOT, plugin_cache_dir=None, provider_mirror=None, mirror_only=False,
+                 reuse_init=True):
+        self.root = root
+        self.plugin_cache_dir = plugin_cache_dir or os.path.join(root, "plugins")
+        self.provider_mirror = os.path.abspath(provider_mirror) if provider_mirror else None
+        self.mirror_only = mirror_only
+        self.reuse_init = reuse_init
+        self.cli_config_file = None
+        self.lock = threading.Lock()
+        self.counters = {"inits": 0, "inits_skipped": 0, "init_failures": 0, "shared_init_locks": 0, "exclusive_init_locks": 0}
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def _write_cli_config(self):
+        lines = [f"plugin_cache_dir = {json.dumps(self.plugin_cache_dir)}",
+                 # Use cached providers even when the lock file has no checksum for this platform yet.
+                 "plugin_cache_may_break_dependency_lock_file = true"]
+        if self.provider_mirror:
+            lines += ["provider_installation {",
+                      "  filesystem_mirror {",
+                      f"    path = {json.dumps(self.provider_mirror)}",
+                      "  }"]
+            if not self.mirror_only:
+                lines.append("  direct {}")
+            lines.append("}")
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, "terraformrc")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+        return path
+
+    def environment(self, env):
+        """env with the shared plugin cache (and provider mirror) configured."""
+        os.makedirs(self.plugin_cache_dir, exist_ok=True)
+        env = dict(env)
+        env["TF_PLUGIN_CACHE_DIR"] = self.plugin_cache_dir
+        env.setdefault("TF_IN_AUTOMATION", "1")
+        # A CLI configuration set by the deployment is kept.
+        if "TF_CLI_CONFIG_FILE" not in os.environ:
+            with self.lock:
+                if self.cli_config_file is None:
+                    self.cli_config_file = self._write_cli_config()
+            env["TF_CLI_CONFIG_FILE"] = self.cli_config_file
+        return env
+
+    def fingerprint(self, work_dir, arguments):
+        digest = hashlib.sha256()
+        digest.update(json.dumps(arguments).encode())
+        for argument in arguments:
+            if argument.startswith("-backend-config="):
+                path = os.path.join(work_dir, argument.split("=", 1)[1])
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+        lock_file = os.path.join(work_dir, ".terraform.lock.hcl")
+        if os.path.isfile(lock_file):
+            with open(lock_file, "rb") as f:
+                digest.update(f.read())
+        for item in init_inputs(work_dir):
+            digest.update(item.encode("utf-8", errors="replace"))
+        return digest.hexdigest()
+
+    def _stamp_path(self, work_dir):
+        return os.path.join(work_dir, ".terraform", INIT_STAMP)
+
+    def init_is_current(self, work_dir, terraform_command):
+        """True if terraform_command is a plain init whose inputs did not change since it last succeeded in work_dir."""
+        arguments = init_arguments(terraform_command)
+        if not self.reuse_init or arguments is None or any(argument.startswith(NEVER_SKIPPED_INIT_FLAGS) for argument in arguments):
+            return False
+        try:
+            with open(self._stamp_path(work_dir)) as f:
+                current = f.read() == self.fingerprint(work_dir, arguments)
+        except OSError:
+            return False
+        if current:
+            self._count("inits_skipped")
+        return current
+
+    def record_init(self, work_dir, terraform_command, succeeded):
+        arguments = init_arguments(terraform_command)
+        self._count("inits" if succeeded else "init_failures")
+        stamp = self._stamp_path(work_dir)
+        try:
+            if succeeded and arguments is not None and os.path.isdir(os.path.dirname(stamp)):
+                with open(stamp, "w") as f:
+                    f.write(self.fingerprint(work_dir, arguments))
+            elif os.path.exists(stamp):
+                os.unlink(stamp)
+        except OSError as e:
+            logger.warning(f"Could not record terraform init of {work_dir}: {str(e)}")
+
+    def providers_cached(self, work_dir):
+        """True if every provider locked by work_dir is already in the plugin cache, so an init only reads it."""
+        providers = locked_providers(work_dir)
+        if not providers:
+            return False
+        return all(os.path.isdir(os.path.join(self.plugin_cache_dir, address, version, PLUGIN_PLATFORM))
+                   for address, version in providers)
+
+    def _init_lock_mode(self, work_dir):
+        shared = self.providers_cached(work_dir)
+        self._count("shared_init_locks" if shared else "exclusive_init_locks")
+        return fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+
+    @contextmanager
+    def init_lock(self, work_dir):
+        """Lock on the plugin cache for an init of work_dir: shared if it only reads the cache, exclusive otherwise."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "plugins.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, self._init_lock_mode(work_dir))
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @asynccontextmanager
+    async def ainit_lock(self, work_dir):
+        """Async variant of init_lock: the lock is waited for off the event loop."""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "plugins.lock"), "a") as lock_file:
+            await asyncio.to_thread(fcntl.flock, lock_file, self._init_lock_mode(work_dir))
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self.lock:
+            return {"plugin_cache_dir": self.plugin_cache_dir, "provider_mirror": self.provider_mirror,
+                    "mirror_only": self.mirror_only, **self.counters}
+
+
+_terraform_cache = None
+_terraform_cache_lock = threading.Lock()
+
+def get_terraform_cache():
+    """Return the process-wide terraform cache, configured from TF_PLUGIN_CACHE_DIR and TERRAFORM_* environment variables."""
+    global _terraform_cache
+    if _terraform_cache is None:
+        with _terraform_cache_lock:
+            if _terraform_cache is None:
+                _terraform_cache = TerraformCache(
+                    root=os.getenv("TERRAFORM_CACHE_ROOT", DEFAULT_TERRAFORM_ROOT),
+                    plugin_cache_dir=os.getenv("TF_PLUGIN_CACHE_DIR"),
+                    provider_mirror=os.getenv("TERRAFORM_PROVIDER_MIRROR"),
+                    mirror_only=os.getenv("TERRAFORM_MIRROR_ONLY", "0") == "1",
+                    reuse_init=os.getenv("TERRAFORM_INIT_REUSE", "1") == "1",
+                )
+    return _terraform_cache
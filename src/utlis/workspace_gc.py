@@ -0,0 +1,268 @@
+import os
+import time
+import shutil
+import threading
+import logging
+from contextlib import contextmanager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_WORKSPACE_ROOT = os.path.abspath(os.path.join(current_dir, "..", "tmp"))
+# Directories that are pure caches and can be dropped from a session without losing work.
+REGENERABLE_DIRS = (".terraform",)
+# Evicted directories are moved here under the lock, and deleted after it is released.
+TRASH_DIR_NAME = "_trash"
+
+
+def dir_size(path):
+    """Total size in bytes of the files under path, without following symlinks."""
+    total = 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def find_regenerable_dirs(path):
+    found = []
+    for root, dirs, _ in os.walk(path):
+        for name in list(dirs):
+            if name in REGENERABLE_DIRS:
+                found.append(os.path.join(root, name))
+                dirs.remove(name)
+            elif name == ".git":
+                dirs.remove(name)
+    return found
+
+
+class WorkspaceReaper():
+    """
+    Garbage collector for the tmp/<session_id> workspaces.
+    A sweep evicts, least recently used first and never touching pinned sessions:
+    - sessions idle for longer than max_idle_seconds,
+    - sessions above session_quota_bytes (after dropping their .terraform caches),
+    - sessions until the whole root fits in global_quota_bytes.
+    Directories of the root whose name starts with '_' or '.' are not session workspaces and
+    are never swept: shared caches live there (tmp/_mirrors, tmp/_terraform).
+    """
+    def __init__(self, root=DEFAULT_WORKSPACE_ROOT, global_quota_bytes=20 * 1024 ** 3,
+                 session_quota_bytes=2 * 1024 ** 3, max_idle_seconds=24 * 3600, interval_seconds=300):
+        self.root = root
+        self.global_quota_bytes = global_quota_bytes
+        self.session_quota_bytes = session_quota_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self.interval_seconds = interval_seconds
+        self.lock = threading.Lock()
+        self.pins = {}
+        self.last_access = {}
+        self.eviction_hooks = []
+        self.bytes_reclaimed = 0
+        self.evictions = {"idle": 0, "session_quota": 0, "global_quota": 0}
+        self.cache_dirs_removed = 0
+        self.pinned_over_quota = 0
+        self.sweeps = 0
+        self.last_sweep = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._trashed = 0
+
+    def touch(self, session_id):
+        with self.lock:
+            self.last_access[session_id] = time.time()
+
+    @contextmanager
+    def pin(self, session_id):
+        """Keep a session's workspace out of eviction while it is in use."""
+        with self.lock:
+            self.pins[session_id] = self.pins.get(session_id, 0) + 1
+            self.last_access[session_id] = time.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.pins[session_id] -= 1
+                if self.pins[session_id] <= 0:
+                    del self.pins[session_id]
+                self.last_access[session_id] = time.time()
+
+    def is_pinned(self, session_id):
+        with self.lock:
+            return session_id in self.pins
+
+    def add_eviction_hook(self, hook):
+        """Register hook(session_id), called after a session workspace is removed."""
+        self.eviction_hooks.append(hook)
+
+    def list_sessions(self):
+        sessions = []
+        if not os.path.isdir(self.root):
+            return sessions
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and not entry.name.startswith(("_", ".")):
+                    with self.lock:
+                        last_access = self.last_access.get(entry.name)
+                    if last_access is None:
+                        last_access = entry.stat(follow_symlinks=False).st_mtime
+                    sessions.append({
+                        "session_id": entry.name,
+                        "path": entry.path,
+                        "last_access": last_access,
+                        "size": dir_size(entry.path),
+                    })
+        sessions.sort(key=lambda s: s["last_access"])
+        return sessions
+
+    def _trash_path(self, name):
+        """A new path under the trash directory (same filesystem as the workspaces, so moving there is a rename)."""
+        trash_dir = os.path.join(self.root, TRASH_DIR_NAME)
+        os.makedirs(trash_dir, exist_ok=True)
+        self._trashed += 1
+        return os.path.join(trash_dir, f"{name}-{os.getpid()}-{self._trashed}")
+
+    def empty_trash(self, path=None):
+        """Delete path, a directory moved to the trash, or the whole trash (left over by a previous process)."""
+        shutil.rmtree(path or os.path.join(self.root, TRASH_DIR_NAME), ignore_errors=True)
+
+    def evict(self, session, reason):
+        # Re-check under the lock right before removing: the session may have been picked up again.
+        # Only a rename happens under the lock, pin() and touch() on the request path never wait for the deletion.
+        with self.lock:
+            if session["session_id"] in self.pins:
+                return False
+            try:
+                trash_path = self._trash_path(session["session_id"])
+                os.rename(session["path"], trash_path)
+            except OSError as e:
+                logger.warning(f"Could not evict workspace {session['session_id']}: {str(e)}")
+                return False
+            self.last_access.pop(session["session_id"], None)
+            self.bytes_reclaimed += session["size"]
+            self.evictions[reason] += 1
+        self.empty_trash(trash_path)
+        logger.info(f"Evicted workspace {session['session_id']} ({session['size']} bytes, {reason})")
+        for hook in self.eviction_hooks:
+            try:
+                hook(session["session_id"])
+            except Exception as e:
+                logger.error(f"Workspace eviction hook failed: {str(e)}", exc_info=True)
+        return True
+
+    def drop_regenerable_dirs(self, session):
+        reclaimed = 0
+        for path in find_regenerable_dirs(session["path"]):
+            size = dir_size(path)
+            with self.lock:
+                if session["session_id"] in self.pins:
+                    break
+                try:
+                    trash_path = self._trash_path(os.path.basename(path).lstrip("."))
+                    os.rename(path, trash_path)
+                except OSError as e:
+                    logger.warning(f"Could not remove {path}: {str(e)}")
+                    continue
+                self.bytes_reclaimed += size
+                self.cache_dirs_removed += 1
+            self.empty_trash(trash_path)
+            reclaimed += size
+        session["size"] -= reclaimed
+        return reclaimed
+
+    def sweep(self):
+        now = time.time()
+        remaining = []
+        for session in self.list_sessions():
+            if self.is_pinned(session["session_id"]):
+                if session["size"] > self.session_quota_bytes:
+                    self.pinned_over_quota += 1
+                    logger.warning(f"Pinned workspace {session['session_id']} is over its quota ({session['size']} bytes)")
+                remaining.append(session)
+            elif now - session["last_access"] > self.max_idle_seconds:
+                if not self.evict(session, "idle"):
+                    remaining.append(session)
+            elif session["size"] > self.session_quota_bytes:
+                self.drop_regenerable_dirs(session)
+                if session["size"] <= self.session_quota_bytes or not self.evict(session, "session_quota"):
+                    remaining.append(session)
+            else:
+                remaining.append(session)
+
+        total = sum(session["size"] for session in remaining)
+        for session in remaining:
+            if total <= self.global_quota_bytes:
+                break
+            if self.evict(session, "global_quota"):
+                total -= session["size"]
+        if total > self.global_quota_bytes:
+            logger.warning(f"Workspaces still use {total} bytes, over the {self.global_quota_bytes} bytes quota, all remaining are pinned")
+        self.sweeps += 1
+        self.last_sweep = now
+        return total
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.empty_trash()
+        self._thread = threading.Thread(target=self._run, name="workspace-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Workspace sweep failed: {str(e)}", exc_info=True)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "root": self.root,
+                "pinned_sessions": sorted(self.pins),
+                "bytes_reclaimed": self.bytes_reclaimed,
+                "evictions": dict(self.evictions),
+                "cache_dirs_removed": self.cache_dirs_removed,
+                "pinned_over_quota": self.pinned_over_quota,
+                "sweeps": self.sweeps,
+                "last_sweep": self.last_sweep,
+                "global_quota_bytes": self.global_quota_bytes,
+                "session_quota_bytes": self.session_quota_bytes,
+                "max_idle_seconds": self.max_idle_seconds,
+            }
+
+
+_reaper = None
+_reaper_lock = threading.Lock()
+
+def get_workspace_reaper():
+    """Return the process-wide reaper, configured from WORKSPACE_* environment variables."""
+    global _reaper
+    if _reaper is None:
+        with _reaper_lock:
+            if _reaper is None:
+                _reaper = WorkspaceReaper(
+                    global_quota_bytes=int(os.getenv("WORKSPACE_GLOBAL_QUOTA_BYTES", str(20 * 1024 ** 3))),
+                    session_quota_bytes=int(os.getenv("WORKSPACE_SESSION_QUOTA_BYTES", str(2 * 1024 ** 3))),
+                    max_idle_seconds=int(os.getenv("WORKSPACE_MAX_IDLE_SECONDS", str(24 * 3600))),
+                    interval_seconds=int(os.getenv("WORKSPACE_SWEEP_INTERVAL_SECONDS", "300")),
+                )
+    return _reaper
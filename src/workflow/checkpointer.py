@@ -0,0 +1,225 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(current_dir, "..", "data", "checkpoints.sqlite"))
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SQLite checkpointer on local disk that stays bounded:
+    - compact(thread_id) drops superseded checkpoints (and their writes) of a thread,
+      keeping only the latest keep_last ones, so a thread stores its final state once.
+    - evict() removes whole threads idle for longer than ttl_seconds, then the least
+      recently updated threads until the stored bytes fit in max_bytes.
+    Threads registered with active() are never evicted.
+    """
+    def __init__(self, conn, ttl_seconds=7 * 24 * 3600, max_bytes=512 * 1024 * 1024, keep_last=1):
+        super().__init__(conn)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.keep_last = max(1, keep_last)
+        self.active_threads = {}
+        self.active_lock = threading.Lock()
+        self.compacted_checkpoints = 0
+        self.evicted_threads = 0
+
+    def setup(self):
+        if self.is_setup:
+            return
+        # Must run before the tables exist to take effect on a new database.
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved_config = super().put(config, checkpoint, metadata, new_versions)
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)",
+                (str(config["configurable"]["thread_id"]), time.time()),
+            )
+        return saved_config
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+    # SqliteSaver only implements the sync interface. The async workflow runs the same
+    # calls on worker threads; the saver's own lock serializes access to the connection.
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    @contextmanager
+    def active(self, thread_id):
+        """Pin a thread while a run is using it so eviction leaves it alone."""
+        with self.active_lock:
+            self.active_threads[thread_id] = self.active_threads.get(thread_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self.active_lock:
+                self.active_threads[thread_id] -= 1
+                if self.active_threads[thread_id] <= 0:
+                    del self.active_threads[thread_id]
+
+    def compact(self, thread_id):
+        """Keep only the latest keep_last checkpoints of each namespace of the thread."""
+        removed = 0
+        with self.cursor() as cur:
+            namespaces = [row[0] for row in cur.execute(
+                "SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (str(thread_id),)
+            ).fetchall()]
+            for checkpoint_ns in namespaces:
+                # Checkpoint ids are time-ordered (uuid6), so the lexical order is the creation order.
+                stale_ids = [row[0] for row in cur.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                    (str(thread_id), checkpoint_ns, self.keep_last),
+                ).fetchall()]
+                for checkpoint_id in stale_ids:
+                    cur.execute(
+                        "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (str(thread_id), checkpoint_ns, checkpoint_id),
+                    )
+                    cur.execute(
+                        "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (str(thread_id), checkpoint_ns, checkpoint_id),
+                    )
+                removed += len(stale_ids)
+            if removed:
+                cur.execute("PRAGMA incremental_vacuum").fetchall()
+        self.compacted_checkpoints += removed
+        if removed:
+            logger.info(f"Compacted {removed} checkpoints of thread {thread_id}")
+        return removed
+
+    def stored_bytes(self):
+        with self.cursor(transaction=False) as cur:
+            checkpoints = cur.execute(
+                "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+            ).fetchone()[0]
+            writes = cur.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+        return checkpoints + writes
+
+    def evict(self):
+        """Apply TTL and size based eviction of whole threads. Returns the evicted thread ids."""
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute(
+                "SELECT thread_id, updated_at FROM thread_activity ORDER BY updated_at ASC"
+            ).fetchall()
+        with self.active_lock:
+            active = set(self.active_threads)
+        candidates = [(thread_id, updated_at) for thread_id, updated_at in threads if thread_id not in active]
+        evicted = []
+        expiry = time.time() - self.ttl_seconds
+        for thread_id, updated_at in candidates:
+            if updated_at < expiry:
+                self.delete_thread(thread_id)
+                evicted.append(thread_id)
+        for thread_id, _ in candidates:
+            if thread_id in evicted:
+                continue
+            if self.stored_bytes() <= self.max_bytes:
+                break
+            self.delete_thread(thread_id)
+            evicted.append(thread_id)
+        if evicted:
+            with self.cursor() as cur:
+                cur.execute("PRAGMA incremental_vacuum").fetchall()
+            logger.info(f"Evicted {len(evicted)} checkpoint threads")
+        self.evicted_threads += len(evicted)
+        return evicted
+
+    def maintain(self, thread_id):
+        """Compaction of a finished thread followed by store-wide eviction."""
+        try:
+            self.compact(thread_id)
+            self.evict()
+        except Exception as e:
+            logger.error(f"Checkpoint maintenance failed: {str(e)}", exc_info=True)
+
+    def metrics(self):
+        with self.cursor(transaction=False) as cur:
+            threads = cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0]
+            checkpoints = cur.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        with self.active_lock:
+            active = len(self.active_threads)
+        return {
+            "backend": "sqlite",
+            "threads": threads,
+            "active_threads": active,
+            "checkpoints": checkpoints,
+            "stored_bytes": self.stored_bytes(),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "compacted_checkpoints": self.compacted_checkpoints,
+            "evicted_threads": self.evicted_threads,
+        }
+
+
+class SessionMemorySaver(MemorySaver):
+    """MemorySaver exposing the same maintenance hooks, for local runs without a disk store."""
+    @contextmanager
+    def active(self, thread_id):
+        yield
+
+    def maintain(self, thread_id):
+        pass
+
+    def metrics(self):
+        return {"backend": "memory", "threads": len(self.storage)}
+
+
+def create_checkpointer():
+    """
+    Build the checkpointer selected by CHECKPOINTER_BACKEND ('sqlite' by default, or 'memory').
+    """
+    backend = os.getenv("CHECKPOINTER_BACKEND", "sqlite")
+    if backend == "memory":
+        return SessionMemorySaver()
+    if backend != "sqlite":
+        raise ValueError(f"Unknown checkpointer backend: {backend}")
+    db_path = os.getenv("CHECKPOINT_DB_PATH", DEFAULT_DB_PATH)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    logger.info(f"Using SQLite checkpoint store at {db_path}")
+    return BoundedSqliteSaver(
+        conn,
+        ttl_seconds=int(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_bytes=int(os.getenv("CHECKPOINT_MAX_BYTES", str(512 * 1024 * 1024))),
+        keep_last=int(os.getenv("CHECKPOINT_KEEP_LAST", "1")),
+    )
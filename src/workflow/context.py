@@ -0,0 +1,181 @@
+import os
+import json
+import logging
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+STEP_RECORD = "step"
+ACTIONS_RECORD = "actions"
+# Tools whose output is a snapshot of lines of a file: a view is not worth resending once a later
+# view of the same file covers its lines.
+FILE_VIEW_TOOLS = ("view",)
+
+
+def estimate_tokens(text):
+    """Rough token count (4 characters per token), enough to budget prompts without a tokenizer."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def step_record(content):
+    return {"type": STEP_RECORD, "content": content}
+
+
+def actions_record(messages):
+    """Structured record of one executor run: AI turns with their tool calls, and tool results."""
+    entries = []
+    tool_calls_by_id = {}
+    for msg in messages:
+        if isinstance(msg, (HumanMessage, SystemMessage)):
+            continue
+        elif isinstance(msg, AIMessage):
+            tool_calls = getattr(msg, 'tool_calls', None) or []
+            for tool_call in tool_calls:
+                tool_calls_by_id[tool_call['id']] = tool_call
+            entries.append({"type": "ai", "content": msg.content, "tool_calls": tool_calls})
+        elif isinstance(msg, ToolMessage):
+            tool_call = tool_calls_by_id.get(msg.tool_call_id, {})
+            entries.append({
+                "type": "tool",
+                "content": str(msg.content),
+                "tool_call_id": msg.tool_call_id,
+                "name": tool_call.get('name'),
+                "args": tool_call.get('args', {}),
+            })
+    return {"type": ACTIONS_RECORD, "entries": entries}
+
+
+def render_entry(entry):
+    if entry["type"] == "ai":
+        text = f"AI: {entry['content']}"
+        if entry["tool_calls"]:
+            text += f"\n  Tool Calls: {entry['tool_calls']}"
+        return text
+    text = f"TOOL RESPONSE: {entry['content']}"
+    if entry["tool_call_id"]:
+        text += f"\n  Tool Call ID: {entry['tool_call_id']}"
+    return text
+
+
+def render_record(record):
+    """Verbatim rendering, identical to what preplanner/planner used to append to previous_steps_actions."""
+    if record["type"] == STEP_RECORD:
+        return f"STEP: \n{record['content']}"
+    return "\n---\n".join(["Executor Actions: \n"] + [render_entry(entry) for entry in record["entries"]])
+
+
+def file_view_range(entry):
+    """(file_path, starting_line, ending_line) of a file view, None for any other entry."""
+    if entry["type"] != "tool" or entry["name"] not in FILE_VIEW_TOOLS:
+        return None
+    args = entry["args"]
+    try:
+        return args["file_path"], int(args["starting_line"]), int(args["ending_line"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ContextCompactor():
+    """
+    Renders the step history sent to the planner and executor within token_budget.
+    The last keep_recent_steps steps are always verbatim. Older steps are compacted in order,
+    until the history fits:
+    1. tool calls are shortened to name(args) and views whose lines are viewed again later are dropped,
+    2. older tool outputs are cut to max_old_tool_chars,
+    3. older executor actions are elided entirely, oldest first, keeping the planner steps.
+    """
+    def __init__(self, token_budget=8000, keep_recent_steps=2, max_old_tool_chars=400):
+        self.token_budget = token_budget
+        self.keep_recent_steps = max(0, keep_recent_steps)
+        self.max_old_tool_chars = max_old_tool_chars
+
+    def _split(self, records):
+        """Index of the first record belonging to the recent steps."""
+        if self.keep_recent_steps == 0:
+            return len(records)
+        step_indexes = [i for i, record in enumerate(records) if record["type"] == STEP_RECORD]
+        if len(step_indexes) < self.keep_recent_steps:
+            return 0
+        return step_indexes[-self.keep_recent_steps]
+
+    def _compact_entry(self, entry, superseded, cut_outputs):
+        if entry["type"] == "ai":
+            text = f"AI: {entry['content']}"
+            if entry["tool_calls"]:
+                calls = ", ".join(
+                    f"{tool_call['name']}({json.dumps(tool_call['args'], default=str)})" for tool_call in entry["tool_calls"]
+                )
+                text += f"\n  Tool Calls: {calls}"
+            return text
+        if superseded:
+            file_path, starting_line, ending_line = file_view_range(entry)
+            return f"TOOL RESPONSE ({entry['name']}): [superseded by a later view of {file_path} lines {starting_line}-{ending_line}]"
+        content = entry["content"]
+        if cut_outputs and len(content) > self.max_old_tool_chars:
+            content = content[:self.max_old_tool_chars] + f" ... [{len(content) - self.max_old_tool_chars} characters elided]"
+        return f"TOOL RESPONSE ({entry['name']}): {content}"
+
+    def _render_compacted(self, record, superseded_ids, cut_outputs):
+        if record["type"] == STEP_RECORD:
+            return render_record(record)
+        lines = ["Executor Actions: \n"] + [
+            self._compact_entry(entry, id(entry) in superseded_ids, cut_outputs) for entry in record["entries"]
+        ]
+        return "\n---\n".join(lines)
+
+    def compact(self, records):
+        """Returns (history, original_tokens, compacted_tokens)."""
+        verbatim = [render_record(record) for record in records]
+        history = "\n".join(verbatim)
+        original_tokens = estimate_tokens(history)
+        if original_tokens <= self.token_budget:
+            return history, original_tokens, original_tokens
+
+        split = self._split(records)
+        # Views whose lines are all viewed again later (in any step) are stale.
+        superseded_ids = set()
+        later_views = {}
+        for index in range(len(records) - 1, -1, -1):
+            if records[index]["type"] != ACTIONS_RECORD:
+                continue
+            for entry in reversed(records[index]["entries"]):
+                view_range = file_view_range(entry)
+                if view_range is None:
+                    continue
+                file_path, starting_line, ending_line = view_range
+                ranges = later_views.setdefault(file_path, [])
+                if index < split and any(start <= starting_line and ending_line <= end for start, end in ranges):
+                    superseded_ids.add(id(entry))
+                ranges.append((starting_line, ending_line))
+
+        rendered = list(verbatim)
+        for cut_outputs in (False, True):
+            for index in range(split):
+                rendered[index] = self._render_compacted(records[index], superseded_ids, cut_outputs)
+            history = "\n".join(rendered)
+            if estimate_tokens(history) <= self.token_budget:
+                return history, original_tokens, estimate_tokens(history)
+
+        for index in range(split):
+            if records[index]["type"] != ACTIONS_RECORD:
+                continue
+            rendered[index] = f"Executor Actions: [{len(records[index]['entries'])} older actions elided]"
+            history = "\n".join(rendered)
+            if estimate_tokens(history) <= self.token_budget:
+                break
+        compacted_tokens = estimate_tokens(history)
+        if compacted_tokens > self.token_budget:
+            logger.warning(f"Step history still uses ~{compacted_tokens} tokens after compaction, over the {self.token_budget} budget")
+        return history, original_tokens, compacted_tokens
+
+
+def compactor_from_env():
+    return ContextCompactor(
+        token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000")),
+        keep_recent_steps=int(os.getenv("CONTEXT_KEEP_RECENT_STEPS", "2")),
+        max_old_tool_chars=int(os.getenv("CONTEXT_MAX_OLD_TOOL_CHARS", "400")),
+    )
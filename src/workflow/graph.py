@@ -1,16 +1,28 @@
 import sys
-from workflow.nodes import Nodes
+import asyncio
+import threading
+import contextlib
+from workflow.nodes import get_nodes
 from workflow.state import State
+from workflow.tool_runner import run_tool_calls, arun_tool_calls
+from workflow.checkpointer import create_checkpointer
+from utlis.memory_usage import RssSampler
 import requests
 from typing import Any
 import json
 from typing_extensions import Annotated
 from langgraph.graph import START,END,StateGraph
 from langgraph.prebuilt import ToolNode,tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.runnables import RunnableLambda
 import os
+import logging
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 
@@ -25,42 +37,22 @@ def custom_tool_node(state):
     if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
         return {}
     
-    # Execute each tool call
-    tool_messages = []
-    for tool_call in last_message.tool_calls:
-        tool_name = tool_call['name']
-        tool_args = tool_call['args']
-        
-        # Find the tool function
-        tool_func = None
-        for tool in Nodes().tools:
-            if tool.__name__ == tool_name:
-                tool_func = tool
-                break
-        
-        if tool_func:
-            try:
-                # Filter out 'state' from tool_args since it's injected automatically
-                filtered_args = {k: v for k, v in tool_args.items() if k != 'state'}
-                # Execute the tool with the state
-                result = tool_func(**filtered_args, state=state)
-                # Create a ToolMessage
-                tool_message = ToolMessage(
-                    content=str(result),
-                    tool_call_id=tool_call['id']
-                )
-                tool_messages.append(tool_message)
-            except Exception as e:
-                # Create an error ToolMessage
-                error_message = ToolMessage(
-                    content=f"Error executing {tool_name}: {str(e)}",
-                    tool_call_id=tool_call['id']
-                )
-                tool_messages.append(error_message)
-    
+    # Execute the tool calls, read-only ones concurrently
+    tool_messages = run_tool_calls(last_message.tool_calls, state)
+
     # Return the tool messages in executor_messages field
     return {"executor_messages": tool_messages,'messages_for_evaluation':tool_messages}
 
+async def acustom_tool_node(state):
+    """Async variant of custom_tool_node, used when the graph runs on the event loop."""
+    last_message = state['executor_messages'][-1]
+
+    if not hasattr(last_message, 'tool_calls') or not last_message.tool_calls:
+        return {}
+
+    tool_messages = await arun_tool_calls(last_message.tool_calls, state)
+    return {"executor_messages": tool_messages,'messages_for_evaluation':tool_messages}
+
 def tools_condition_executor(state):
     messages = state.get("executor_messages", [])
     if not messages:
@@ -71,44 +63,115 @@ def tools_condition_executor(state):
         return "tools"
     return "__end__"
 
+def sync_and_async(name, func, afunc):
+    """Node runnable that runs func under invoke/stream and afunc under ainvoke/astream."""
+    return RunnableLambda(func, afunc=afunc, name=name)
+
+def build_workflow(nodes, checkpointer):
+    workflow=StateGraph(State)
+    #NODES
+    # LLM and tool nodes have a coroutine variant so async runs never block the event loop.
+    workflow.add_node('initiate_state',nodes.initiate_state)
+    workflow.add_node('router',sync_and_async('router',nodes.router,nodes.arouter))
+    workflow.add_node('chatbot',sync_and_async('chatbot',nodes.chatbot,nodes.achatbot))
+    workflow.add_node('preplanner',nodes.preplanner)
+    workflow.add_node('planner',sync_and_async('planner',nodes.planner,nodes.aplanner))
+    workflow.add_node('executor',sync_and_async('executor',nodes.executor,nodes.aexecutor))
+    workflow.add_node('tools',sync_and_async('tools',custom_tool_node,acustom_tool_node))
+    workflow.add_node('summarizer',sync_and_async('summarizer',nodes.summarizer,nodes.asummarizer))
+    workflow.add_node('final_state',nodes.final_state)
+
+    #EDGES
+    workflow.add_edge(START,'initiate_state')
+    workflow.add_edge('initiate_state','router')
+    workflow.add_conditional_edges('router',nodes.route_decision,
+                                   {'planner':'planner','chatbot':"chatbot",'final_state':'final_state'})
+
+    workflow.add_edge('chatbot','final_state')
+    workflow.add_conditional_edges('planner',nodes.planner_decision,{'executor':'executor','__end__':"summarizer"})
+    workflow.add_conditional_edges('executor',tools_condition_executor,{'tools':'tools','__end__':"preplanner"})
+    workflow.add_edge('tools','executor')
+    workflow.add_edge('preplanner','planner')
+    workflow.add_edge('summarizer','final_state')
+
+    return workflow.compile(checkpointer=checkpointer)
+
+
+_compiled_workflow = None
+_compiled_workflow_lock = threading.Lock()
+
+def get_workflow():
+    """
+    Return the process-wide compiled graph. It is built once and shared by all sessions;
+    per-request state only lives in the checkpointer under the request thread_id.
+    """
+    global _compiled_workflow
+    if _compiled_workflow is None:
+        with _compiled_workflow_lock:
+            if _compiled_workflow is None:
+                _compiled_workflow = build_workflow(get_nodes(), create_checkpointer())
+    return _compiled_workflow
+
+
+def get_checkpointer():
+    return get_workflow().checkpointer
+
+
 class WorkFlow():
     def __init__(self,request):
-        nodes=Nodes()
-        self.workflow=StateGraph(State)
-        #NODES
-        self.workflow.add_node('initiate_state',nodes.initiate_state)
-        self.workflow.add_node('chatbot',nodes.chatbot)
-        self.workflow.add_node('preplanner',nodes.preplanner)
-        self.workflow.add_node('planner',nodes.planner)
-        self.workflow.add_node('executor',nodes.executor)
-        self.workflow.add_node('tools',custom_tool_node)
-        self.workflow.add_node('summarizer',nodes.summarizer)
-        self.workflow.add_node('final_state',nodes.final_state)
-
-        #EDGES
-        self.workflow.add_edge(START,'initiate_state')
-        self.workflow.add_conditional_edges('initiate_state',nodes.router,{'planner':'planner','chatbot':"chatbot"})
-
-        self.workflow.add_edge('chatbot','final_state')
-        self.workflow.add_conditional_edges('planner',nodes.planner_decision,{'executor':'executor','__end__':"summarizer"})
-        self.workflow.add_conditional_edges('executor',tools_condition_executor,{'tools':'tools','__end__':"preplanner"})
-        self.workflow.add_edge('tools','executor')
-        self.workflow.add_edge('preplanner','planner')
-        self.workflow.add_edge('summarizer','final_state')
-
-        memory=MemorySaver()
-        self.workflow = self.workflow.compile(checkpointer=memory)
+        self.workflow = get_workflow()
+        self.checkpointer = self.workflow.checkpointer
+        self.thread_id = request.session_id
         self.config={'configurable':{'thread_id':request.session_id},"recursion_limit": 25}
+        self.last_run_memory = None
+    def initial_input(self,request):
+        return {"query":request.query,
+                "codebase":request.codebase,
+                "session_id":request.session_id,
+                "githubapp_id":os.environ.get("GITHUBAPP_ID"),
+                "githubapp_privatekey":os.environ.get("GITHUBAPP_PRIVATE_KEY"),
+                "sa_key_bucket_link":request.sa_key_bucket_link,
+                "max_cycle_executor":2,
+                }
+    def _run(self,graph_input):
+        with self.checkpointer.active(self.thread_id), RssSampler() as sampler:
+            response=self.workflow.invoke(graph_input,self.config)
+        self._after_run(sampler)
+        return response
+    def _after_run(self,sampler):
+        self.last_run_memory = sampler.to_dict()
+        logger.info(f"Session {self.thread_id} memory: {self.last_run_memory}")
+        self.checkpointer.maintain(self.thread_id)
     def __call__(self,request):
-        response=self.workflow.invoke({"query":request.query,
-                                       "codebase":request.codebase,
-                                       "session_id":request.session_id,
-                                       "githubapp_id":os.environ.get("GITHUBAPP_ID"),
-                                       "githubapp_privatekey":os.environ.get("GITHUBAPP_PRIVATE_KEY"),
-                                       "sa_key_bucket_link":request.sa_key_bucket_link,
-                                       "max_cycle_executor":2,
-                                       },self.config)
+        return self._run(self.initial_input(request))
+    def can_resume(self):
+        """True when the session thread has a checkpoint with nodes left to run, e.g. after a restart."""
+        return bool(self.workflow.get_state(self.config).next)
+    def resume(self):
+        """Continue an interrupted run from its last checkpoint."""
+        return self._run(None)
+    def stream(self,request,stream_mode):
+        """Run the graph through LangGraph's streaming interface, yielding (mode, chunk) pairs."""
+        with self.checkpointer.active(self.thread_id), RssSampler() as sampler:
+            yield from self.workflow.stream(self.initial_input(request),self.config,stream_mode=stream_mode)
+        self._after_run(sampler)
+    async def _arun(self,graph_input):
+        with self.checkpointer.active(self.thread_id), RssSampler() as sampler:
+            response=await self.workflow.ainvoke(graph_input,self.config)
+        await asyncio.to_thread(self._after_run,sampler)
         return response
+    async def ainvoke(self,request):
+        """Async run on the event loop: LLM calls, subprocesses and GitHub requests are awaited."""
+        return await self._arun(self.initial_input(request))
+    async def aresume(self):
+        return await self._arun(None)
+    async def astream(self,request,stream_mode):
+        async with contextlib.AsyncExitStack() as stack:
+            stack.enter_context(self.checkpointer.active(self.thread_id))
+            sampler = stack.enter_context(RssSampler())
+            async for item in self.workflow.astream(self.initial_input(request),self.config,stream_mode=stream_mode):
+                yield item
+        await asyncio.to_thread(self._after_run,sampler)
     def start_specific_node(self,state,starting_node):        
         self.workflow.set_entry_point(starting_node)
         response=self.workflow.invoke(state)
@@ -0,0 +1,239 @@
+import os
+import time
+import uuid
+import queue
+import asyncio
+import threading
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue has no room for a new submission."""
+
+
+class Job():
+    def __init__(self, request, resume=False):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.resume = resume
+        self.status = JOB_QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        # Set by the runner once the workflow exists, used to read partial plans.
+        self.work_flow = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "session_id": self.request.session_id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "memory": self.work_flow.last_run_memory if self.work_flow is not None else None,
+        }
+
+
+class JobManager():
+    """
+    Bounded worker pool running chat workflows outside of the request thread.
+    Submissions beyond max_queue waiting jobs are rejected with JobQueueFull.
+    """
+    def __init__(self, runner, max_workers=4, max_queue=32, max_finished_jobs=1000):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self.finished_job_ids = []
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, request, resume=False):
+        job = Job(request, resume=resume)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+                self.rejected += 1
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+        with self.lock:
+            self.submitted += 1
+        logger.info(f"Job {job.id} queued for session {request.session_id}")
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "mode": "thread",
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queue_size(),
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+            }
+
+    def queue_size(self):
+        return self.queue.qsize()
+
+    def _worker_loop(self):
+        while True:
+            job = self.queue.get()
+            with self.lock:
+                self.in_flight += 1
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            logger.info(f"Job {job.id} started")
+            try:
+                job.result = self.runner(job)
+                job.status = JOB_SUCCEEDED
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+                job.status = JOB_FAILED
+            finally:
+                job.finished_at = time.time()
+                self._finish(job)
+                self.queue.task_done()
+
+    def _finish(self, job):
+        with self.lock:
+            self.in_flight -= 1
+            if job.status == JOB_SUCCEEDED:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            # Keep a bounded history of finished jobs so the store does not grow forever.
+            self.finished_job_ids.append(job.id)
+            while len(self.finished_job_ids) > self.max_finished_jobs:
+                self.jobs.pop(self.finished_job_ids.pop(0), None)
+
+
+class AsyncJobManager(JobManager):
+    """
+    Job manager running workflows as tasks on the server event loop instead of worker threads.
+    An idle session waiting on the LLM or a subprocess costs a coroutine rather than a thread,
+    so max_concurrency can be far higher than JobManager's max_workers.
+    submit() must be called from the event loop.
+    """
+    def __init__(self, runner, max_concurrency=32, max_queue=256, max_finished_jobs=1000):
+        self.runner = runner
+        self.max_workers = max_concurrency
+        self.max_queue = max_queue
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = {}
+        self.finished_job_ids = []
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.tasks = set()
+        self.semaphore = None
+
+    def submit(self, request, resume=False):
+        with self.lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise JobQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+            job = Job(request, resume=resume)
+            self.jobs[job.id] = job
+            self.waiting += 1
+            self.submitted += 1
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_workers)
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        # The loop only keeps weak references to tasks.
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        logger.info(f"Job {job.id} queued for session {request.session_id}")
+        return job
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics["mode"] = "async"
+        return metrics
+
+    def queue_size(self):
+        return self.waiting
+
+    async def _run(self, job):
+        async with self.semaphore:
+            with self.lock:
+                self.waiting -= 1
+                self.in_flight += 1
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            logger.info(f"Job {job.id} started")
+            try:
+                job.result = await self.runner(job)
+                job.status = JOB_SUCCEEDED
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+                job.error = str(e)
+                job.status = JOB_FAILED
+            finally:
+                job.finished_at = time.time()
+                self._finish(job)
+
+
+def job_manager_from_env(runner, arunner=None):
+    """
+    Build the job manager selected by JOB_EXECUTION_MODE: 'async' (default when an async
+    runner is given) runs jobs on the event loop, 'thread' on a pool of worker threads.
+    """
+    mode = os.getenv("JOB_EXECUTION_MODE", "async" if arunner is not None else "thread")
+    if mode == "async":
+        if arunner is None:
+            raise ValueError("JOB_EXECUTION_MODE=async needs an async runner")
+        return AsyncJobManager(
+            arunner,
+            max_concurrency=int(os.getenv("JOB_MAX_CONCURRENCY", "32")),
+            max_queue=int(os.getenv("JOB_MAX_QUEUE", "256")),
+            max_finished_jobs=int(os.getenv("JOB_MAX_FINISHED", "1000")),
+        )
+    if mode != "thread":
+        raise ValueError(f"Unknown job execution mode: {mode}")
+    return JobManager(
+        runner,
+        max_workers=int(os.getenv("JOB_MAX_WORKERS", "4")),
+        max_queue=int(os.getenv("JOB_MAX_QUEUE", "32")),
+        max_finished_jobs=int(os.getenv("JOB_MAX_FINISHED", "1000")),
+    )
@@ -1,18 +1,15 @@
 import sys
-from tools.edit_tool import edit
-from tools.pr_tool import create_pull_request
-from tools.view_tool import view
-from tools.search_tool import search
-from tools.gcloud_command_tool import run_gcloud_command
-from tools.terraform_tool import terraform_command_executor
-from tools.create_file_tool import create_file
-from tools.list_directory_contents_tool import list_directory_contents
-from tools.clone_repository_tool import clone_repository
-from tools.retrieve_log_tool import retrieve_logs
+from tools.registry import TOOLS, TOOL_NAMES
 from utlis.gcp.get_sakey import download_save_sakey
+from utlis.workspace_gc import get_workspace_reaper
+from prompts.prompts import load_prompt
+from workflow.context import compactor_from_env, actions_record, step_record
+from workflow.routing import preclassify, parse_routed_answer, ROUTE_CODE
 import re
-from llm_factory.google import GoogleGen
+from llm_factory.factory import get_node_llm
 from langchain_core.messages import AIMessage,HumanMessage,SystemMessage,ToolMessage,RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.config import get_stream_writer
 import time
 import subprocess
 import os
@@ -20,7 +17,7 @@ from pathlib import Path
 import shutil
 import json
 import  logging
-from jinja2 import Environment, FileSystemLoader
+import threading
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,63 +26,117 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-def load_prompt(template_name, **kwargs):
-    env = Environment(loader=FileSystemLoader(os.path.join(current_dir, '..', 'prompts', 'templates')))
-    template = env.get_template(template_name)
-    return template.render(**kwargs)
+def usage_update(state, response):
+    """
+    State update accumulating the token usage and rate limiter wait of an LLM response.
+    Responses served from the LLM cache were not billed: their usage goes to the cached_* counters.
+    """
+    if response.response_metadata.get("cached"):
+        return {"cached_input_tokens":response.usage_metadata["input_tokens"]+state.get('cached_input_tokens',0),
+                "cached_output_tokens":response.usage_metadata["output_tokens"]+state.get('cached_output_tokens',0)}
+    return {"input_tokens":response.usage_metadata["input_tokens"]+state.get('input_tokens',0),
+            "output_tokens":response.usage_metadata["output_tokens"]+state.get('output_tokens',0),
+            "rate_limit_wait_seconds":response.response_metadata.get("rate_limit_wait_seconds",0)+state.get('rate_limit_wait_seconds',0)}
 
 
 class Nodes():
     def __init__(self):
-        self.llm_obj=GoogleGen()
-        self.tools=[edit,
-        create_pull_request,
-        view,
-        search,
-        terraform_command_executor,
-        create_file,
-        list_directory_contents,
-        clone_repository,
-        retrieve_logs,
-        run_gcloud_command]
-        self.tool_names=[func.__name__ for func in self.tools]
-        self.llm_obj.llm_with_tools=self.llm_obj.llm.bind_tools(self.tools)
+        # One LLM per node, as assigned in llm_factory/llm_config.py NODE_MODELS.
+        self.llms={node:get_node_llm(node) for node in ("router","chatbot","planner","executor","summarizer")}
+        self.tools=TOOLS
+        self.tool_names=TOOL_NAMES
+        self.llms["executor"].bind_tools(self.tools)
+        self.compactor=compactor_from_env()
     def initiate_state(self,state):
         logger.info('entering initial state')
         ## save sa_key
         # download_save_sakey(state["sa_key_bucket_link"],session_id=state["session_id"])
-        return {}
+        # The graph and its checkpointer are shared by all requests, so a session's thread
+        # still holds the previous run: reset everything that belongs to a single run.
+        return {"executor_messages":[RemoveMessage(id=REMOVE_ALL_MESSAGES)],
+                "messages_for_evaluation":[RemoveMessage(id=REMOVE_ALL_MESSAGES)],
+                "plans":[],
+                "previous_steps_actions":[],
+                "step_records":[],
+                "saved_input_tokens":0,
+                "context_savings":[],
+                "route":"",
+                "current_step":"",
+                "current_cycle":0,
+                "agent_response":"",
+                "input_tokens":0,
+                "output_tokens":0,
+                "cached_input_tokens":0,
+                "cached_output_tokens":0,
+                "rate_limit_wait_seconds":0}
+    def _router_messages(self, state):
+        # One call both classifies the query and, for chat, answers it.
+        system_prompt= load_prompt("router_chat_prompt.jinja")
+        return [SystemMessage(content=system_prompt),
+                HumanMessage(content=f"User Query: {state['query']}\n")]
+    def _emit_route(self, route, source):
+        logger.info(f"Router decision: {route} ({source})")
+        # Forwarded to /chat/stream clients, a no-op when the graph is not streamed.
+        get_stream_writer()({"event":"router","decision":route,"source":source})
+    def _preroute(self, state):
+        """State update when the local rules can route the query without an LLM call, else None."""
+        route = preclassify(state['query'])
+        if route is None:
+            return None
+        self._emit_route(route, "rules")
+        return {"route": "planner" if route == ROUTE_CODE else "chatbot"}
+    def _router_update(self, state, response):
+        route, answer = parse_routed_answer(response.content)
+        if route is None:
+            # Not a routed answer: never shown to the user, the planner takes the query.
+            logger.warning("Router response without a route line, routing to the planner")
+            route = ROUTE_CODE
+            self._emit_route(route, "llm-unparsed")
+        else:
+            self._emit_route(route, "llm")
+        if route == ROUTE_CODE:
+            return {"route": "planner", **usage_update(state, response)}
+        return {"route": "final_state",
+                "agent_response": answer,
+                **usage_update(state, response)}
     def router(self, state):
         """
-        LLM-based router node that decides whether to send the query to the planner or to a simple chatbot.
+        Router node. Obvious greetings and code tasks are routed by local rules; other queries get a
+        single LLM call that answers chat queries directly and hands code queries to the planner.
         """
         logger.info('entering router node')
-        # You can use a simple prompt to classify the query
-        # Load the system prompt template
-
-        system_prompt= load_prompt("router_prompt.jinja")
-        messages = [SystemMessage(content=system_prompt),
-                    HumanMessage(content=f"User Query: {state['query']}\n")]
-        response = self.llm_obj.llm.invoke(messages)
-        decision = response.content.strip().lower()
-        logger.info(f"Router decision: {decision}")
-        if decision == "code":
-            return "planner"
-        else:
-            return "chatbot"
+        update = self._preroute(state)
+        if update is not None:
+            return update
+        response = self.llms["router"](self._router_messages(state), node="router")
+        return self._router_update(state, response)
+    async def arouter(self, state):
+        logger.info('entering router node')
+        update = self._preroute(state)
+        if update is not None:
+            return update
+        response = await self.llms["router"].ainvoke(self.llms["router"].llm, self._router_messages(state), node="router")
+        return self._router_update(state, response)
+    def route_decision(self, state):
+        return state["route"]
 
+    def _chatbot_messages(self, state):
+        system_prompt= load_prompt("chatbot_prompt.jinja")
+        return [SystemMessage(content=system_prompt),
+                HumanMessage(content=f"User Query: {state['query']}\n")]
     def chatbot(self, state):
         """
         Simple chatbot node for general conversation.
         """
         logger.info('entering chatbot node')
-        system_prompt= load_prompt("chatbot_prompt.jinja")
-        messages = [SystemMessage(content=system_prompt),
-                    HumanMessage(content=f"User Query: {state['query']}\n")]
-        response = self.llm_obj.llm.invoke(messages)
+        response = self.llms["chatbot"](self._chatbot_messages(state), node="chatbot")
         return {"agent_response": response.content,
-                "input_tokens":response.usage_metadata["input_tokens"]+state.get('input_tokens',0),
-                "output_tokens":response.usage_metadata["output_tokens"]+state.get('output_tokens',0)}
+                **usage_update(state, response)}
+    async def achatbot(self, state):
+        logger.info('entering chatbot node')
+        response = await self.llms["chatbot"].ainvoke(self.llms["chatbot"].llm, self._chatbot_messages(state), node="chatbot")
+        return {"agent_response": response.content,
+                **usage_update(state, response)}
     def preplanner(self,state):
         trajectory = ["Executor Actions: \n"]
         for msg in state['executor_messages']:
@@ -104,36 +155,39 @@ class Nodes():
                 if tool_call_id:
                     entry += f"\n  Tool Call ID: {tool_call_id}"
                 trajectory.append(entry)
-        return {"previous_steps_actions":state["previous_steps_actions"]+["\n---\n".join(trajectory)]}
-    def planner(self, state):
-        """
-        Planner node that analyzes the query and creates a plan for execution.
-        Uses the LLM to generate a step-by-step plan based on the user query.
-        """
-        logger.info('entering planner state')
+        return {"previous_steps_actions":state["previous_steps_actions"]+["\n---\n".join(trajectory)],
+                "step_records":state.get("step_records",[])+[actions_record(state['executor_messages'])]}
+    def _history(self, state):
+        """Step history for the planner and executor prompts, compacted to the context token budget."""
+        if not state.get("step_records"):
+            return "\n".join(state.get('previous_steps_actions',[" "])), 0, 0
+        return self.compactor.compact(state["step_records"])
+    def _planner_messages(self, state):
         ### PLANNER
         # Load the system prompt template
+        history, _, _ = self._history(state)
         system_prompt= load_prompt("planner_prompt.jinja",
-            codebase=state['codebase'],
-            previous_steps_actions="\n".join(state.get('previous_steps_actions',[" "])),
-            tool_names=self.tool_names)
+            static={"codebase":state['codebase'],"tool_names":self.tool_names},
+            previous_steps_actions=history)
         # Create messages for the planner
-        messages = [
+        return [
             SystemMessage(content=system_prompt),
             HumanMessage(content=f"User Query: {state['query']}\n")
         ]
-        
-        # Get response from LLM
-        response = self.llm_obj.llm.invoke(messages)
+    def _planner_update(self, state, response):
         logger.info(f"CURRENT TASK\n {response.content}\n\n")
 
         ### EXECUTOR
         # Load the system prompt template
+        history, original_tokens, compacted_tokens = self._history(state)
         system_prompt= load_prompt("executor_prompt.jinja",
-            codebase=state['codebase'],
-            tool_names=self.tool_names,
-            previous_steps_actions="\n".join(state.get('previous_steps_actions',[" "])),
+            static={"codebase":state['codebase'],"tool_names":self.tool_names},
+            previous_steps_actions=history,
             current_step=response.content)
+        # The same history went into the planner prompt and goes into the executor prompt.
+        saved_tokens = 2 * (original_tokens - compacted_tokens)
+        if saved_tokens:
+            logger.info(f"Context compaction: history {original_tokens} -> {compacted_tokens} tokens")
         # logger.info(f"Executor SYSTEM PROMPT\n {system_prompt}\n\n")
         executor_messages= [
             SystemMessage(content=system_prompt),
@@ -143,17 +197,31 @@ class Nodes():
         
         return {"executor_messages": clear_messages + executor_messages,
                 "previous_steps_actions":state.get('previous_steps_actions',[])+[f"STEP: \n{response.content}"],
+                "step_records":state.get('step_records',[])+[step_record(response.content)],
+                "saved_input_tokens":state.get('saved_input_tokens',0)+saved_tokens,
+                "context_savings":state.get('context_savings',[])+[{"history_tokens":original_tokens,
+                                                                     "compacted_tokens":compacted_tokens,
+                                                                     "saved_input_tokens":saved_tokens}],
                 "current_step":response.content,
                 "plans":state.get('plans',[])+[response.content],
                 "current_cycle":0,
-                "input_tokens":response.usage_metadata["input_tokens"]+state.get('input_tokens',0),
-                "output_tokens":response.usage_metadata["output_tokens"]+state.get('output_tokens',0)}
-    
-    def executor(self, state):
+                **usage_update(state, response)}
+    def planner(self, state):
         """
-        Executor node that takes the plan and executes the necessary tools.
-        Uses the LLM with tools to execute the planned actions.
+        Planner node that analyzes the query and creates a plan for execution.
+        Uses the LLM to generate a step-by-step plan based on the user query.
         """
+        logger.info('entering planner state')
+        # Get response from LLM
+        response = self.llms["planner"](self._planner_messages(state), node="planner")
+        return self._planner_update(state, response)
+    async def aplanner(self, state):
+        logger.info('entering planner state')
+        response = await self.llms["planner"].ainvoke(self.llms["planner"].llm, self._planner_messages(state), node="planner")
+        return self._planner_update(state, response)
+
+    def _executor_precheck(self, state):
+        """Logs the executor input and returns the update to use when no LLM call must be made."""
         logger.info('entering executor state')
         logger.info(f'{len(state["executor_messages"])}')
         logger.info(f'{len(state["messages_for_evaluation"])}')
@@ -163,24 +231,38 @@ class Nodes():
         if isinstance(state['executor_messages'][-1], ToolMessage):
             logger.info(f"TOOL RESPONSE: {state['executor_messages'][-1].content}")
         if state["current_cycle"]<state["max_cycle_executor"]:
-            response=[self.llm_obj.llm_with_tools.invoke(state['executor_messages'])]
-        else:
-            response=[AIMessage(content="Alright, What do you think?")]
-            return {"executor_messages":response,"messages_for_evaluation":response,"current_cycle":state['current_cycle']+1}
+            return None
+        response=[AIMessage(content="Alright, What do you think?")]
+        return {"executor_messages":response,"messages_for_evaluation":response,"current_cycle":state['current_cycle']+1}
+    def _executor_update(self, state, response):
+        response=[response]
         logger.info(f'executor agent thought: {response[0].content}\n')
         logger.info(f'executor agent call tools: {response[0].additional_kwargs}\n\n') 
         if len(state['executor_messages'])>2 and state['executor_messages'][-2].additional_kwargs==response[0].additional_kwargs:
             logger.info(f'Same call tool!')
             response=[AIMessage(content="Alright, What do you think?")]
             return {"executor_messages":response,"messages_for_evaluation":response,"current_cycle":state['current_cycle']+1}
-        logger.info('Agent sleeping')
-        time.sleep(10)
-        logger.info('Wake up')
+        logger.info(f"Rate limit wait: {response[0].response_metadata.get('rate_limit_wait_seconds',0):.2f}s")
         return {"executor_messages":response,
                 "messages_for_evaluation":response,
                 "current_cycle":state['current_cycle']+1,
-                "input_tokens":response[0].usage_metadata["input_tokens"]+state.get('input_tokens',0),
-                "output_tokens":response[0].usage_metadata["output_tokens"]+state.get('output_tokens',0)}
+                **usage_update(state, response[0])}
+    def executor(self, state):
+        """
+        Executor node that takes the plan and executes the necessary tools.
+        Uses the LLM with tools to execute the planned actions.
+        """
+        update = self._executor_precheck(state)
+        if update is not None:
+            return update
+        response = self.llms["executor"].invoke(self.llms["executor"].llm_with_tools, state['executor_messages'], node="executor")
+        return self._executor_update(state, response)
+    async def aexecutor(self, state):
+        update = self._executor_precheck(state)
+        if update is not None:
+            return update
+        response = await self.llms["executor"].ainvoke(self.llms["executor"].llm_with_tools, state['executor_messages'], node="executor")
+        return self._executor_update(state, response)
     
     
 
@@ -200,21 +282,40 @@ class Nodes():
             return '__end__'
 
         return "executor"
+    def _summarizer_messages(self, state):
+        system_prompt= load_prompt("summarizer_prompt.jinja",user_query=state['query'])
+        return [SystemMessage(content=system_prompt),
+                HumanMessage(content=f"Planner Actions and Decisions:\n{state.get('previous_steps_actions', '')}\n")] 
     def summarizer(self, state):
         """
         Summarizer node that provides a user-friendly summary of what the planner did.
         """
         logger.info('entering summarizer node')
-        system_prompt= load_prompt("summarizer_prompt.jinja",user_query=state['query'])
-        messages = [SystemMessage(content=system_prompt),
-                    HumanMessage(content=f"Planner Actions and Decisions:\n{state.get('previous_steps_actions', '')}\n")] 
-        response = self.llm_obj.llm.invoke(messages)
+        response = self.llms["summarizer"](self._summarizer_messages(state), node="summarizer")
         return {"agent_response": response.content,
-                "input_tokens":response.usage_metadata["input_tokens"]+state.get('input_tokens',0),
-                "output_tokens":response.usage_metadata["output_tokens"]+state.get('output_tokens',0)}
+                **usage_update(state, response)}
+    async def asummarizer(self, state):
+        logger.info('entering summarizer node')
+        response = await self.llms["summarizer"].ainvoke(self.llms["summarizer"].llm, self._summarizer_messages(state), node="summarizer")
+        return {"agent_response": response.content,
+                **usage_update(state, response)}
     
     def final_state(self,state):
         # USED to clean cache if ANY
         logger.info('entering final state')
+        # The workspace itself is reclaimed later by the reaper, least recently used first.
+        get_workspace_reaper().touch(state['session_id'])
         # Upload the current session box into bucket
-        return {}
\ No newline at end of file
+        return {}
+
+_nodes = None
+_nodes_lock = threading.Lock()
+
+def get_nodes():
+    """Return the process-wide Nodes instance, so LLM clients and bound tools are built once."""
+    global _nodes
+    if _nodes is None:
+        with _nodes_lock:
+            if _nodes is None:
+                _nodes = Nodes()
+    return _nodes
@@ -0,0 +1,79 @@
+import re
+
+ROUTE_CHAT = "chat"
+ROUTE_CODE = "code"
+
+# Whole-query small talk: answered by the chatbot without asking the LLM to classify it.
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|hiya|yo|howdy|greetings|thanks|thank you|thx|ok|okay|bye|goodbye"
+    r"|good (morning|afternoon|evening)|how are you|who are you|what can you do)"
+    r"( there| agent| bot)?\s*[!.?]*\s*$",
+    re.IGNORECASE,
+)
+# A request starting with an action verb applied to something the agent works on, e.g. "fix the
+# bucket module", "can you open a PR". Questions such as "how do I create a bucket?" do not match.
+CODE_ACTION_PATTERN = re.compile(
+    r"^\s*(please\s+|(can|could|would) you\s+(please\s+)?|i need you to\s+|help me\s+)?"
+    r"(create|add|fix|update|modify|change|edit|deploy|delete|remove|refactor|clone|open|run|apply"
+    r"|migrate|upgrade|bump|rename|write|implement|provision|configure|enable|disable|investigate|debug|check)\b"
+    r".{0,80}?"
+    r"\b(terraform|gcloud|repo|repository|pull request|pr|branch|file|module|resource|bucket|cluster|vm|instance"
+    r"|service account|iam|firewall|network|vpc|pipeline|workflow|dockerfile|helm|code|codebase)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+# Explicit references to files or repositories always need the planner.
+CODE_REFERENCE_PATTERN = re.compile(
+    r"(https?://(www\.)?github\.com/\S+|\b[\w./-]+\.(tf|tfvars|ya?ml|json|py|sh|hcl)\b|\bterraform (plan|init|validate|import)\b)",
+    re.IGNORECASE,
+)
+ROUTE_LINE_PATTERN = re.compile(r"^\s*\**\s*ROUTE\s*:\s*\**\s*(chat|code)\b\**\s*$", re.IGNORECASE)
+
+
+def preclassify(query):
+    """Local routing rules. Returns ROUTE_CHAT, ROUTE_CODE, or None when the LLM has to decide."""
+    if GREETING_PATTERN.match(query):
+        return ROUTE_CHAT
+    if CODE_REFERENCE_PATTERN.search(query) or CODE_ACTION_PATTERN.match(query):
+        return ROUTE_CODE
+    return None
+
+
+def parse_routed_answer(content):
+    """
+    Split a router+chat response into (route, answer). The first line carries the route,
+    the rest is the answer to the user when the route is chat. A response without a route
+    line gives (None, ''): it cannot be trusted as an answer, the caller hands it to the planner.
+    """
+    first_line, _, rest = content.strip().partition("\n")
+    match = ROUTE_LINE_PATTERN.match(first_line)
+    if match is None:
+        return None, ""
+    route = match.group(1).lower()
+    return route, rest.strip() if route == ROUTE_CHAT else ""
+
+
+class RoutedAnswerStream():
+    """
+    Filters the streamed tokens of a router+chat response: nothing is let through until the
+    first line is complete, then the rest of a chat answer is, while the route line itself,
+    code routes and responses without a route line are suppressed.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.route = None
+        self.decided = False
+
+    def feed(self, text):
+        """The part of text to show to the user, '' if none."""
+        if self.decided:
+            return text if self.route == ROUTE_CHAT else ""
+        self.buffer += text
+        stripped = self.buffer.lstrip()
+        if "\n" not in stripped:
+            return ""
+        first_line, _, rest = stripped.partition("\n")
+        match = ROUTE_LINE_PATTERN.match(first_line)
+        self.decided = True
+        self.route = match.group(1).lower() if match else None
+        self.buffer = ""
+        return rest.lstrip("\n") if self.route == ROUTE_CHAT else ""
@@ -10,13 +10,20 @@ class State(TypedDict):
     githubapp_id: str
     githubapp_privatekey: str
     sa_key_bucket_link: dict
+    route: str
     current_step: str
     plans: list
     previous_steps_actions: list
+    step_records: list
     current_cycle: int
     max_cycle_executor: int
     agent_response: str
     input_tokens: int
     output_tokens: int
+    saved_input_tokens: int
+    cached_input_tokens: int
+    cached_output_tokens: int
+    context_savings: list
+    rate_limit_wait_seconds: float
     executor_messages: Annotated[list,add_messages]
     messages_for_evaluation: Annotated[list,add_messages]
\ No newline at end of file
@@ -0,0 +1,98 @@
+import json
+import logging
+from langchain_core.messages import AIMessage, ToolMessage
+from workflow.routing import RoutedAnswerStream
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Nodes whose LLM tokens are forwarded to the client as they are generated.
+TOKEN_STREAMING_NODES = ("chatbot", "summarizer")
+MAX_TOOL_RESULT_CHARS = 2000
+
+
+def format_sse(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def truncate(text, limit=MAX_TOOL_RESULT_CHARS):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"\n... [truncated {len(text) - limit} characters]"
+
+
+def node_update_events(node, update):
+    """Translate one node update into (event, data) pairs."""
+    if node == "planner":
+        yield "plan_step", {"step": update.get("current_step", "")}
+    elif node == "executor":
+        for message in update.get("executor_messages", []):
+            if not isinstance(message, AIMessage):
+                continue
+            if message.tool_calls:
+                for tool_call in message.tool_calls:
+                    yield "tool_call", {"id": tool_call["id"], "name": tool_call["name"], "args": tool_call["args"]}
+            elif message.content:
+                yield "executor_message", {"content": message.content}
+    elif node == "tools":
+        for message in update.get("executor_messages", []):
+            if isinstance(message, ToolMessage):
+                yield "tool_result", {"tool_call_id": message.tool_call_id, "content": truncate(message.content)}
+    elif node == "router":
+        # A chat query answered by the router call itself (its tokens were streamed without the route line).
+        if update.get("agent_response"):
+            yield "node_complete", {"node": node, "agent_response": update["agent_response"]}
+    elif node in TOKEN_STREAMING_NODES:
+        yield "node_complete", {"node": node, "agent_response": update.get("agent_response", "")}
+    else:
+        yield "node_complete", {"node": node}
+
+
+STREAM_MODES = ["updates", "messages", "custom"]
+
+
+def chunk_events(mode, chunk, router_stream=None):
+    """
+    Translate one (mode, chunk) pair of the LangGraph stream into (event, data) pairs.
+    router_stream is the RoutedAnswerStream of the run, filtering the router's tokens.
+    """
+    if mode == "custom":
+        yield chunk.get("event", "custom"), chunk
+    elif mode == "messages":
+        message, metadata = chunk
+        node = metadata.get("langgraph_node")
+        if node in TOKEN_STREAMING_NODES and message.content:
+            yield "token", {"node": node, "content": message.content}
+        elif node == "router" and router_stream is not None and isinstance(message.content, str) and message.content:
+            content = router_stream.feed(message.content)
+            if content:
+                yield "token", {"node": node, "content": content}
+    elif mode == "updates":
+        for node, update in chunk.items():
+            if not update:
+                continue
+            logger.info(f"streaming update from node {node}")
+            yield from node_update_events(node, update)
+
+
+def stream_workflow_events(work_flow, request):
+    """
+    Run the workflow in streaming mode and yield (event, data) pairs: router decision and
+    node updates as each node finishes, and LLM tokens for the user-facing nodes.
+    """
+    router_stream = RoutedAnswerStream()
+    for mode, chunk in work_flow.stream(request, stream_mode=STREAM_MODES):
+        yield from chunk_events(mode, chunk, router_stream)
+
+
+async def astream_workflow_events(work_flow, request):
+    """Async variant of stream_workflow_events, running the graph on the event loop."""
+    router_stream = RoutedAnswerStream()
+    async for mode, chunk in work_flow.astream(request, stream_mode=STREAM_MODES):
+        for event, data in chunk_events(mode, chunk, router_stream):
+            yield event, data
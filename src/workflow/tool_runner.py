@@ -0,0 +1,245 @@
+import os
+import asyncio
+import threading
+import logging
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.messages import ToolMessage
+from tools.registry import get_tool, get_async_tool, is_read_only, repository_of, serialization_key, cache_path, invalidated_path
+from tools.tool_cache import get_tool_cache
+from tools.code_index import update_code_index
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Shared by all sessions, bounds the number of tool calls running at once in the process.
+tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")), thread_name_prefix="tool")
+
+_repository_locks = {}
+_repository_locks_lock = threading.Lock()
+# asyncio locks for the async workflow, which runs on a single event loop.
+_async_repository_locks = {}
+
+
+def repository_lock(session_id, repository):
+    key = (session_id, repository)
+    with _repository_locks_lock:
+        if key not in _repository_locks:
+            _repository_locks[key] = threading.Lock()
+        return _repository_locks[key]
+
+
+def async_repository_lock(session_id, repository):
+    key = (session_id, repository)
+    with _repository_locks_lock:
+        if key not in _async_repository_locks:
+            _async_repository_locks[key] = asyncio.Lock()
+        return _async_repository_locks[key]
+
+
+def drop_session_locks(session_id):
+    """Workspace eviction hook: forget the repository locks of an evicted session."""
+    with _repository_locks_lock:
+        for locks in (_repository_locks, _async_repository_locks):
+            for key in [key for key in locks if key[0] == session_id]:
+                del locks[key]
+
+
+def call_lock(tool_call, state):
+    """Lock of the calls the tool call must not run concurrently with (see serialized_by), a no-op if none."""
+    key = serialization_key(tool_call['name'], tool_call['args'])
+    return repository_lock(state.get('session_id'), key) if key is not None else nullcontext()
+
+
+def async_call_lock(tool_call, state):
+    key = serialization_key(tool_call['name'], tool_call['args'])
+    return async_repository_lock(state.get('session_id'), key) if key is not None else nullcontext()
+
+
+def cache_lookup(tool_call, state):
+    """
+    Look a read-only call up in the session's tool result cache. Returns (path, generation,
+    message): message is the ToolMessage of a hit, path is None when the call is not cached.
+    """
+    cache = get_tool_cache()
+    path = cache_path(tool_call['name'], tool_call['args']) if cache is not None else None
+    if path is None:
+        return None, None, None
+    session_id = state.get('session_id')
+    generation = cache.generation(session_id)
+    content = cache.get(session_id, tool_call['name'], tool_call['args'])
+    if content is None:
+        return path, generation, None
+    logger.info(f"Tool cache hit for {tool_call['name']}")
+    return path, generation, ToolMessage(content=content, tool_call_id=tool_call['id'])
+
+
+def cache_store(tool_call, state, path, generation, content):
+    if path is not None:
+        get_tool_cache().put(state.get('session_id'), tool_call['name'], tool_call['args'], path, content, generation)
+
+
+def track_write(tool_call, state):
+    """
+    Drop the cached results a mutating call may have made stale and bring the session code
+    index up to date with what it wrote, whether or not it succeeded.
+    """
+    path = invalidated_path(tool_call['name'], tool_call['args'])
+    if path is None:
+        return
+    cache = get_tool_cache()
+    if cache is not None:
+        cache.invalidate(state.get('session_id'), path)
+    try:
+        update_code_index(state.get('session_id'), path)
+    except Exception as e:
+        logger.error(f"Code index update failed for '{path}': {str(e)}", exc_info=True)
+
+
+def run_tool_call(tool_call, state):
+    """
+    Execute one tool call and wrap its result (or error) in a ToolMessage. Unknown tools return None.
+    Cacheable calls already answered in the session are served from the tool result cache.
+    """
+    tool_name = tool_call['name']
+    tool_args = tool_call['args']
+
+    # Find the tool function
+    tool_func = get_tool(tool_name)
+    if not tool_func:
+        return None
+    path, generation, cached = cache_lookup(tool_call, state)
+    if cached is not None:
+        return cached
+    try:
+        # Filter out 'state' from tool_args since it's injected automatically
+        filtered_args = {k: v for k, v in tool_args.items() if k != 'state'}
+        # Execute the tool with the state
+        with call_lock(tool_call, state):
+            result = tool_func(**filtered_args, state=state)
+        content = str(result)
+        cache_store(tool_call, state, path, generation, content)
+        # Create a ToolMessage
+        return ToolMessage(
+            content=content,
+            tool_call_id=tool_call['id']
+        )
+    except Exception as e:
+        # Create an error ToolMessage
+        return ToolMessage(
+            content=f"Error executing {tool_name}: {str(e)}",
+            tool_call_id=tool_call['id']
+        )
+    finally:
+        track_write(tool_call, state)
+
+
+def plan_phases(tool_calls):
+    """
+    Split tool calls into consecutive phases of read-only calls and of mutating calls, so that
+    the order between reads and writes asked by the LLM is kept. Returns (read_only, indexes) pairs.
+    """
+    phases = []
+    for index, tool_call in enumerate(tool_calls):
+        read_only = is_read_only(tool_call['name'], tool_call['args'])
+        if phases and phases[-1][0] == read_only:
+            phases[-1][1].append(index)
+        else:
+            phases.append((read_only, [index]))
+    return phases
+
+
+def run_repository_lane(tool_calls, state, repository):
+    """Run the mutating calls of one repository in order, holding the repository lock."""
+    with repository_lock(state.get('session_id'), repository):
+        return [run_tool_call(tool_call, state) for tool_call in tool_calls]
+
+
+def run_tool_calls(tool_calls, state):
+    """
+    Run the tool calls of one AIMessage. Read-only calls of a phase run concurrently on the
+    shared pool; mutating calls run concurrently across repositories but one at a time per
+    repository. ToolMessages are returned in the order of the tool calls.
+    """
+    results = [None] * len(tool_calls)
+    for read_only, indexes in plan_phases(tool_calls):
+        if len(indexes) == 1 and read_only:
+            results[indexes[0]] = run_tool_call(tool_calls[indexes[0]], state)
+        elif read_only:
+            futures = {index: tool_pool.submit(run_tool_call, tool_calls[index], state) for index in indexes}
+            for index, future in futures.items():
+                results[index] = future.result()
+        else:
+            lanes = {}
+            for index in indexes:
+                tool_call = tool_calls[index]
+                lanes.setdefault(repository_of(tool_call['name'], tool_call['args']), []).append(index)
+            futures = {
+                repository: tool_pool.submit(run_repository_lane, [tool_calls[i] for i in lane], state, repository)
+                for repository, lane in lanes.items()
+            }
+            for repository, future in futures.items():
+                for index, message in zip(lanes[repository], future.result()):
+                    results[index] = message
+        logger.info(f"Ran {len(indexes)} {'read-only' if read_only else 'mutating'} tool calls")
+    return [message for message in results if message is not None]
+
+
+async def arun_tool_call(tool_call, state):
+    """Async variant of run_tool_call: coroutine tools are awaited, the others run on the shared pool."""
+    tool_afunc = get_async_tool(tool_call['name'])
+    if tool_afunc is None:
+        return await asyncio.get_running_loop().run_in_executor(tool_pool, run_tool_call, tool_call, state)
+    path, generation, cached = cache_lookup(tool_call, state)
+    if cached is not None:
+        return cached
+    try:
+        filtered_args = {k: v for k, v in tool_call['args'].items() if k != 'state'}
+        async with async_call_lock(tool_call, state):
+            result = await tool_afunc(**filtered_args, state=state)
+        content = str(result)
+        cache_store(tool_call, state, path, generation, content)
+        return ToolMessage(
+            content=content,
+            tool_call_id=tool_call['id']
+        )
+    except Exception as e:
+        return ToolMessage(
+            content=f"Error executing {tool_call['name']}: {str(e)}",
+            tool_call_id=tool_call['id']
+        )
+    finally:
+        # The code index refresh walks the written tree and may wait for a rebuild: off the event loop.
+        await asyncio.to_thread(track_write, tool_call, state)
+
+
+async def arun_repository_lane(tool_calls, state, repository):
+    async with async_repository_lock(state.get('session_id'), repository):
+        return [await arun_tool_call(tool_call, state) for tool_call in tool_calls]
+
+
+async def arun_tool_calls(tool_calls, state):
+    """Async variant of run_tool_calls with the same phases, concurrency and ordering rules."""
+    results = [None] * len(tool_calls)
+    for read_only, indexes in plan_phases(tool_calls):
+        if read_only:
+            messages = await asyncio.gather(*(arun_tool_call(tool_calls[index], state) for index in indexes))
+            for index, message in zip(indexes, messages):
+                results[index] = message
+        else:
+            lanes = {}
+            for index in indexes:
+                tool_call = tool_calls[index]
+                lanes.setdefault(repository_of(tool_call['name'], tool_call['args']), []).append(index)
+            lane_results = await asyncio.gather(*(
+                arun_repository_lane([tool_calls[i] for i in lane], state, repository)
+                for repository, lane in lanes.items()
+            ))
+            for lane, messages in zip(lanes.values(), lane_results):
+                for index, message in zip(lane, messages):
+                    results[index] = message
+        logger.info(f"Ran {len(indexes)} {'read-only' if read_only else 'mutating'} tool calls")
+    return [message for message in results if message is not None]